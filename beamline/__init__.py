@@ -15,7 +15,9 @@ from .element import ElementBeamline
 from .element import ElementCsrdrift as ElementCsrdrif
 from .element import ElementLscdrift as ElementLscdrif
 from .element import ElementDrift as ElementDrif
-from .models import Models
+from .element import registerElement, getElementClass
+from .models import Models, ModelSnapshot, LiveOptics
+from .survey import Survey, calcSurvey
 from .ui import ui_main
 from .mathutils import funTransQuadF, funTransQuadD
 from .mathutils import funTransDrift
@@ -23,6 +25,12 @@ from .mathutils import funTransUnduH, funTransUnduV
 from .mathutils import funTransEdgeX, funTransEdgeY
 from .mathutils import funTransSectX, funTransSectY
 from .mathutils import funTransChica
+from .mathutils import funTransQuadFBatch, funTransQuadDBatch
+from .mathutils import funTransDriftBatch
+from .mathutils import funTransUnduHBatch, funTransUnduVBatch
+from .mathutils import funTransEdgeXBatch, funTransEdgeYBatch
+from .mathutils import funTransSectXBatch, funTransSectYBatch
+from .mathutils import funTransChicaBatch
 from .mathutils import transDrift
 from .mathutils import transQuad
 from .mathutils import transSect
@@ -30,7 +38,15 @@ from .mathutils import transRbend
 from .mathutils import transFringe
 from .mathutils import transChicane
 from .mathutils import Chicane
+from .mathutils import transDriftBatch, transQuadBatch
+from .mathutils import transSectBatch, transFringeBatch, transRbendBatch
+from .mathutils import transRfcwBatch, rfEnergyGain, chainBatch, cumChainBatch
 from .matchutils import ParseParams, BeamMatch, FELSimulator, parseLattice
+from .matchutils import BeamMatchScan, parseNamelist
+from .genesisutils import GenesisJob, JobRunner, JobResult, GenesisOutput
+from .ctrlutils import readPVs, putPVs, PutResult, PVCache, getPVCache, setPVCache
+from .ctrlutils import ControlBackend, EpicsBackend, SimulatedBackend, AsyncioBackend
+from .ctrlutils import getBackend, setBackend
 
 __version__ = "2.0.0"
 __author__ = "Tong Zhang"
@@ -56,21 +72,37 @@ __all__ = [
            "Lattice", "LteParser",
            "Simulator",
            "DataExtracter", "DataVisualizer", "DataStorage",
-           "Models",
+           "Models", "ModelSnapshot", "LiveOptics",
+           "Survey", "calcSurvey",
            "ui_main",
            "ParseParams", "BeamMatch", "FELSimulator", "parseLattice",
+           "BeamMatchScan", "parseNamelist",
+           "GenesisJob", "JobRunner", "JobResult", "GenesisOutput",
+           "readPVs", "putPVs", "PutResult",
+           "PVCache", "getPVCache", "setPVCache",
+           "ControlBackend", "EpicsBackend", "SimulatedBackend",
+           "AsyncioBackend", "getBackend", "setBackend",
            "funTransQuadF", "funTransQuadD", 
            "funTransDrift", "funTransUnduH", 
            "funTransUnduV", "funTransEdgeX", 
            "funTransEdgeY", "funTransSectX", 
            "funTransSectY", "funTransChica", 
+           "funTransQuadFBatch", "funTransQuadDBatch",
+           "funTransDriftBatch", "funTransUnduHBatch",
+           "funTransUnduVBatch", "funTransEdgeXBatch",
+           "funTransEdgeYBatch", "funTransSectXBatch",
+           "funTransSectYBatch", "funTransChicaBatch",
            "transDrift", "transQuad", "transSect", 
            "transRbend", "transFringe",
            "transChicane", "Chicane",
+           "transDriftBatch", "transQuadBatch", "transSectBatch",
+           "transFringeBatch", "transRbendBatch", "transRfcwBatch",
+           "rfEnergyGain", "chainBatch", "cumChainBatch",
            "ElementCharge",   "ElementCsrcsben", "ElementQuad", 
            "ElementCsrdrift", "ElementCsrdrif",  "ElementDrift",    
            "ElementDrif",     "ElementLscdrift", "ElementLscdrif",
            "ElementKicker",   "ElementMark",     "ElementWatch", 
            "ElementMoni",     "ElementRfcw",     "ElementRfdf", 
            "ElementWake",     "ElementBeamline",
+           "registerElement", "getElementClass",
 ]
@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+control system (EPICS) access for online modeling:
+    * ControlBackend: interface of control system backend, batched
+      get/put and monitor, asynchronous requests return futures
+    * EpicsBackend: pyepics (channel access) backend
+    * SimulatedBackend: in-memory PVs with configurable latency, for
+      offline tests and benchmarks
+    * AsyncioBackend: asyncio adapter of other backend, coroutines and
+      monitor callbacks within event loop
+    * getBackend, setBackend: process-wide backend for elements and models
+    * readPVs: read PV values in one batch
+    * putPVs: write PV values in one batch as a transaction, see PutResult
+    * PVCache: PV value cache fed by monitors, with TTL fallback to polling
+    * getPVCache, setPVCache: process-wide PV cache for elements and models
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ControlBackend(object):
+    """ Interface of control system backend, subclass should define
+    ``getMany()``, ``putMany()`` and ``monitor()``, the asynchronous
+    versions run the requests in a shared thread pool by default.
+    """
+
+    _executor = None  # thread pool for asynchronous requests
+    _executor_lock = threading.Lock()
+
+    def getMany(self, pvnames, timeout=1.0):
+        """ read PVs in one batch
+
+        :param pvnames: list of PV names
+        :param timeout: time limit of getting value for each PV, [s]
+        :return: list of values, None for disconnected PV
+        """
+        raise NotImplementedError
+
+    def putMany(self, pvnames, values, wait=False, timeout=60.0):
+        """ write PVs in one batch
+
+        :param pvnames: list of PV names
+        :param values: list of values
+        :param wait: wait until all the writes are completed or not
+        :param timeout: time limit of waiting, [s]
+        :return: list of bool, True for success
+        """
+        raise NotImplementedError
+
+    def monitor(self, pvname, callback):
+        """ monitor PV, callback is called with ``(pvname, value, timestamp)``
+        when value changes, value is None when PV is disconnected.
+
+        :return: function to cancel monitor
+        """
+        raise NotImplementedError
+
+    def get(self, pvname, timeout=1.0):
+        """ read one PV, see getMany()
+        """
+        return self.getMany([pvname], timeout=timeout)[0]
+
+    def put(self, pvname, value, wait=False, timeout=60.0):
+        """ write one PV, see putMany()
+        """
+        return self.putMany([pvname], [value], wait=wait, timeout=timeout)[0]
+
+    def _submit(self, fun, *args, **kws):
+        with ControlBackend._executor_lock:
+            if ControlBackend._executor is None:
+                ControlBackend._executor = ThreadPoolExecutor(max_workers=8)
+        return ControlBackend._executor.submit(fun, *args, **kws)
+
+    def getManyAsync(self, pvnames, timeout=1.0):
+        """ read PVs in one batch, do not wait
+
+        :return: ``concurrent.futures.Future``, result is list of values
+        """
+        return self._submit(self.getMany, list(pvnames), timeout=timeout)
+
+    def putManyAsync(self, pvnames, values, wait=False, timeout=60.0):
+        """ write PVs in one batch, do not wait
+
+        :return: ``concurrent.futures.Future``, result is list of bool
+        """
+        return self._submit(self.putMany, list(pvnames), list(values), wait=wait, timeout=timeout)
+
+
+class EpicsBackend(ControlBackend):
+    """ channel access backend by pyepics, which is imported when the
+    backend is created, i.e. the online features are requested.
+
+    :param conn_timeout: time limit of connecting PVs, [s]
+    """
+
+    def __init__(self, conn_timeout=5.0):
+        import epics
+        self._epics = epics
+        self.conn_timeout = conn_timeout
+
+    def getMany(self, pvnames, timeout=1.0):
+        # connect all, then get concurrently
+        return self._epics.caget_many(list(pvnames), timeout=timeout,
+                                      connection_timeout=self.conn_timeout)
+
+    def putMany(self, pvnames, values, wait=False, timeout=60.0):
+        ret = self._epics.caput_many(list(pvnames), list(values),
+                                     wait='all' if wait else False,
+                                     connection_timeout=self.conn_timeout,
+                                     put_timeout=timeout)
+        return [r == 1 for r in ret]
+
+    def monitor(self, pvname, callback):
+        def _onValue(pvname=None, value=None, timestamp=None, **kws):
+            callback(pvname, value, timestamp)
+
+        def _onConnect(pvname=None, conn=None, **kws):
+            if not conn:
+                callback(pvname, None, None)
+
+        pv = self._epics.PV(pvname, callback=_onValue, connection_callback=_onConnect,
+                            auto_monitor=True)
+        return pv.disconnect
+
+
+class SimulatedBackend(ControlBackend):
+    """ in-memory PVs, every request (batch) costs one round trip of
+    latency, writes are seen by monitors, PVs not defined are treated
+    as disconnected.
+
+    Usage:
+
+    >>> backend = SimulatedBackend({'Q01:K1': 1.0}, latency=0.002)
+    >>> setBackend(backend)
+
+    :param pvs: dict of PV names and initial values
+    :param latency: round trip time of request, [s]
+    """
+
+    def __init__(self, pvs=None, latency=0.0):
+        self.pvs = dict(pvs) if pvs else {}
+        self.latency = latency
+        self.requests = 0  # number of requests (round trips)
+        self._monitors = {}  # pvname: [callback]
+        self._lock = threading.Lock()
+
+    def _roundTrip(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def getMany(self, pvnames, timeout=1.0):
+        self._roundTrip()
+        with self._lock:
+            return [self.pvs.get(pv) for pv in pvnames]
+
+    def putMany(self, pvnames, values, wait=False, timeout=60.0):
+        self._roundTrip()
+        ret = []
+        for pv, val in zip(pvnames, values):
+            ok = pv in self.pvs
+            if ok:
+                self.setValue(pv, val)
+            ret.append(ok)
+        return ret
+
+    def monitor(self, pvname, callback):
+        with self._lock:
+            self._monitors.setdefault(pvname, []).append(callback)
+            val = self.pvs.get(pvname)
+        if val is not None:  # initial value, as channel access does
+            callback(pvname, val, time.time())
+
+        def cancel():
+            with self._lock:
+                if callback in self._monitors.get(pvname, []):
+                    self._monitors[pvname].remove(callback)
+
+        return cancel
+
+    def setValue(self, pvname, value):
+        """ set PV value, e.g. changed by other clients, monitors are notified
+        """
+        with self._lock:
+            self.pvs[pvname] = value
+            callbacks = list(self._monitors.get(pvname, []))
+        ts = time.time()
+        for callback in callbacks:
+            callback(pvname, value, ts)
+
+
+class AsyncioBackend(ControlBackend):
+    """ asyncio adapter of other backend, requests could be awaited,
+    blocking requests run in the executor of event loop, monitor callbacks
+    are called in the event loop thread.
+
+    Usage:
+
+    >>> backend = AsyncioBackend(EpicsBackend())
+    >>> vals = await backend.agetMany(['Q01:K1', 'Q02:K1'])
+
+    :param backend: backend to wrap, ``EpicsBackend`` by default
+    :param loop: event loop of monitor callbacks, the running loop when
+        ``monitor()`` is called by default
+    """
+
+    def __init__(self, backend=None, loop=None):
+        self.backend = EpicsBackend() if backend is None else backend
+        self.loop = loop
+
+    def getMany(self, pvnames, timeout=1.0):
+        return self.backend.getMany(pvnames, timeout=timeout)
+
+    def putMany(self, pvnames, values, wait=False, timeout=60.0):
+        return self.backend.putMany(pvnames, values, wait=wait, timeout=timeout)
+
+    def monitor(self, pvname, callback):
+        loop = self.loop
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:  # no loop running
+                return self.backend.monitor(pvname, callback)
+
+        def _onValue(pvname, value, timestamp):
+            loop.call_soon_threadsafe(callback, pvname, value, timestamp)
+
+        return self.backend.monitor(pvname, _onValue)
+
+    async def agetMany(self, pvnames, timeout=1.0):
+        """ coroutine of getMany()
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.backend.getMany, list(pvnames), timeout=timeout))
+
+    async def aget(self, pvname, timeout=1.0):
+        """ coroutine of get()
+        """
+        return (await self.agetMany([pvname], timeout=timeout))[0]
+
+    async def aputMany(self, pvnames, values, wait=False, timeout=60.0):
+        """ coroutine of putMany()
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.backend.putMany, list(pvnames), list(values),
+                                    wait=wait, timeout=timeout))
+
+    async def aput(self, pvname, value, wait=False, timeout=60.0):
+        """ coroutine of put()
+        """
+        return (await self.aputMany([pvname], [value], wait=wait, timeout=timeout))[0]
+
+
+_backend = None  # process-wide control backend
+
+
+def getBackend():
+    """ return process-wide control backend, which is used by elements
+    and models, ``EpicsBackend`` is created when first requested.
+    """
+    global _backend
+    if _backend is None:
+        _backend = EpicsBackend()
+    return _backend
+
+
+def setBackend(backend):
+    """ replace process-wide control backend, the process-wide PV cache
+    is dropped, since its values and monitors come from the old backend.
+
+    :param backend: ControlBackend instance
+    :return: previous backend
+    """
+    global _backend
+    old, _backend = _backend, backend
+    cache = setPVCache(None)
+    if cache is not None:
+        cache.unsubscribe()
+    return old
+
+
+def readPVs(pvnames, timeout=1.0, backend=None):
+    """ read PV values in one batch, channels are connected all together,
+    then the values are requested concurrently, i.e. the batch costs about
+    one network round trip, not one per PV.
+
+    :param pvnames: list of PV names, duplicated names are read once
+    :param timeout: time limit of getting value for each PV, [s]
+    :param backend: ControlBackend instance, process-wide backend by default
+    :return: dict of ``{pvname: value}``, value is None if not available
+    """
+    pvlist = list(dict.fromkeys(pvnames))
+    if not pvlist:
+        return {}
+    if backend is None:
+        backend = getBackend()
+    return dict(zip(pvlist, backend.getMany(pvlist, timeout=timeout)))
+
+
+class PutResult(object):
+    """ Result of batch write, see ``putPVs()``
+
+    status:
+        'done': all written (and verified);
+        'aborted': prior values could not be captured, nothing written;
+        'failed': write or readback failed, not rolled back;
+        'rolledback': write or readback failed, prior values restored;
+        'rollback failed': write or readback failed, restoring failed too.
+
+    :param pvnames: list of PV names
+    :param values: list of values to write
+    """
+
+    def __init__(self, pvnames, values):
+        self.pvnames = pvnames
+        self.values = values
+        self.status = 'pending'
+        self.prior = {}  # pvname: value before writing
+        self.failed = []  # PVs failed in writing or readback
+        self.timing = {}  # step: time [s], 'capture', 'put', 'readback', 'rollback'
+        self.elapsed = 0.0  # latency of the whole batch, [s]
+
+    @property
+    def ok(self):
+        return self.status == 'done'
+
+    def __repr__(self):
+        steps = ', '.join('{0}: {1:.1f}'.format(k, self.timing[k] * 1e3)
+                          for k in ('capture', 'put', 'readback', 'rollback') if k in self.timing)
+        return "PutResult(n={0}, status={1}, elapsed={2:.1f} ms ({3}), failed={4})".format(
+            len(self.pvnames), self.status, self.elapsed * 1e3, steps, self.failed)
+
+
+def _isClose(val, target, tol):
+    try:
+        return abs(val - target) <= tol
+    except TypeError:  # not number
+        return val == target
+
+
+def putPVs(pvnames, values, readback=False, tolerance=1e-6, timeout=5.0,
+           rollback=True, backend=None):
+    """ write PV values in one batch as a transaction: prior values are
+    captured first, values are written concurrently, readbacks are
+    checked optionally, prior values are written back on failure.
+
+    :param pvnames: list of PV names
+    :param values: list of values
+    :param readback: wait until readback values are within tolerance or not
+    :param tolerance: max absolute difference of readback, number or list
+    :param timeout: time limit of writing and readback, [s]
+    :param rollback: restore prior values on failure, True by default
+    :param backend: ControlBackend instance, process-wide backend by default
+    :return: PutResult instance
+    """
+    if backend is None:
+        backend = getBackend()
+    pvnames, values = list(pvnames), list(values)
+    if len(pvnames) != len(values):
+        raise ValueError("Lengths of PV names and values must be the same.")
+    if len(set(pvnames)) != len(pvnames):
+        raise ValueError("Duplicated PV names.")
+    if not isinstance(tolerance, (list, tuple)):
+        tolerance = [tolerance] * len(pvnames)
+    result = PutResult(pvnames, values)
+    t0 = time.time()
+
+    # capture
+    prior = backend.getMany(pvnames)
+    t1 = time.time()
+    result.timing['capture'] = t1 - t0
+    result.prior = dict(zip(pvnames, prior))
+    result.failed = [pv for pv, val in zip(pvnames, prior) if val is None]
+    if result.failed:
+        result.status = 'aborted'
+        result.elapsed = time.time() - t0
+        return result
+
+    # write
+    ret = backend.putMany(pvnames, values, wait=readback, timeout=timeout)
+    t2 = time.time()
+    result.timing['put'] = t2 - t1
+    result.failed = [pv for pv, ok in zip(pvnames, ret) if not ok]
+
+    # readback
+    if readback and not result.failed:
+        while True:
+            rbvals = backend.getMany(pvnames)
+            result.failed = [pv for pv, rb, val, tol in zip(pvnames, rbvals, values, tolerance)
+                             if rb is None or not _isClose(rb, val, tol)]
+            if not result.failed or time.time() - t2 > timeout:
+                break
+            time.sleep(0.02)
+        result.timing['readback'] = time.time() - t2
+
+    if result.failed and rollback:
+        t3 = time.time()
+        ret = backend.putMany(pvnames, prior, wait=readback, timeout=timeout)
+        result.status = 'rolledback' if all(ret) else 'rollback failed'
+        result.timing['rollback'] = time.time() - t3
+    else:
+        result.status = 'failed' if result.failed else 'done'
+
+    # cached values are outdated if not monitored
+    if _pvcache is not None:
+        _pvcache.invalidate(pvnames)
+    result.elapsed = time.time() - t0
+    return result
+
+
+class PVCache(object):
+    """ PV value cache, values are fed by monitors (subscriptions), PVs
+    not monitored (or with monitor disconnected) are polled in one batch
+    when the cached values are older than the staleness limit.
+
+    Usage:
+
+    >>> cache = PVCache(ttl=1.0)
+    >>> cache.getMany(['Q01:K1', 'Q02:K1'])  # polled, then monitored
+    >>> cache.get('Q01:K1')  # from cache
+    >>> cache.getStats()
+
+    :param ttl: staleness limit of PVs without monitor, [s], 0 for no caching
+    :param monitor: subscribe PVs once they are read, True by default
+    :param backend: ControlBackend instance, process-wide backend by default
+    """
+
+    def __init__(self, ttl=1.0, monitor=True, backend=None):
+        self.ttl = ttl
+        self.monitor = monitor
+        self._backend = backend
+        self._values = {}  # pvname: (value, time of update)
+        self._maxage = {}  # pvname: staleness limit of monitored PV, None for no limit
+        self._subs = {}  # pvname: function to cancel monitor
+        self._lock = threading.Lock()
+        self.resetStats()
+
+    def resetStats(self):
+        """ reset statistics, see getStats()
+        """
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'polls': 0, 'updates': 0,
+                           'poll_time': 0.0, 'poll_time_max': 0.0,
+                           'latency_cnt': 0, 'latency': 0.0, 'latency_max': 0.0}
+
+    def getStats(self):
+        """ statistics of cache
+
+        :return: dict, keys:
+            'hits', 'misses': number of PV reads from cache or not,
+            'hit_rate': hits / (hits + misses),
+            'polls': number of batch reads,
+            'poll_time', 'poll_time_max': mean and max time of batch read, [s],
+            'updates': number of monitor updates,
+            'latency', 'latency_max': mean and max latency of monitor
+                updates, from PV timestamp to cache update, [s]
+        """
+        with self._lock:
+            st = dict(self._stats)
+        nread = st['hits'] + st['misses']
+        st['hit_rate'] = float(st['hits']) / nread if nread else 0.0
+        st['poll_time'] = st['poll_time'] / st['polls'] if st['polls'] else 0.0
+        st['latency'] = st['latency'] / st['latency_cnt'] if st['latency_cnt'] else 0.0
+        del st['latency_cnt']
+        return st
+
+    def subscribe(self, pvnames, maxage=None):
+        """ monitor PVs, cached values are updated by monitor callbacks
+
+        :param pvnames: list of PV names
+        :param maxage: staleness limit, [s], values not updated longer
+            than maxage are polled again, None (default) for no limit
+        """
+        for pv in pvnames:
+            with self._lock:
+                self._maxage[pv] = maxage
+                if pv in self._subs:
+                    continue
+                self._subs[pv] = None
+            try:
+                backend = getBackend() if self._backend is None else self._backend
+                self._subs[pv] = backend.monitor(pv, self.update)
+            except Exception:
+                with self._lock:
+                    self._subs.pop(pv, None)
+                raise
+
+    def unsubscribe(self, pvnames=None):
+        """ cancel monitors
+
+        :param pvnames: list of PV names, all by default
+        """
+        with self._lock:
+            if pvnames is None:
+                pvnames = list(self._subs)
+            cancels = [self._subs.pop(pv, None) for pv in pvnames]
+            for pv in pvnames:
+                self._maxage.pop(pv, None)
+        for cancel in cancels:
+            if cancel is not None:
+                cancel()
+
+    def update(self, pvname, value, timestamp=None):
+        """ update cached value, called by monitors
+
+        :param pvname: PV name
+        :param value: new value, None to invalidate
+        :param timestamp: time of the value change, e.g. from IOC, to
+            measure update latency
+        """
+        now = time.time()
+        with self._lock:
+            if value is None:
+                self._values.pop(pvname, None)
+                return
+            self._values[pvname] = (value, now)
+            st = self._stats
+            st['updates'] += 1
+            if timestamp is not None:
+                dt = now - timestamp
+                st['latency_cnt'] += 1
+                st['latency'] += dt
+                st['latency_max'] = max(st['latency_max'], dt)
+
+    def invalidate(self, pvnames=None):
+        """ drop cached values
+
+        :param pvnames: list of PV names, all by default
+        """
+        with self._lock:
+            if pvnames is None:
+                self._values.clear()
+            else:
+                for pv in pvnames:
+                    self._values.pop(pv, None)
+
+    def get(self, pvname):
+        """ read one PV, see getMany()
+        """
+        return self.getMany([pvname]).get(pvname)
+
+    def getMany(self, pvnames):
+        """ read PVs, values not cached or stale are polled in one batch
+
+        :param pvnames: list of PV names
+        :return: dict of ``{pvname: value}``, value is None if not available
+        """
+        ret, missed = {}, []
+        now = time.time()
+        with self._lock:
+            for pv in dict.fromkeys(pvnames):
+                entry = self._values.get(pv)
+                if entry is not None:
+                    maxage = self._maxage[pv] if pv in self._maxage else self.ttl
+                    if maxage is None or now - entry[1] < maxage:
+                        ret[pv] = entry[0]
+                        continue
+                missed.append(pv)
+            self._stats['hits'] += len(ret)
+            self._stats['misses'] += len(missed)
+        if missed:
+            t0 = time.time()
+            vals = readPVs(missed, backend=self._backend)
+            t1 = time.time()
+            with self._lock:
+                st = self._stats
+                st['polls'] += 1
+                st['poll_time'] += t1 - t0
+                st['poll_time_max'] = max(st['poll_time_max'], t1 - t0)
+                for pv, val in vals.items():
+                    if val is not None:
+                        self._values[pv] = (val, t1)
+            ret.update(vals)
+            if self.monitor:
+                self.subscribe([pv for pv in missed if pv not in self._subs])
+        return ret
+
+
+_pvcache = None  # process-wide PV cache
+
+
+def getPVCache():
+    """ return process-wide PV cache, which is used by elements and models,
+    created when first requested.
+    """
+    global _pvcache
+    if _pvcache is None:
+        _pvcache = PVCache()
+    return _pvcache
+
+
+def setPVCache(cache):
+    """ replace process-wide PV cache, e.g. ``setPVCache(PVCache(ttl=0, monitor=False))``
+    to read PVs every time
+
+    :param cache: PVCache instance
+    :return: previous PVCache instance
+    """
+    global _pvcache
+    old, _pvcache = _pvcache, cache
+    return old
@@ -0,0 +1,656 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+batched drawing of beamline elements: the drawing geometry of all the
+elements is calculated in arrays by element shape, and rendered by a few
+matplotlib collections instead of one patch per element, see
+Models.drawCollections(); and element annotations drawn by one artist
+with labels decimated by screen density, see AnnotationLayer.
+
+The geometry is the same as the one of element setDraw() methods, element
+placement is from survey.calcSurvey().
+"""
+
+import operator
+
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.collections import LineCollection, PathCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.path import Path
+from matplotlib.text import Text
+from matplotlib.transforms import IdentityTransform
+
+from . import element
+from . import survey
+
+_configVersion = operator.attrgetter('configVersion')
+_style = operator.attrgetter('style')
+
+# drawing shapes
+SHAPE_NONE, SHAPE_LINE, SHAPE_QUAD, SHAPE_BEND, SHAPE_RF, SHAPE_MONI = range(6)
+
+# element type name: drawing shape
+_SHAPES = {
+    'DRIFT': SHAPE_LINE, 'CSRDRIFT': SHAPE_LINE, 'LSCDRIFT': SHAPE_LINE,
+    'KICKER': SHAPE_LINE, 'MARK': SHAPE_LINE, 'WAKE': SHAPE_LINE,
+    'WATCH': SHAPE_LINE, 'MONI': SHAPE_MONI, 'QUAD': SHAPE_QUAD,
+    'CSRCSBEN': SHAPE_BEND, 'RFCW': SHAPE_RF, 'RFDF': SHAPE_RF,
+    'CHARGE': SHAPE_NONE, 'CENTER': SHAPE_NONE, 'BEAMLINE': SHAPE_NONE,
+}
+
+# element types without annotation
+_NO_ANOTE = ('WAKE', 'CHARGE', 'CENTER', 'BEAMLINE')
+
+# rf band by int(freq / 2856 MHz): (color, text of RFCW), 'D' is appended for RFDF
+_RF_BANDS = {1: ('#FFDDBB', 'S'), 2: ('#5E5EFF', 'C'), 4: ('#8800FF', 'X')}
+_RF_OTHER = ('#FFBB00', '..')
+
+# shape outlines in unit of (length, height), drawn from (0, 0) along x-axis
+_OUTLINE_RECT = np.array([[0, 0], [0, 1], [1, 1], [1, 0]], dtype=np.float64)
+_OUTLINE_RF = np.array([[0, 0], [0, 0.5], [1, 0.5], [1, 0], [1, -0.5], [0, -0.5]],
+                       dtype=np.float64)
+_OUTLINE_QUAD_FANCY = np.array([[0, 0], [0.5, 0.5], [1, 0], [0.5, -0.5], [0, 0]],
+                               dtype=np.float64)
+_OUTLINE_BEND_FANCY = np.array([[0, 0], [0, 0.5], [0.5, 0.5], [1, 0.5], [1, 0],
+                                [1, -0.5], [0.5, -0.5], [0, -0.5], [0, 0]], dtype=np.float64)
+# monitor, in unit of length
+_OUTLINE_MONI = np.array([[0, 0], [0, 0.5], [1 / 3.0, 0.5], [0.5, 0], [2 / 3.0, 0.5],
+                          [1, 0.5], [1, 0], [1, -0.5], [2 / 3.0, -0.5],
+                          [2 / 3.0, -0.5 + 1 / 3.0], [1 / 3.0, -0.5 + 1 / 3.0],
+                          [1 / 3.0, -0.5], [0, -0.5]], dtype=np.float64)
+
+
+def isSupported(elements):
+    """ if the elements could be drawn in batch, i.e. all the element types
+    are known, or elements do not draw anything (MagBlock.setDraw()).
+
+    :param elements: element object list
+    """
+    for cls in set(type(e) for e in elements):
+        if cls.typename not in _SHAPES and cls.setDraw is not element.MagBlock.setDraw:
+            return False
+    return True
+
+
+def _getFloat(conf, key, default):
+    try:
+        return float(conf.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _elementRow(e):
+    """ drawing parameters of element object, (shape, l, sign, h, lw, fc,
+    ec, fc_fancy, text), text is rf band text (or None)
+    """
+    conf = e.simuinfo
+    t = _SHAPES.get(e.typename, SHAPE_NONE)
+    none = (0.0, 0.0, 0.0, 0.0)
+    if t == SHAPE_NONE:
+        return t, 0.0, 1.0, 0.0, 1.0, none, none, none, None
+    l = _getFloat(conf, 'l', 0.0)
+    style = e.style
+    alpha = style.get('alpha', 1.0)
+    lw = style.get('lw', 1.0)
+    sign, h, fc_fancy, text = 1.0, 0.0, none, None
+    if t in (SHAPE_QUAD, SHAPE_BEND):
+        h = style['h']
+        fc, ec = to_rgba(style['fc'], alpha), to_rgba(style['ec'], alpha)
+        key = 'k1' if t == SHAPE_QUAD else 'angle'
+        sign = 1.0 if _getFloat(conf, key, 0.0) >= 0 else -1.0
+    elif t == SHAPE_RF:
+        h = style['h']
+        freq = _getFloat(conf, 'freq', _getFloat(conf, 'frequency', 0.0)) \
+            if e.typename == 'RFDF' else _getFloat(conf, 'freq', 0.0)
+        color, text = _RF_BANDS.get(int(freq / 2856.0e6), _RF_OTHER)
+        if e.typename == 'RFDF' and text != '..':
+            text += 'D'
+        fc, ec = to_rgba('w', alpha), to_rgba(style['color'], alpha)
+        fc_fancy = to_rgba(color, alpha)
+    elif t == SHAPE_MONI:
+        plainc = element.MagBlock._MagBlock__styleconfig_dict['drift']['color']
+        fc = ec = to_rgba(plainc, alpha)
+        fc_fancy = to_rgba(style['color'], alpha)
+    else:  # line
+        fc = ec = to_rgba(style['color'], alpha)
+    return t, l, sign, h, lw, fc, ec, fc_fancy, text
+
+
+def _elementParams(defs, rows=None):
+    """ drawing parameters of unique element objects
+
+    :param defs: unique element objects, see survey.uniqueElements()
+    :param rows: dict to cache the parameters of element objects, updated
+        in place, see GeometryCache
+    :return: (params, texts), params is dict of arrays by unique element,
+        texts is list of rf band text (or None)
+    """
+    if rows is None:
+        r = [_elementRow(e) for e in defs]
+    else:
+        r = []
+        for e in defs:
+            row = rows.get(id(e))
+            if row is None or row[0] is not e or row[1] != e.configVersion \
+                    or row[2] is not e.style:
+                row = rows[id(e)] = (e, e.configVersion, e.style, _elementRow(e))
+            r.append(row[3])
+    n = len(defs)
+    cols = list(zip(*r)) if n else [()] * 9
+    params = {'shape': np.array(cols[0], dtype=int)}
+    for k, c in zip(('l', 'sign', 'h', 'lw'), cols[1:5]):
+        params[k] = np.array(c, dtype=np.float64)
+    for k, c in zip(('fc', 'ec', 'fc_fancy'), cols[5:8]):
+        params[k] = np.array(c, dtype=np.float64).reshape(n, 4)
+    return params, list(cols[8])
+
+
+def _rotate(v, theta):
+    """ rotate local vertices anticlockwise by theta [rad]
+
+    :param v: (n, k, 2) array
+    :param theta: (n,) array
+    """
+    c, s = np.cos(theta)[:, None], np.sin(theta)[:, None]
+    return np.stack((c * v[..., 0] - s * v[..., 1], s * v[..., 0] + c * v[..., 1]), axis=-1)
+
+
+def _curveExtrema(verts):
+    """ end points and extrema of quadratic Bezier curves, control points
+    are not included, for drawing range
+
+    :param verts: (n, k, 2) array, vertices of paths of MOVETO and CURVE3 codes
+    :return: (n, m, 2) array
+    """
+    p0, p1, p2 = verts[:, 0:-1:2], verts[:, 1::2], verts[:, 2::2]
+    denom = p0 - 2 * p1 + p2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(denom != 0, (p0 - p1) / denom, 0.0)
+    pts = [verts[:, 0::2]]
+    for j in (0, 1):  # extrema along x and y
+        tj = np.clip(t[..., j:j + 1], 0.0, 1.0)
+        pts.append((1 - tj) ** 2 * p0 + 2 * tj * (1 - tj) * p1 + tj ** 2 * p2)
+    return np.concatenate(pts, axis=1)
+
+
+class RTree(object):
+    """ static R-tree of boxes, packed by sort-tile-recursive, for range
+    and point queries in O(log N) (plus the number of hits); boxes with
+    NaN are not indexed.
+
+    :param boxes: (N, 4) array of (xmin, xmax, ymin, ymax)
+    :param fanout: max number of children of tree nodes
+    """
+
+    def __init__(self, boxes, fanout=16):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        valid = np.flatnonzero(~np.isnan(boxes).any(axis=1))
+        b = boxes[valid]
+        n = len(b)
+        # sort by x center into vertical slices, then by y center in slices
+        order = np.argsort(b[:, 0] + b[:, 1], kind='stable')
+        nslice = int(np.ceil(np.sqrt(np.ceil(n / float(fanout))))) if n else 1
+        cy = (b[:, 2] + b[:, 3])[order]
+        order = order[np.lexsort((cy, np.arange(n) // (nslice * fanout)))]
+        self.index = valid[order]  # box index of leaf entries
+        self.fanout = fanout
+        self._children = np.arange(fanout)
+        level = b[order]
+        self.levels = [level]  # node boxes, from leaf entries to root
+        while len(level) > fanout:
+            starts = np.arange(0, len(level), fanout)
+            level = np.stack((np.minimum.reduceat(level[:, 0], starts),
+                              np.maximum.reduceat(level[:, 1], starts),
+                              np.minimum.reduceat(level[:, 2], starts),
+                              np.maximum.reduceat(level[:, 3], starts)), axis=1)
+            self.levels.append(level)
+
+    def __len__(self):
+        return len(self.index)
+
+    def query(self, xmin, xmax, ymin, ymax):
+        """ return sorted indices of boxes intersecting with the given box
+        """
+        cand = np.arange(len(self.levels[-1]))
+        for k in range(len(self.levels) - 1, -1, -1):
+            b = self.levels[k][cand]
+            cand = cand[(b[:, 0] <= xmax) & (b[:, 1] >= xmin) & (b[:, 2] <= ymax) & (b[:, 3] >= ymin)]
+            if k:
+                cand = (cand[:, None] * self.fanout + self._children).ravel()
+                cand = cand[cand < len(self.levels[k - 1])]
+        return np.sort(self.index[cand])
+
+    def queryPoint(self, x, y, tol=0.0):
+        """ return sorted indices of boxes containing point (x, y), boxes
+        are enlarged by tol
+        """
+        return self.query(x - tol, x + tol, y - tol, y + tol)
+
+
+class DrawGeometry(object):
+    """ drawing geometry of element list, see calcGeometry()
+
+    Attributes, N is the number of elements:
+
+    * mode: 'plain' or 'fancy'
+    * p0, p1: (N, 2) arrays, start and end drawing points of elements
+    * angle: (N,) array, drawing angle at the start of elements, [deg]
+    * shape: (N,) array, drawing shape codes, SHAPE_*
+    * anote: (N, 2) array, annotation points, NaN for elements without annotation
+    * extent: (xmin, xmax, ymin, ymax) of drawing, None if nothing drawn
+    * bounds: extent including the origin, as Models.draw()
+    * defs: unique element objects, see survey.uniqueElements()
+    * color: (N, 4) array, edge colors of elements ('plain' mode)
+    * parts: list of (shape, element indices, vertices, codes, style dict),
+      vertices is (n, k, 2) array, codes is None for polygons and lines
+    """
+
+    def __init__(self, mode, names, types, texts):
+        self.mode = mode
+        self.names = names
+        self.types = types
+        self.texts = texts  # rf band text, or None
+        self.p0 = self.p1 = self.anote = None
+        self.angle = self.shape = None
+        self.extent = None
+        self.bounds = (0, 0, 0, 0)
+        self.defs = []
+        self.color = None
+        self.parts = []
+        self._anotes = None
+        self._extents = None
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def setExtent(self, extent):
+        """ set drawing extent, and bounds accordingly
+
+        :param extent: (xmin, xmax, ymin, ymax), or None
+        """
+        self.extent = extent
+        if extent is None:
+            self.bounds = (0.0, 0.0, 0.0, 0.0)
+        else:
+            xmin, xmax, ymin, ymax = extent
+            self.bounds = (min(xmin, 0.0), max(xmax, 0.0), min(ymin, 0.0), max(ymax, 0.0))
+
+    def translate(self, offset):
+        """ return a new geometry moved by offset, shapes are not changed
+
+        :param offset: (dx, dy)
+        """
+        dx, dy = offset
+        d = np.array([dx, dy], dtype=np.float64)
+        geom = DrawGeometry(self.mode, self.names, self.types, self.texts)
+        geom.angle, geom.shape, geom.defs = self.angle, self.shape, self.defs
+        geom.color = self.color
+        if self._extents is not None:
+            geom._extents = self._extents + np.array([dx, dx, dy, dy])
+        geom.p0, geom.p1, geom.anote = self.p0 + d, self.p1 + d, self.anote + d
+        geom.parts = [(t, idx, verts + d, codes, style)
+                      for t, idx, verts, codes, style in self.parts]
+        if self.extent is not None:
+            xmin, xmax, ymin, ymax = self.extent
+            geom.setExtent((xmin + dx, xmax + dx, ymin + dy, ymax + dy))
+        return geom
+
+    def getAnotes(self):
+        """ return element annotation list, see MagBlock.setDraw(), the
+        list is built once, and should not be changed
+        """
+        if self._anotes is not None:
+            return self._anotes
+        anotes = []
+        for i in np.flatnonzero(~np.isnan(self.anote[:, 0])).tolist():
+            pc = tuple(self.anote[i].tolist())
+            a = {'xypos': pc, 'textpos': pc, 'name': self.names[i], 'type': self.types[i]}
+            if self.texts[i] is not None:
+                a['atext'] = {'xypos': pc, 'text': self.texts[i]}
+            anotes.append(a)
+        self._anotes = anotes
+        return anotes
+
+    def getExtents(self):
+        """ return (N, 4) array, (xmin, xmax, ymin, ymax) of element
+        drawings, NaN for elements not drawn
+        """
+        if self._extents is None:
+            ext = np.full((len(self), 4), np.nan)
+            for shape, idx, verts, codes, style in self.parts:
+                v = verts if codes is None else _curveExtrema(verts)
+                ext[idx] = np.stack((v[..., 0].min(axis=1), v[..., 0].max(axis=1),
+                                     v[..., 1].min(axis=1), v[..., 1].max(axis=1)), axis=1)
+            self._extents = ext
+        return self._extents
+
+    def getIndex(self):
+        """ return spatial index (RTree) of element drawings, see getExtents()
+        """
+        if self._index is None:
+            self._index = RTree(self.getExtents())
+        return self._index
+
+    def query(self, xmin, xmax, ymin, ymax):
+        """ return sorted indices of elements whose drawings intersect with
+        the given box, see getIndex()
+        """
+        return self.getIndex().query(xmin, xmax, ymin, ymax)
+
+    def hitTest(self, x, y, tol=0.0):
+        """ return index of the element drawn at point (x, y), the one
+        nearest to the point if more than one, None if nothing hit
+
+        :param tol: tolerance, or (x, y) tolerances, in data coordinates
+        """
+        tx, ty = (tol, tol) if np.isscalar(tol) else tol
+        idx = self.getIndex().query(x - tx, x + tx, y - ty, y + ty)
+        if not len(idx):
+            return None
+        ext = self.getExtents()[idx]
+        dx = np.maximum(np.maximum(ext[:, 0] - x, x - ext[:, 1]), 0.0)
+        dy = np.maximum(np.maximum(ext[:, 2] - y, y - ext[:, 3]), 0.0)
+        area = (ext[:, 1] - ext[:, 0]) * (ext[:, 3] - ext[:, 2])
+        # nearest, then the smallest
+        return int(idx[np.lexsort((area, np.hypot(dx, dy)))[0]])
+
+    def makeArtists(self, view=None, pixel=None, lod=1.0):
+        """ return list of matplotlib collections, one for each drawing part
+
+        :param view: (xmin, xmax, ymin, ymax), only the elements
+            intersecting with view are drawn, all by default
+        :param pixel: (dx, dy), size of one screen pixel in data
+            coordinates, elements smaller than lod pixels are merged into
+            one collection of line strokes, not merged by default
+        :param lod: size of elements to be merged, [pixel]
+        """
+        parts, strokes = self.parts, None
+        if view is not None or pixel is not None:
+            if view is not None:
+                sel = self.getIndex().query(*view)
+            else:
+                sel = np.flatnonzero(~np.isnan(self.getExtents()[:, 0]))
+            if pixel is not None:
+                ext = self.getExtents()[sel]
+                small = (ext[:, 1] - ext[:, 0] < lod * pixel[0]) & \
+                        (ext[:, 3] - ext[:, 2] < lod * pixel[1])
+                strokes = self._makeStrokes(sel[small], pixel)
+                sel = sel[~small]
+            mask = np.zeros(len(self), dtype=bool)
+            mask[sel] = True
+            parts = []
+            for shape, idx, verts, codes, style in self.parts:
+                rows = mask[idx]
+                if rows.any():
+                    parts.append((shape, idx[rows], verts[rows], codes,
+                                  {k: v[rows] for k, v in style.items()}))
+        artists = []
+        for shape, idx, verts, codes, style in parts:
+            if shape == SHAPE_LINE:
+                artists.append(LineCollection(verts, colors=style['ec'],
+                                              linewidths=style['lw']))
+            elif codes is None:
+                artists.append(PolyCollection(verts, facecolors=style['fc'],
+                                              edgecolors=style['ec'],
+                                              linewidths=style['lw']))
+            else:
+                # curves, one compound path for each style
+                paths, fcs, ecs, lws = [], [], [], []
+                keys = np.concatenate((style['fc'], style['ec'], style['lw'][:, None]), axis=1)
+                ukeys, inv = np.unique(keys, axis=0, return_inverse=True)
+                for j, k in enumerate(ukeys):
+                    sel = np.flatnonzero(inv.ravel() == j)
+                    paths.append(Path(verts[sel].reshape(-1, 2), np.tile(codes, len(sel))))
+                    fcs.append(k[0:4])
+                    ecs.append(k[4:8])
+                    lws.append(k[8])
+                artists.append(PathCollection(paths, facecolors=fcs, edgecolors=ecs,
+                                              linewidths=lws))
+        if strokes is not None:
+            artists.append(strokes)
+        return artists
+
+    def _makeStrokes(self, idx, pixel):
+        """ line strokes from start to end points of elements, only one
+        stroke is kept for the same pair of start and end pixels
+
+        :param idx: element indices
+        :param pixel: (dx, dy), pixel size
+        :return: LineCollection, or None
+        """
+        if not len(idx):
+            return None
+        segs = np.stack((self.p0[idx], self.p1[idx]), axis=1)
+        q = np.floor(segs.reshape(-1, 4) / np.tile(pixel, 2)).astype(np.int64)
+        keep = np.sort(np.unique(q, axis=0, return_index=True)[1])
+        return LineCollection(segs[keep], colors=self.color[idx[keep]], linewidths=1.0)
+
+
+def calcGeometry(elements, startpoint=(0, 0), mode='plain', rows=None):
+    """ calculate drawing geometry of elements in batch
+
+    :param elements: element object list
+    :param startpoint: start drawing point coords, (0, 0) by default
+    :param mode: artist mode, 'plain' or 'fancy', 'plain' by default
+    :param rows: dict to cache drawing parameters of element objects, see
+        _elementParams()
+    :return: DrawGeometry instance
+    """
+    fancy = mode != 'plain'
+    sv = survey.calcSurvey(elements, startpoint=startpoint, bend=fancy)
+    defs, eleidx = sv.defs, sv.index
+    dp, dtext = _elementParams(defs, rows)
+    p = {k: v[eleidx] for k, v in dp.items()}
+    n = len(eleidx)
+    names = [e.name.upper() for e in defs]
+    names = [names[i] for i in eleidx.tolist()]
+    texts = [dtext[i] for i in eleidx.tolist()]
+    types = sv.types
+    geom = DrawGeometry(mode, names, types, texts)
+    geom.defs, geom.color = defs, p['ec']
+
+    shape, l = p['shape'], p['l']
+    theta = sv.theta[:-1]
+    angle = theta / np.pi * 180
+    line = (shape == SHAPE_LINE) | ((shape == SHAPE_MONI) & (not fancy))
+    p0, p1 = sv.p0, sv.p1
+    geom.p0, geom.p1, geom.angle, geom.shape = p0, p1, angle, shape
+
+    # annotation points
+    anote = np.empty((n, 2))
+    anote[:, 0] = p0[:, 0] + 0.5 * l
+    anote[:, 1] = np.where(line, 0.5 * (p0[:, 1] + p1[:, 1]), p0[:, 1])
+    anote[(shape == SHAPE_NONE) | np.isin(types, _NO_ANOTE)] = np.nan
+    geom.anote = anote
+
+    def style(idx, fc='fc'):
+        return {'fc': p[fc][idx], 'ec': p['ec'][idx] if fc == 'fc' else p[fc][idx],
+                'lw': p['lw'][idx]}
+
+    parts = []
+    idx = np.flatnonzero(line)
+    if idx.size:
+        parts.append((SHAPE_LINE, idx, np.stack((p0[idx], p1[idx]), axis=1), None, style(idx)))
+    for t in (SHAPE_QUAD, SHAPE_BEND):
+        idx = np.flatnonzero(shape == t)
+        if not idx.size:
+            continue
+        w, h = l[idx][:, None], p['h'][idx][:, None]
+        if fancy:
+            outline = _OUTLINE_QUAD_FANCY if t == SHAPE_QUAD else _OUTLINE_BEND_FANCY
+            local = np.stack((outline[:, 0] * w, outline[:, 1] * h), axis=-1)
+            verts = _rotate(local, theta[idx]) + p0[idx][:, None, :]
+            codes = np.full(len(outline), Path.CURVE3, dtype=Path.code_type)
+            codes[0] = Path.MOVETO
+            parts.append((t, idx, verts, codes, style(idx)))
+        else:
+            sh = (h * p['sign'][idx][:, None])
+            local = np.stack((_OUTLINE_RECT[:, 0] * w, _OUTLINE_RECT[:, 1] * sh), axis=-1)
+            parts.append((t, idx, local + p0[idx][:, None, :], None, style(idx)))
+    idx = np.flatnonzero(shape == SHAPE_RF)
+    if idx.size:
+        w, h = l[idx][:, None], p['h'][idx][:, None]
+        local = np.stack((_OUTLINE_RF[:, 0] * w, _OUTLINE_RF[:, 1] * h), axis=-1)
+        st = style(idx, 'fc_fancy') if fancy else style(idx)
+        parts.append((SHAPE_RF, idx, local + p0[idx][:, None, :], None, st))
+    idx = np.flatnonzero(shape == SHAPE_MONI) if fancy else ()
+    if len(idx):
+        local = _OUTLINE_MONI[None, :, :] * l[idx][:, None, None]
+        parts.append((SHAPE_MONI, idx, local + p0[idx][:, None, :], None,
+                      style(idx, 'fc_fancy')))
+    geom.parts = parts
+
+    # drawing range
+    ext = geom.getExtents()
+    if parts:
+        geom.setExtent((float(np.nanmin(ext[:, 0])), float(np.nanmax(ext[:, 1])),
+                        float(np.nanmin(ext[:, 2])), float(np.nanmax(ext[:, 3]))))
+    return geom
+
+
+class GeometryCache(object):
+    """ cache of drawing geometry by mode, the geometry is calculated again
+    only if element list or any element configuration (see
+    MagBlock.configVersion) or style is changed, geometry of another start
+    point is moved from the cached one; drawing parameters of element
+    objects are cached as well, i.e. only changed elements are read again.
+    """
+
+    def __init__(self):
+        self._rows = {}  # id: (element, configVersion, style, drawing parameters)
+        self._geoms = {}  # mode: (elements, versions, styles, startpoint, geometry)
+
+    def clear(self):
+        self._rows = {}
+        self._geoms = {}
+
+    def getGeometry(self, elements, startpoint=(0, 0), mode='plain'):
+        """ return drawing geometry of elements, see calcGeometry(), the
+        returned geometry should not be changed
+        """
+        startpoint = tuple(float(v) for v in startpoint)
+        versions = list(map(_configVersion, elements))
+        styles = list(map(_style, elements))
+        c = self._geoms.get(mode)
+        if c is not None and c[0] == elements and c[1] == versions and c[2] == styles:
+            if c[3] == startpoint:
+                return c[4]
+            geom = c[4].translate((startpoint[0] - c[3][0], startpoint[1] - c[3][1]))
+        else:
+            if c is not None and c[0] != elements:
+                # geometry of the other modes is not valid either
+                self._geoms = {}
+            geom = calcGeometry(elements, startpoint=startpoint, mode=mode, rows=self._rows)
+            if len(self._rows) > len(geom.defs):
+                self._rows = {id(e): self._rows[id(e)] for e in geom.defs}
+        self._geoms[mode] = (list(elements), versions, styles, startpoint, geom)
+        return geom
+
+
+class AnnotationLayer(Artist):
+    """ element annotations (see Models.draw()) drawn by one artist: the
+    arrows are drawn as one line collection, and the labels by one text
+    artist; only the labels in view and at least spacing pixels from each
+    other are drawn, i.e. labels are decimated by density on screen at
+    the current zoom, see getShown().
+
+    :param anotes: element annotation list
+    :param showAccName: show names of accelerator tubes or band type
+        text, see Models.anoteElements()
+    :param efilter: element type name or tuple of names to annotate,
+        all by default
+    :param textypos: y coordinator of label, at the element by default
+    :param arrowprops: draw arrows from labels to elements if not None
+    :param spacing: minimal distance between labels, [pixel], 1.2 times
+        of font size by default
+    :param kwargs: text properties, e.g. color, rotation, fontsize, alpha
+    """
+
+    def __init__(self, anotes, showAccName=False, efilter=None, textypos=None,
+                 arrowprops=True, spacing=None, **kwargs):
+        Artist.__init__(self)
+        if isinstance(efilter, str):
+            efilter = (efilter,)
+        xy, textxy, labels, arrow = [], [], [], []
+        for anote in anotes:
+            if efilter is not None and anote['type'] not in efilter:
+                continue
+            xy.append(anote['xypos'])
+            if not showAccName and anote['type'] in ('RFCW', 'RFDF'):
+                textxy.append(anote['atext']['xypos'])
+                labels.append(anote['atext']['text'])
+                arrow.append(False)
+            else:
+                tx, ty = anote['textpos']
+                textxy.append((tx, ty if textypos is None else textypos))
+                labels.append(anote['name'])
+                arrow.append(arrowprops is not None)
+        self.xy = np.array(xy, dtype=np.float64).reshape(-1, 2)
+        self.textxy = np.array(textxy, dtype=np.float64).reshape(-1, 2)
+        self.labels = labels
+        self.arrow = np.array(arrow, dtype=bool)
+        self.spacing = spacing
+        self._text = Text(**kwargs)
+        self._arrows = LineCollection([], colors=[self._text.get_color()],
+                                      alpha=self._text.get_alpha(), linewidths=1.0,
+                                      transform=IdentityTransform())
+
+    def __len__(self):
+        return len(self.labels)
+
+    def set_figure(self, fig):
+        Artist.set_figure(self, fig)
+        self._text.set_figure(fig)
+        self._arrows.set_figure(fig)
+
+    def getShown(self):
+        """ return indices of the labels to draw at the current view
+        """
+        ax = self.axes
+        if ax is None or not len(self):
+            return np.zeros(0, dtype=int)
+        txy = ax.transData.transform(self.textxy)
+        bb = ax.bbox
+        idx = np.flatnonzero((txy[:, 0] >= bb.x0) & (txy[:, 0] <= bb.x1) &
+                             (txy[:, 1] >= bb.y0) & (txy[:, 1] <= bb.y1))
+        spacing = self.spacing
+        if spacing is None:
+            spacing = 1.2 * self._text.get_size() * self.figure.dpi / 72.0
+        # the first label of each cell of spacing x spacing pixels
+        cell = np.floor(txy[idx] / spacing).astype(np.int64)
+        first = np.unique(cell, axis=0, return_index=True)[1]
+        return idx[np.sort(first)]
+
+    def draw(self, renderer):
+        if not self.get_visible() or self.axes is None:
+            return
+        idx = self.getShown()
+        if not len(idx):
+            return
+        trans = self.axes.transData
+        sel = idx[self.arrow[idx]]
+        if len(sel):
+            # arrows in display coordinates, head of 30 deg, 5 points long
+            p0, p1 = trans.transform(self.textxy[sel]), trans.transform(self.xy[sel])
+            d = p0 - p1
+            d /= np.maximum(np.hypot(d[:, 0], d[:, 1]), 1e-9)[:, None]
+            hl = 5.0 * self.figure.dpi / 72.0
+            c, s = np.cos(np.pi / 12), np.sin(np.pi / 12)
+            h1 = p1 + hl * np.stack((c * d[:, 0] - s * d[:, 1], s * d[:, 0] + c * d[:, 1]), axis=1)
+            h2 = p1 + hl * np.stack((c * d[:, 0] + s * d[:, 1], -s * d[:, 0] + c * d[:, 1]), axis=1)
+            segs = np.concatenate((np.stack((p0, p1), axis=1), np.stack((h1, p1), axis=1),
+                                   np.stack((h2, p1), axis=1)))
+            self._arrows.set_segments(segs)
+            self._arrows.set_clip_box(self.axes.bbox)
+            self._arrows.draw(renderer)
+        text = self._text
+        text.set_transform(trans)
+        text.set_clip_box(self.axes.bbox)
+        for i in idx.tolist():
+            text.set_position(self.textxy[i])
+            text.set_text(self.labels[i])
+            text.draw(renderer)
+        self.stale = False
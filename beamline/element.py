@@ -7,16 +7,33 @@
 .. Created     : 2016-03-22
 """
 
+import copy
 import json
 
-import epics
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.path import Path
+from . import ctrlutils
 from . import mathutils
 
 
+class _CommInfo(object):
+    """ descriptor of common information, ``MagBlock.comminfo`` is the
+    shared dict for all elements, ``element.comminfo`` is the shared dict
+    when element is created, i.e. reference but not copy, ``setCommInfo()``
+    creates new dict rather than updating it in place.
+    """
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return MagBlock._comminfo_shared
+        return obj._comminfo
+
+    def __set__(self, obj, value):
+        obj._comminfo = value
+
+
 class MagBlock(object):
     """ Super class of all elements, part of configuration parameters are
     defined here:
@@ -27,13 +44,28 @@ class MagBlock(object):
     * __styleconfig_dict: style configurations for element drawing, could be defined by setStyleConfig() static method;
 
     New element should inherit MagBlock, and define following methods:
-    __init__(), setStyle(), setDraw()
+    __init__(), setStyle(), setDraw(), the element type name is
+    defined by class attribute ``typename``, and new attributes
+    should be declared in ``__slots__``.
+
+    Element style is shared with all the elements of the same kind
+    (see ``_styleKind``) until ``setStyle()`` is called, transport
+    matrix is created when requested.
 
     class constructor
     :param name: literal name of the element, None by default
     """
+    __slots__ = ('_name', '_comminfo', '_confver',
+                 'simuinfo', 'ctrlinfo', 'miscinfo',
+                 'transfun', '_style', '_patches', '_anote',
+                 'next_p0', 'next_inc_angle',
+                 '_spos', '_transM', 'transM_flag')
+
+    typename = None  # element type name
     objcnt = 0  # object counter
-    comminfo = {}  # common information
+    comminfo = _CommInfo()  # common information
+    _comminfo_shared = {}
+    _styleKind = None  # key of __styleconfig_dict for element style
     __styleconfig_dict = {
         'quad':
             {'h': 0.6, 'fc': 'red', 'ec': 'red', 'alpha': 0.50, },
@@ -45,6 +77,7 @@ class MagBlock(object):
             {'lw': 1, 'color': '#FF9500', 'alpha': 0.75},
     }  # global configuration for element style, dict
     __styleconfig_json = json.dumps(__styleconfig_dict)
+    _style_shared = {}  # element styles derived from __styleconfig_dict, by kind
 
     def __init__(self, name=None):
         """ class constructor
@@ -53,43 +86,67 @@ class MagBlock(object):
 
         MagBlock.objcnt += 1
         self._name = name  # element name
-        self.typename = None  # element type name
-        self.comminfo = {k: v for k, v in MagBlock.comminfo.items()}  # common information
+        self._comminfo = MagBlock._comminfo_shared  # common information
 
         self.simuinfo = {}  # simulation information
         self.ctrlinfo = {}  # control information
         self.miscinfo = {}  # other information
+        self._confver = 0  # configuration version, increased by setConf()
 
-        self.simukeys = []  # keywords of simulation information
-        self.ctrlkeys = []  # keywords of control information
-        self.misckeys = []  # keywords of other information
         self.transfun = None  # unit translation function
 
-        self.setConfDict = {'simu': self._setSimuConf,
-                            'ctrl': self._setCtrlConf,
-                            'misc': self._setMiscConf}
-
-        self.prtConfigDict = {'simu': self._printSimuConf,
-                              'ctrl': self._printCtrlConf,
-                              'misc': self._printMiscConf,
-                              'comm': self._printCommConf,
-                              'all': self._printAllConf}
-
-        self.dumpConfigDict = {'simu': self._dumpSimuConf,
-                               'ctrl': self._dumpCtrlConf,
-                               'misc': self._dumpMiscConf,
-                               'comm': self._dumpCommConf,
-                               'all': self._dumpAllConf,
-                               'online': self._dumpOnlineConf}
-
-        self.styledict = {}  # style dict
-        self._patches = []  # patches list, empty
+        self._style = MagBlock._getSharedStyle(self._styleKind)
+        self._patches = ()  # patches list, empty
         self.next_inc_angle = 0  # for visualization, initial incremental angle
 
-        self._spos = None  # element position along beamline/lattice, in [m]
-        self.transM = np.eye(6, 6, dtype=np.float64)  # default element transport matrix
+        self._spos = None  # position along beamline, [m], or (store, index), see bindPosition()
+        self._transM = None  # element transport matrix, unity by default
         self.transM_flag = False  # if calcTransM() is called
 
+    @staticmethod
+    def _getSharedStyle(kind):
+        """ style dict shared by the elements of the same kind,
+        'quad' and 'bend' take line width from 'drift'.
+
+        :param kind: 'quad', 'bend', 'drift', 'moni' or None
+        """
+        if kind is None:
+            return None
+        style = MagBlock._style_shared.get(kind)
+        if style is None:
+            sdict = MagBlock._MagBlock__styleconfig_dict
+            style = dict(sdict[kind])
+            if kind in ('quad', 'bend'):
+                style['lw'] = sdict['drift']['lw']
+            MagBlock._style_shared[kind] = style
+        return style
+
+    @property
+    def simukeys(self):
+        """ keywords of simulation information """
+        return list(self.simuinfo)
+
+    @property
+    def ctrlkeys(self):
+        """ keywords of control information """
+        return list(self.ctrlinfo)
+
+    @property
+    def misckeys(self):
+        """ keywords of other information """
+        return list(self.miscinfo)
+
+    @property
+    def transM(self):
+        """ transport matrix, 6 x 6 unity matrix by default """
+        if self._transM is None:
+            self._transM = np.eye(6, 6, dtype=np.float64)
+        return self._transM
+
+    @transM.setter
+    def transM(self, m):
+        self._transM = m
+
     @property
     def name(self):
         """ element name property
@@ -104,6 +161,15 @@ class MagBlock(object):
         :return: None
         """
         self._name = name
+        self._confver += 1
+
+    @property
+    def configVersion(self):
+        """ configuration version, increased when configuration or name is
+        changed through setConf() or name, could be used to check if the
+        element is changed, e.g. Models caches dumped configurations
+        """
+        return self._confver
 
     @staticmethod
     def rot(inputArray, theta=0, pc=(0, 0)):
@@ -164,12 +230,13 @@ class MagBlock(object):
                             * infostr is a dict, {k1:v1, k2:v2}
                             * infostr is a string, with format like: "k1=v1, k2=v2"
         """
+        if isinstance(infostr, str):
+            infostr = MagBlock.str2dict(infostr)
         if isinstance(infostr, dict):
-            for k, v in infostr.items():
-                MagBlock.comminfo[k] = v
-        elif isinstance(infostr, str):
-            for k, v in MagBlock.str2dict(infostr).items():
-                MagBlock.comminfo[k] = v
+            # new dict, the ones referred by created elements are not touched
+            comminfo = dict(MagBlock._comminfo_shared)
+            comminfo.update(infostr)
+            MagBlock._comminfo_shared = comminfo
         else:
             print("Information string ERROR.")
 
@@ -219,17 +286,17 @@ class MagBlock(object):
         else:
             if config is None:
                 config = MagBlock._MagBlock__styleconfig_dict
-            if isinstance(config, dict):
-                for k in set(config.keys()) & set(MagBlock._MagBlock__styleconfig_dict.keys()):
-                    for k1 in set(config[k].keys()) & set(MagBlock._MagBlock__styleconfig_dict[k].keys()):
-                        MagBlock._MagBlock__styleconfig_dict[k][k1] = config[k][k1]
-                MagBlock._MagBlock__styleconfig_json = json.dumps(MagBlock._MagBlock__styleconfig_dict)
-            elif isinstance(config, str):
+            if isinstance(config, str):
                 config = json.loads(config)
-                for k in set(config.keys()) & set(MagBlock._MagBlock__styleconfig_dict.keys()):
-                    for k1 in set(config[k].keys()) & set(MagBlock._MagBlock__styleconfig_dict[k].keys()):
-                        MagBlock._MagBlock__styleconfig_dict[k][k1] = config[k][k1]
-                MagBlock._MagBlock__styleconfig_json = json.dumps(MagBlock._MagBlock__styleconfig_dict)
+            if isinstance(config, dict):
+                # new dicts, styles referred by created elements are not touched
+                sdict = {k: dict(v) for k, v in MagBlock._MagBlock__styleconfig_dict.items()}
+                for k in set(config.keys()) & set(sdict.keys()):
+                    for k1 in set(config[k].keys()) & set(sdict[k].keys()):
+                        sdict[k][k1] = config[k][k1]
+                MagBlock._MagBlock__styleconfig_dict = sdict
+                MagBlock._MagBlock__styleconfig_json = json.dumps(sdict)
+                MagBlock._style_shared = {}
             else:
                 print("Information string ERROR.")
 
@@ -246,14 +313,27 @@ class MagBlock(object):
         else:
             if isinstance(conf, str):
                 conf = MagBlock.str2dict(conf)
-            self.setConfDict[type](conf)
+            self.setConfDict[type](self, conf)
+            self._confver += 1
+
+    @property
+    def style(self):
+        """ element style dict, should not be modified, use setStyle() """
+        return self._style
 
     def setStyle(self, **style):
         """ set element style configuration
 
         :param style: dict of keys: 'color', 'h', 'alpha'
         """
-        pass
+        if self._style is None:
+            return
+        keys = set(style.keys()) & set(self._style.keys())
+        if keys:
+            # copy on write, the shared style is not touched
+            self._style = dict(self._style)
+            for k in keys:
+                self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -272,8 +352,8 @@ class MagBlock(object):
         print("{s1}{s2:^22s}{s1}".format(s1="-" * 10, s2="Configuration START"))
         print("Element name: {en} ({cn})".format(en=self.name, cn=self.__class__.__name__))
         if self._spos is not None:
-            print("Position: s = {pos:.3f} [m]".format(pos=float(self._spos)))
-        self.prtConfigDict[type]()
+            print("Position: s = {pos:.3f} [m]".format(pos=self.getPosition()))
+        self.prtConfigDict[type](self)
         print("{s1}{s2:^22s}{s1}".format(s1="-" * 10, s2="Configuration END"))
 
     def dumpConfig(self, type='online', format='elegant'):
@@ -283,7 +363,7 @@ class MagBlock(object):
         :param type: comm, simu, ctrl, misc, all, online (default)
         :param format: elegant/mad, elegant by default
         """
-        return self.dumpConfigDict[type](format)
+        return self.dumpConfigDict[type](self, format)
 
     def getConfig(self, type='online', format='elegant'):
         """ only dump configuration part, dict
@@ -291,22 +371,40 @@ class MagBlock(object):
         :param type: comm, simu, ctrl, misc, all, online (default)
         :param format: elegant/mad, elegant by default
         """
-        return list(list(self.dumpConfigDict[type](format).values())[0].values())[0]
+        return list(list(self.dumpConfigDict[type](self, format).values())[0].values())[0]
+
+    def __getstate__(self):
+        """ state for copy and pickle, the position is detached from model,
+        i.e. copies keep the current position, see bindPosition()
+        """
+        state = {}
+        for cls in type(self).__mro__:
+            for k in getattr(cls, '__slots__', ()):
+                if hasattr(self, k):
+                    state[k] = getattr(self, k)
+        state['_spos'] = self.getPosition()
+        return None, state
+
+    def shallowCopy(self):
+        """ return a copy of element, configuration dicts (simu, ctrl, misc)
+        are copied, the other attributes are shared with this element,
+        much cheaper than copy.deepcopy(), used by Models for copy on write;
+        the position is detached from model, see bindPosition()
+        """
+        e = copy.copy(self)
+        e.simuinfo = dict(self.simuinfo)
+        e.ctrlinfo = dict(self.ctrlinfo)
+        e.miscinfo = dict(self.miscinfo)
+        return e
 
     def _setSimuConf(self, conf):
         self.simuinfo.update(conf)
-        self.simukeys.extend(conf.keys())
-        self.simukeys = list(set(self.simukeys))
 
     def _setCtrlConf(self, conf):
         self.ctrlinfo.update(conf)
-        self.ctrlkeys.extend(conf.keys())
-        self.ctrlkeys = list(set(self.ctrlkeys))
 
     def _setMiscConf(self, conf):
         self.miscinfo.update(conf)
-        self.misckeys.extend(conf.keys())
-        self.misckeys = list(set(self.misckeys))
 
     def _printSimuConf(self):
         if self.simuinfo:
@@ -325,9 +423,10 @@ class MagBlock(object):
         """
         if self.ctrlinfo:
             print("Control configs:")
+            rvals = ctrlutils.getPVCache().getMany([v['pv'] for v in self.ctrlinfo.values()])
             for k, v in sorted(self.ctrlinfo.items(), reverse=True):
                 pv = v['pv']
-                rval = epics.caget(pv)
+                rval = rvals.get(pv)
                 if rval is None:
                     val = ''
                 else:
@@ -354,20 +453,21 @@ class MagBlock(object):
         self._printMiscConf()
 
     def _dumpSimuConf(self, format):
-        return {self.name.upper(): {self.typename: {k: self.simuinfo[k] for k in self.simukeys}}}
+        return {self.name.upper(): {self.typename: dict(self.simuinfo)}}
 
     def _dumpMiscConf(self, format):
-        return {self.name.upper(): {self.typename: {k: self.miscinfo[k] for k in self.misckeys}}}
+        return {self.name.upper(): {self.typename: dict(self.miscinfo)}}
 
     def _dumpCtrlConf(self, format):
-        return {self.name.upper(): {self.typename: {k: self.ctrlinfo[k] for k in self.ctrlkeys}}}
+        return {self.name.upper(): {self.typename: dict(self.ctrlinfo)}}
 
     def _dumpCommConf(self, format):
         return {self.name.upper(): {self.typename: {k: self.comminfo[k] for k in self.comminfo.keys()}}}
 
     def _dumpAllConf(self, format):
         allinfo = {}
-        map(allinfo.update, [self.comminfo, self.miscinfo, self.simuinfo, self.ctrlinfo])
+        for info in (self.comminfo, self.miscinfo, self.simuinfo, self.ctrlinfo):
+            allinfo.update(info)
         return {self.name.upper(): {self.typename: {k: allinfo[k] for k in allinfo.keys()}}}
 
     def _dumpOnlineConf(self, format):
@@ -379,7 +479,7 @@ class MagBlock(object):
         would not be changed.
         """
         oinfod = {k: v for k, v in self.simuinfo.items()}
-        for k in (set(oinfod.keys()) & set(self.ctrlkeys)):
+        for k in (set(oinfod.keys()) & set(self.ctrlinfo.keys())):
             oinfod[k] = self.ctrlinfo[k]
         return {self.name.upper(): {self.typename: oinfod}}
 
@@ -403,7 +503,7 @@ class MagBlock(object):
 
         :param fignum: define figure number to show element drawing
         """
-        if self._patches == []:
+        if not self._patches:
             print("Please setDraw() before showDraw(), then try again.")
             return
         else:
@@ -441,21 +541,51 @@ class MagBlock(object):
         (by default, will complete after Models.addElement() method)
         i.e. valid position in [m] would return after lattice modeled.
         """
-        return self._spos
+        s = self._spos
+        if type(s) is tuple:  # view of model positions, see bindPosition()
+            return float(s[0].spos[s[1]])
+        return s
 
     def setPosition(self, s):
-        """ set element position along beamline/lattice, in [m]
+        """ set element position along beamline/lattice, in [m],
+        the model position is written if bound, see bindPosition()
 
         :param s: element position measured by meter
         """
-        self._spos = s
+        if type(self._spos) is tuple:
+            store, i = self._spos
+            store.spos[i] = s
+        else:
+            self._spos = s
+
+    def bindPosition(self, store, index=None):
+        """ bind element position to the position array of model, i.e.
+        getPosition() and setPosition() are views of ``store.spos[index]``;
+        copies of element are not bound (see copy.copy(), shallowCopy())
+
+        :param store: object with float array attribute 'spos', e.g.
+            position store of Models; None to unbind, the current position is kept
+        :param index: element index in 'spos'
+        """
+        if store is None:
+            self._spos = self.getPosition()
+        else:
+            self._spos = (store, index)
+
+    def getPositionStore(self):
+        """ return the position store which element position is bound to,
+        None if not bound, see bindPosition()
+        """
+        if type(self._spos) is tuple:
+            return self._spos[0]
+        return None
 
     def getLength(self):
         """ return element length if valid, or return 0.0
         """
         try:
-            l = float(self.getConfig(type='simu')['l'])
-        except:
+            l = float(self.simuinfo['l'])
+        except (KeyError, TypeError, ValueError):
             l = 0.0
 
         return l
@@ -476,6 +606,24 @@ class MagBlock(object):
         """
         return self.transM[i - 1, j - 1]
 
+    # dispatch tables, shared by all elements, call with element as first argument
+    setConfDict = {'simu': _setSimuConf,
+                   'ctrl': _setCtrlConf,
+                   'misc': _setMiscConf}
+
+    prtConfigDict = {'simu': _printSimuConf,
+                     'ctrl': _printCtrlConf,
+                     'misc': _printMiscConf,
+                     'comm': _printCommConf,
+                     'all': _printAllConf}
+
+    dumpConfigDict = {'simu': _dumpSimuConf,
+                      'ctrl': _dumpCtrlConf,
+                      'misc': _dumpMiscConf,
+                      'comm': _dumpCommConf,
+                      'all': _dumpAllConf,
+                      'online': _dumpOnlineConf}
+
 
 class ElementCharge(MagBlock):
     """ charge element
@@ -489,9 +637,11 @@ class ElementCharge(MagBlock):
     >>> q = ElementCharge(name='q', config=chconf)
     """
 
+    __slots__ = ()
+    typename = 'CHARGE'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'CHARGE'
         self.setConf(config)
 
 
@@ -499,9 +649,11 @@ class ElementCenter(MagBlock):
     """ center element
     """
 
+    __slots__ = ()
+    typename = 'CENTER'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'CENTER'
         self.setConf(config)
 
 
@@ -509,20 +661,13 @@ class ElementCsrcsben(MagBlock):
     """ csrcsben element
     """
 
+    __slots__ = ('_bend_field', '_rho')
+    typename = 'CSRCSBEN'
+    _styleKind = 'bend'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'CSRCSBEN'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['bend'].items()}
-        self._style['lw'] = MagBlock._MagBlock__styleconfig_dict['drift']['lw']
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -532,14 +677,12 @@ class ElementCsrcsben(MagBlock):
         :param mode: artist mode, 'plain' or 'fancy', 'plain' by default
         """
         sconf = self.getConfig(type='simu')
-        self._style['w'] = float(sconf['l'])  # element width
-        self._style['angle'] = float(sconf['angle']) / np.pi * 180  # bending angle, [deg]
-        _width = self._style['w']
+        _width = float(sconf['l'])  # element width
+        _angle = float(sconf['angle']) / np.pi * 180  # bending angle, [deg]
         _height = self._style['h']
         _fc = self._style['fc']
         _ec = self._style['ec']
         _alpha = self._style['alpha']
-        _angle = self._style['angle']
         _lw = self._style['lw']
 
         if mode == 'plain':
@@ -666,19 +809,13 @@ class ElementCsrdrift(MagBlock):
     """ csrdrift element
     """
 
+    __slots__ = ()
+    typename = 'CSRDRIFT'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'CSRDRIFT'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -689,12 +826,10 @@ class ElementCsrdrift(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -749,19 +884,13 @@ class ElementDrift(MagBlock):
     """ drift element
     """
 
+    __slots__ = ()
+    typename = 'DRIFT'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'DRIFT'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -772,12 +901,10 @@ class ElementDrift(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -832,19 +959,13 @@ class ElementKicker(MagBlock):
     """ kicker element
     """
 
+    __slots__ = ()
+    typename = 'KICKER'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'KICKER'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -855,12 +976,10 @@ class ElementKicker(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -899,19 +1018,13 @@ class ElementLscdrift(MagBlock):
     """ lscdrift element
     """
 
+    __slots__ = ()
+    typename = 'LSCDRIFT'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'LSCDRIFT'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -922,12 +1035,10 @@ class ElementLscdrift(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['lemgth'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -982,19 +1093,13 @@ class ElementMark(MagBlock):
     """ mark element
     """
 
+    __slots__ = ()
+    typename = 'MARK'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'MARK'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1005,12 +1110,10 @@ class ElementMark(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -1049,19 +1152,13 @@ class ElementMoni(MagBlock):
     """ moni element
     """
 
+    __slots__ = ()
+    typename = 'MONI'
+    _styleKind = 'moni'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'MONI'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['moni'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1072,12 +1169,10 @@ class ElementMoni(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _fancyc = self._style['color']
         _alpha = self._style['alpha']
@@ -1166,12 +1261,13 @@ class ElementQuad(MagBlock):
     """ quad element
     """
 
+    __slots__ = ()
+    typename = 'QUAD'
+    _styleKind = 'quad'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'QUAD'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['quad'].items()}
-        self._style['lw'] = MagBlock._MagBlock__styleconfig_dict['drift']['lw']
 
     def unitTrans(self, inval, direction='+', transfun=None):
         transfun = self.transfun
@@ -1184,14 +1280,6 @@ class ElementQuad(MagBlock):
                 outval = 0.5 * inval
         return outval
 
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
-
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
             
@@ -1201,8 +1289,7 @@ class ElementQuad(MagBlock):
         """
 
         sconf = self.getConfig(type='simu')
-        self._style['w'] = float(sconf['l'])  # element width
-        _width = self._style['w']
+        _width = float(sconf['l'])  # element width
         _height = self._style['h']
         _fc = self._style['fc']
         _ec = self._style['ec']
@@ -1304,7 +1391,7 @@ class ElementQuad(MagBlock):
         """
         if type == 'ctrl':
             pv = self.ctrlinfo.get('k1')['pv']
-            rval = epics.caget(pv)
+            rval = ctrlutils.getPVCache().get(pv)
             if rval is None:
                 val = self.getConfig(type='simu')['k1']
             else:
@@ -1318,19 +1405,13 @@ class ElementRfcw(MagBlock):
     """ rfcw element
     """
 
+    __slots__ = ('_atext',)
+    typename = 'RFCW'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'RFCW'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1341,12 +1422,10 @@ class ElementRfcw(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -1413,24 +1492,47 @@ class ElementRfcw(MagBlock):
         self._anote = {'xypos': pc, 'textpos': pc, 'name': self.name.upper(), 'type': self.typename,
                        'atext': self._atext}
 
+    def getEnergyGain(self):
+        """ energy gain of the reference particle, i.e. change of gamma value,
+        phase of 90 [deg] is on-crest, 0 by default as ELEGANT
+
+        :return: gamma gain
+        """
+        sconf = self.getConfig(type='simu')
+        volt = float(sconf.get('volt', 0.0))
+        phase = float(sconf.get('phase', 0.0))
+        return float(mathutils.rfEnergyGain(volt, phase)[0])
+
+    def calcTransM(self, gamma=None):
+        """ calculate transport matrix, including adiabatic damping and
+        the focusing from entrance and exit fields,
+        see ``mathutils.transRfcwBatch``
+
+        :param gamma: electron energy measured by mc^2, at the entrance
+        :return: transport matrix
+        :rtype: numpy array
+        """
+        sconf = self.getConfig(type='simu')
+        l = float(sconf.get('l', 0.0))
+        volt = float(sconf.get('volt', 0.0))
+        phase = float(sconf.get('phase', 0.0))
+        freq = float(sconf.get('freq', 2856.0e6))
+        self.transM = mathutils.transRfcwBatch(l, volt, phase, freq, gamma)[0]
+        self.transM_flag = True
+        return self.transM
+
 
 class ElementRfdf(MagBlock):
     """ rfdf element
     """
 
+    __slots__ = ('_atext',)
+    typename = 'RFDF'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'RFDF'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1441,12 +1543,10 @@ class ElementRfdf(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -1515,24 +1615,32 @@ class ElementRfdf(MagBlock):
         self._anote = {'xypos': pc, 'textpos': pc, 'name': self.name.upper(), 'type': self.typename,
                        'atext': self._atext}
 
+    def calcTransM(self, gamma=None):
+        """ calculate transport matrix, deflecting cavity does not change
+        the reference energy, treated as drift in the linear model
+
+        :param gamma: electron energy measured by mc^2
+        :return: transport matrix
+        :rtype: numpy array
+        """
+        sconf = self.getConfig(type='simu')
+        l = float(sconf.get('l', 0.0))
+        self.transM = mathutils.transDriftBatch(l, gamma)[0]
+        self.transM_flag = True
+        return self.transM
+
 
 class ElementWake(MagBlock):
     """ wake element
     """
 
+    __slots__ = ()
+    typename = 'WAKE'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'WAKE'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1543,12 +1651,10 @@ class ElementWake(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -1584,19 +1690,13 @@ class ElementWatch(MagBlock):
     """ watch element
     """
 
+    __slots__ = ()
+    typename = 'WATCH'
+    _styleKind = 'drift'
+
     def __init__(self, name=None, config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'WATCH'
         self.setConf(config)
-        self._style = {k: v for k, v in MagBlock._MagBlock__styleconfig_dict['drift'].items()}
-
-    @property
-    def style(self):
-        return self._style
-
-    def setStyle(self, **style):
-        for k in set(style.keys()) & set(self._style.keys()):
-            self._style[k] = style[k]
 
     def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
         """ set element visualization drawing
@@ -1607,12 +1707,10 @@ class ElementWatch(MagBlock):
         """
         sconf = self.getConfig(type='simu')
         if 'l' in sconf:
-            self._style['length'] = float(sconf['l'])
+            _length = float(sconf['l'])
         else:
-            self._style['length'] = 0
-        self._style['angle'] = angle
+            _length = 0
         _theta = angle / 180.0 * np.pi  # deg to rad
-        _length = self._style['length']
         _lw = self._style['lw']
         _color = self._style['color']
         _alpha = self._style['alpha']
@@ -1651,9 +1749,11 @@ class ElementBeamline(MagBlock):
     """ beamline element, virtual element, does not present in ELEGANT
     """
 
+    __slots__ = ()
+    typename = 'BEAMLINE'
+
     def __init__(self, name='bl', config=None):
         MagBlock.__init__(self, name)
-        self.typename = 'BEAMLINE'
         self.setConf(config)
 
 
@@ -1662,6 +1762,41 @@ ElementLscdrif = ElementLscdrift
 ElementCsrdrif = ElementCsrdrift
 ElementCsrcsbent = ElementCsrcsben
 
+# element classes by type name, e.g. {'QUAD': ElementQuad}
+_element_registry = {}
+
+
+def registerElement(cls, *aliases):
+    """ register element class, so that lattice elements of type
+    ``cls.typename`` (and the alias type names) could be created in bulk,
+    see ``lattice.Lattice.makeElements()``.
+
+    :param cls: element class, subclass of ``MagBlock``
+    :param aliases: other type names, e.g. abbreviations used in lte file
+    """
+    for etype in (cls.typename,) + aliases:
+        _element_registry[etype.upper()] = cls
+
+
+def getElementClass(etype):
+    """ return element class of type name
+
+    :param etype: element type name, case insensitive, e.g. ``'quad'``
+    :return: element class, or None if not registered
+    """
+    return _element_registry.get(etype.upper())
+
+
+for _cls in (ElementCharge, ElementCenter, ElementCsrcsben, ElementCsrdrift,
+             ElementDrift, ElementKicker, ElementLscdrift, ElementMark,
+             ElementMoni, ElementQuad, ElementRfcw, ElementRfdf, ElementWake,
+             ElementWatch, ElementBeamline):
+    registerElement(_cls)
+registerElement(ElementDrift, 'DRIF')
+registerElement(ElementLscdrift, 'LSCDRIF')
+registerElement(ElementCsrdrift, 'CSRDRIF')
+registerElement(ElementCsrcsben, 'CSRCSBENT')
+
 
 def test():
     """
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+running Genesis simulations:
+    * GenesisJob: description of one simulation, input files and steps
+    * JobRunner: run jobs concurrently, each in an isolated directory
+    * GenesisOutput: read Genesis output file
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class GenesisJob(object):
+    """ One Genesis simulation, could be composed of several sequential
+    steps, e.g. modulator and radiator for HGHG, each step runs the
+    executable and feeds it with the name of the input file through stdin,
+    i.e. ``echo mod.in | genesis``.
+
+    :param inputs: list of input file names, run in sequence, relative to
+        the working directory
+    :param files: files to be copied into the working directory, list of
+        paths (copied by basename) or dict of ``{name: path}``
+    :param name: name of the job, used as the prefix of the working directory
+    :param executable: command to run, string or list, ``'genesis'`` by default
+    :param timeout: time limit of the whole job in [s], None for no limit
+    :param outputs: output file names of interest, relative to the working
+        directory, ``('rad.out',)`` by default
+    """
+
+    def __init__(self, inputs, files=None, name='genesis',
+                 executable='genesis', timeout=None, outputs=('rad.out',)):
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.inputs = list(inputs)
+        if files is None:
+            files = {}
+        elif not isinstance(files, dict):
+            files = {os.path.basename(f): f for f in files}
+        self.files = files
+        self.name = name
+        if isinstance(executable, str):
+            executable = [executable]
+        self.executable = list(executable)
+        self.timeout = timeout
+        self.outputs = tuple(outputs)
+
+    def prepare(self, workdir):
+        """ copy input files into working directory
+
+        :param workdir: working directory
+        """
+        for fname, fpath in self.files.items():
+            shutil.copy(fpath, os.path.join(workdir, fname))
+
+    def __repr__(self):
+        return "GenesisJob(name={0}, inputs={1})".format(self.name, self.inputs)
+
+
+class JobResult(object):
+    """ Result of one ``GenesisJob``
+
+    :param job: ``GenesisJob`` instance
+    :param workdir: working directory of the job
+    """
+
+    def __init__(self, job, workdir):
+        self.job = job
+        self.workdir = workdir
+        self.status = 'pending'  # 'done', 'failed', 'timeout', 'cancelled'
+        self.returncode = None
+        self.elapsed = 0.0
+        self.stdout = []
+        self.stderr = []
+
+    @property
+    def ok(self):
+        return self.status == 'done'
+
+    def getOutput(self, name=None):
+        """ path of output file
+
+        :param name: output file name, the first of ``job.outputs`` by default
+        """
+        if name is None:
+            name = self.job.outputs[0]
+        return os.path.join(self.workdir, name)
+
+    def __repr__(self):
+        return "JobResult(name={0}, status={1}, returncode={2}, elapsed={3:.3f})".format(
+            self.job.name, self.status, self.returncode, self.elapsed)
+
+
+class JobRunner(object):
+    """ Run ``GenesisJob`` concurrently with bounded number of processes,
+    each job runs in its own working directory (created under ``basedir``),
+    so that output files of different jobs never clobber each other.
+
+    Usage:
+
+    >>> runner = JobRunner(max_workers=4)
+    >>> jobs = [GenesisJob(['mod.in', 'rad.in'], files=flist[i], name='scan{0}'.format(i))
+    ...         for i in range(10)]
+    >>> results = runner.runAll(jobs)
+    >>> [r.getOutput() for r in results if r.ok]
+    >>> runner.shutdown()  # working directories are removed
+
+    :param max_workers: max number of concurrent processes, CPU count by default
+    :param basedir: parent directory of working directories, system temporary
+        directory by default
+    :param keep: keep working directories after shutdown() or not, False by
+        default, see cleanup()
+    """
+
+    def __init__(self, max_workers=None, basedir=None, keep=False):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.basedir = basedir
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._procs = set()
+        self._workdirs = []
+        self._lock = threading.Lock()
+        # cancel flag of the jobs submitted so far, replaced by cancel()
+        self._cancelled = threading.Event()
+
+    def submit(self, job):
+        """ submit job
+
+        :param job: ``GenesisJob`` instance
+        :return: ``concurrent.futures.Future``, result is ``JobResult``
+        """
+        with self._lock:
+            cancelled = self._cancelled
+        return self._submit(job, cancelled)
+
+    def runAll(self, jobs):
+        """ run all jobs, wait until all finished
+
+        :param jobs: list of ``GenesisJob``
+        :return: list of ``JobResult``, in the same order of jobs
+        """
+        with self._lock:
+            cancelled = self._cancelled
+        futures = [self._submit(job, cancelled) for job in jobs]
+        return [f.result() for f in futures]
+
+    def cancel(self):
+        """ cancel all pending and running jobs, the jobs submitted
+        afterwards are not affected
+        """
+        with self._lock:
+            self._cancelled.set()
+            self._cancelled = threading.Event()
+            procs = list(self._procs)
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+
+    def shutdown(self, wait=True):
+        """ shutdown runner, no more jobs could be submitted
+
+        :param wait: wait for the running jobs or not
+        """
+        if not wait:
+            self.cancel()
+        self._executor.shutdown(wait=wait)
+        if not self.keep:
+            self.cleanup()
+
+    def cleanup(self):
+        """ remove working directories of all submitted jobs, output files
+        of ``JobResult`` are not available afterwards
+        """
+        with self._lock:
+            workdirs, self._workdirs = self._workdirs, []
+        for d in workdirs:
+            shutil.rmtree(d, ignore_errors=True)
+
+    def _submit(self, job, cancelled):
+        workdir = tempfile.mkdtemp(prefix=job.name + '_', dir=self.basedir)
+        with self._lock:
+            self._workdirs.append(workdir)
+        result = JobResult(job, workdir)
+        return self._executor.submit(self._runJob, result, cancelled)
+
+    def _runJob(self, result, cancelled):
+        job = result.job
+        t0 = time.time()
+        if cancelled.is_set():
+            result.status = 'cancelled'
+            return result
+        try:
+            job.prepare(result.workdir)
+        except (IOError, OSError) as e:
+            result.status = 'failed'
+            result.stderr.append(str(e))
+            return result
+
+        result.status = 'done'
+        for infile in job.inputs:
+            timeout = None
+            if job.timeout is not None:
+                timeout = max(job.timeout - (time.time() - t0), 0)
+            try:
+                proc = subprocess.Popen(job.executable, cwd=result.workdir,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        universal_newlines=True)
+            except OSError as e:
+                result.status = 'failed'
+                result.stderr.append(str(e))
+                break
+            with self._lock:
+                self._procs.add(proc)
+            try:
+                # cancel() may be called between Popen and registration
+                if cancelled.is_set():
+                    proc.kill()
+                out, err = proc.communicate(infile + '\n', timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                out, err = proc.communicate()
+                result.status = 'timeout'
+            finally:
+                with self._lock:
+                    self._procs.discard(proc)
+            result.stdout.append(out)
+            result.stderr.append(err)
+            result.returncode = proc.returncode
+            if result.status == 'timeout':
+                break
+            if cancelled.is_set():
+                result.status = 'cancelled'
+                break
+            if proc.returncode != 0:
+                result.status = 'failed'
+                break
+        result.elapsed = time.time() - t0
+        return result
+
+
+def _toArray(text, ncol):
+    """ convert block of numbers into (nrow, ncol) array,
+    Fortran style exponents, e.g. ``1.0D+00`` are supported.
+    """
+    try:
+        a = np.array(text.split(), dtype=np.float64)
+    except ValueError:
+        a = np.array(text.replace('D', 'E').replace('d', 'e').split(), dtype=np.float64)
+    return a.reshape(-1, ncol)
+
+
+class GenesisOutput(object):
+    """ Genesis 1.3 output file reader, the whole file is read once, section
+    headers are located by string searching, numeric blocks are converted
+    in bulk, only the requested slices and columns are kept.
+
+    Usage:
+
+    >>> out = GenesisOutput('rad.out', columns=['power', 'bunching'])
+    >>> out.getColumn('z[m]'), out.getColumn('power', islice=0)
+
+    :param filename: output file name
+    :param slices: indices (starting from 0) of slices to load, all by default
+    :param columns: names of slice columns to load, e.g. ``['power', 'xrms']``,
+        all by default
+    """
+
+    _SLICE_MARK = '********** output: slice'
+
+    def __init__(self, filename='rad.out', slices=None, columns=None):
+        self.filename = filename
+        with open(filename, 'r') as f:
+            self._text = f.read()
+        self.params = {}
+        self.entries = 0
+        self.zcolumns = []
+        self.zdata = np.zeros([0, 0])
+        self.columns = []
+        self.slices = []
+        self.current = np.zeros(0)
+        self.data = np.zeros([0, 0, 0])
+        self._parseHeader()
+        self._parseSlices(slices, columns)
+        del self._text
+
+    def _line(self, pos):
+        """ return (start, end) of the line at position pos
+        """
+        text = self._text
+        start = text.rfind('\n', 0, pos) + 1
+        end = text.find('\n', pos)
+        if end < 0:
+            end = len(text)
+        return start, end
+
+    def _find(self, section, pos, islice):
+        """ position of section header in slice islice starting at position
+        pos, raise ValueError if not found
+        """
+        text = self._text
+        stop = text.find(self._SLICE_MARK, pos + 1)
+        i = text.find(section, pos, stop if stop >= 0 else len(text))
+        if i < 0:
+            raise ValueError("section '{0}' not found in slice {1} of {2}".format(
+                section, islice + 1, self.filename))
+        return i
+
+    def _block(self, start):
+        """ numeric block starting at position start, ends with blank line,
+        slice header or end of file
+        """
+        text = self._text
+        end = text.find('\n\n', start)
+        mark = text.find(self._SLICE_MARK, start)
+        ends = [i for i in (end, mark) if i >= 0]
+        return text[start:min(ends) if ends else len(text)]
+
+    def _parseHeader(self):
+        text = self._text
+        # input namelist
+        i0, i1 = text.find('$newrun'), text.find('$end')
+        if i0 >= 0 and i1 > i0:
+            for line in text[i0 + 7:i1].splitlines():
+                if '=' in line:
+                    k, v = line.split('=', 1)
+                    self.params[k.strip().lower()] = v.strip()
+        pos = text.find('entries per record')
+        if pos >= 0:
+            start, end = self._line(pos)
+            self.entries = int(text[start:end].split()[0])
+        pos = text.find('z[m]')
+        if pos >= 0:
+            start, end = self._line(pos)
+            self.zcolumns = text[start:end].split()
+            self.zdata = _toArray(self._block(end + 1), len(self.zcolumns))
+
+    def _parseSlices(self, slices, columns):
+        text = self._text
+        marks = []
+        pos = text.find(self._SLICE_MARK)
+        while pos >= 0:
+            marks.append(pos)
+            pos = text.find(self._SLICE_MARK, pos + 1)
+        if slices is None:
+            slices = range(len(marks))
+        self.slices = list(slices)
+        current, data = [], []
+        usecols = None
+        for i in self.slices:
+            pos = marks[i]
+            # slice current
+            start, end = self._line(self._find('current', pos, i))
+            current.append(float(text[start:end].split()[0].replace('D', 'E')))
+            # column names, then data
+            start, end = self._line(self._find('power', pos, i))
+            names = text[start:end].split()
+            if usecols is None:
+                self.columns = names if columns is None else list(columns)
+                usecols = [names.index(c) for c in self.columns]
+            d = _toArray(self._block(end + 1), len(names))
+            data.append(d[:, usecols] if columns is not None else d)
+        self.current = np.array(current)
+        if data:
+            self.data = np.array(data)
+        else:
+            self.data = np.zeros([0, self.entries, len(self.columns)])
+
+    def getParam(self, name):
+        """ value of input parameter, as string
+
+        :param name: parameter name, e.g. ``'aw0'``
+        """
+        return self.params.get(name.lower())
+
+    def getColumn(self, name, islice=0):
+        """ data column along z
+
+        :param name: column name, ``'z[m]'``, ``'aw'``, ``'qfld'`` or slice columns
+        :param islice: index of slice in the loaded slices
+        :return: 1D numpy array
+        """
+        if name in self.zcolumns:
+            return self.zdata[:, self.zcolumns.index(name)]
+        return self.data[islice, :, self.columns.index(name)]
@@ -19,6 +19,7 @@ runtime calculations.
 .. Created     : 2016-01-28
 """
 
+import copy
 import json
 import os
 import time
@@ -33,6 +34,7 @@ except ImportError:
 from pyrpn import rpn
 
 from . import element
+from . import models
 
 
 class LteParser(object):
@@ -874,17 +876,77 @@ class Lattice(object):
     def makeElement(self, kw):
         """ return element object regarding the keyword configuration
         """
-        kw_name = kw
-        kw_type = self.getElementType(kw_name)
-        kw_config = {k.lower(): v for k, v in self.getElementConf(kw_name).items()}
-        objtype = 'Element' + kw_type.capitalize()
-        retobj = getattr(element, objtype)(name=kw_name, config=kw_config)
-        # set up EPICS control configs
-        ctrlconf = self.getElementCtrlConf(kw)
-        if ctrlconf != {}:
-            retobj.setConf(ctrlconf, type='ctrl')
+        return self.makeElements([kw])[0]
 
-        return retobj
+    def makeElements(self, elements):
+        """ create element objects in bulk, one object for each unique
+            keyword, element classes are looked up in the element type
+            registry (see ``element.registerElement()``), EPICS control
+            configs are attached at the same time.
+
+            :param elements: list of element keywords, e.g. from ``getElementList()``
+            :return: list of element objects, in the same order of elements,
+                     repeated keywords share the same object
+        """
+        epics_conf = self.all_elements.get('_epics', {})
+        eobj_dict = {}
+        for kw in elements:
+            if kw in eobj_dict:
+                continue
+            edef = self.all_elements[kw.upper()]
+            if isinstance(edef, dict):
+                etype, econf = list(edef.items())[0]
+            else:  # element without configuration
+                etype, econf = edef, {}
+            eclass = element.getElementClass(etype)
+            if eclass is None:
+                raise KeyError("Unknown element type {0} of {1}".format(etype, kw))
+            eobj = eclass(name=kw, config={k.lower(): v for k, v in econf.items()})
+            ctrlconf = epics_conf.get(kw.upper())
+            if ctrlconf:
+                eobj.setConf(ctrlconf, type='ctrl')
+            eobj_dict[kw] = eobj
+        return [eobj_dict[kw] for kw in elements]
+
+    def extractBeamline(self, beamline):
+        """ extract beamline as a new Lattice instance in memory, which is
+            the same as parsing the lte file from
+            ``generateLatticeFile(beamline, 'sio')``: only the elements of
+            beamline are kept, beamline is expanded, charge element is put
+            at the beginning.
+
+            :param beamline: keyword of beamline
+            :return: Lattice instance
+        """
+        elelist = self.getFullBeamline(beamline, extend=True)
+        charge = self.getChargeElement()
+        if self.getElementType(elelist[0]) != 'CHARGE' and charge != '':
+            elelist.insert(0, charge)
+
+        all_elements = {}
+        kws = set(ele.upper() for ele in elelist)
+        for kw in kws:
+            all_elements[kw] = copy.deepcopy(self.all_elements[kw])
+        all_elements[beamline.upper()] = {'beamline': {'lattice': '(' + ' '.join(elelist) + ')'}}
+        if '_prefixstr' in self.all_elements:
+            all_elements['_prefixstr'] = copy.deepcopy(self.all_elements['_prefixstr'])
+        if '_epics' in self.all_elements:
+            all_elements['_epics'] = {k: copy.deepcopy(v) for k, v in self.all_elements['_epics'].items()
+                                      if k in kws}
+        return Lattice(all_elements)
+
+    def makeModel(self, beamline, mode='simu', flyweight=False):
+        """ create online model for beamline directly from the element
+            definitions, without lte file generating and parsing.
+
+            :param beamline: keyword of beamline
+            :param mode: 'simu' or 'online', see ``models.Models``
+            :param flyweight: share one element object for all the occurrences
+            :return: models.Models instance
+        """
+        new_model = models.Models(name=beamline, mode=mode, flyweight=flyweight)
+        new_model.addElement(*self.makeElements(self.getElementList(beamline)))
+        return new_model
 
 
 # ===========================================================================
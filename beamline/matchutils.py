@@ -12,58 +12,120 @@ import numpy as np
 from numpy import sqrt
 from numpy.linalg import inv
 from . import mathutils
+from . import genesisutils
 
 import os
+from functools import reduce
+
+
+_parse_cache = {}
+
+
+def _cachedParse(filename, parser):
+    """ parse file by parser, results are cached by path and modification time,
+    i.e. re-parse only if file is changed.
+
+    :param filename: file name
+    :param parser: function to parse file object
+    """
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    key = (parser.__name__, path)
+    # nanosecond mtime, a rewrite of the same size within the float
+    # resolution of st_mtime is still detected; inode for replaced files
+    stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _parse_cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'r') as f:
+        r = parser(f)
+    _parse_cache[key] = (stamp, r)
+    return r
+
+
+def _convertValue(s):
+    """ convert namelist value string into int, float, string or list
+    """
+    s = s.strip().rstrip(',').strip()
+    if len(s) >= 2 and s[0] == s[-1] and s[0] in '\'"':
+        return s[1:-1]
+    tokens = s.replace(',', ' ').split()
+    values = []
+    for t in tokens:
+        try:
+            values.append(int(t))
+        except ValueError:
+            try:
+                values.append(float(t.replace('D', 'E').replace('d', 'e')))
+            except ValueError:
+                return s
+    if len(values) == 1:
+        return values[0]
+    return values
+
+
+_assign_pattern = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*=\s*('[^']*'|\"[^\"]*\"|[^=]*?)\s*(?=,?\s*[A-Za-z_][A-Za-z0-9_]*\s*=|$)")
+
+
+def _parseNamelistFile(fobj):
+    params = {}
+    for line in fobj:
+        line = line.strip()
+        if line.startswith('?'):
+            # lattice file header, e.g. '? UNITLENGTH = 0.03'
+            line = line[1:]
+        if not line or line[0] in '!#$' or '=' not in line:
+            continue
+        for k, v in _assign_pattern.findall(line):
+            params[k.lower()] = _convertValue(v)
+    return params
+
+
+def parseNamelist(filename):
+    """ parse namelist-style Genesis input file or the header of lattice file
+    into dict of ``{key: value}``, key is lowercase, value is converted to
+    int, float, string or list of numbers; results are cached by path and
+    modification time.
+
+    :param filename: Genesis input or lattice file
+    :return: dict, should not be modified
+    """
+    return _cachedParse(filename, _parseNamelistFile)
 
 
 class ParseParams(object):
+    """ Parameters from Genesis input and lattice files, if key
+    appears in more than one files, the last one wins.
+
+    :param infilename: Genesis input and lattice file names
+    """
+
     def __init__(self, *infilename):
         self.infilename = infilename
         self.onParseFile()
 
     def onParseFile(self):
-        self.aw0 = 0.0
-        self.xlamds = 0.0
-        self.xlamd = 0.0
-        self.gamma = 0.0
-        self.emitx = 0.0
-        self.imagl = 0.0
-        self.idril = 0.0
-        self.ibfield = 0.0
-        self.unitlength = 0.0
-
-        fids = (open(file) for file in self.infilename)
-        for curfid in fids:
-            for line in curfid:
-                line = line.lower()
-                # aw0
-                if 'aw0' in line:
-                    self.aw0 = float(line.strip().split('=')[-1])
-                # xlamds
-                if 'xlamds' in line:
-                    self.xlamds = float(line.strip().split('=')[-1])
-                # xlamd
-                mxlamd = re.match(' *xlamd[^s].*', line)
-                if mxlamd:
-                    self.xlamd = float(mxlamd.group().split('=')[-1])
-                # gamma
-                if 'gamma0' in line:
-                    self.gamma = float(line.strip().split('=')[-1])
-                # emitx
-                if 'emitx' in line:
-                    self.emitx = float(line.strip().split('=')[-1])
-                # imagl
-                if 'imagl' in line:
-                    self.imagl = float(line.strip().split('=')[-1])
-                # idril
-                if 'idril' in line:
-                    self.idril = float(line.strip().split('=')[-1])
-                # ibfield
-                if 'ibfield' in line:
-                    self.ibfield = float(line.strip().split('=')[-1])
-                # unitlength, i.e. undulator period
-                if 'unit' in line:
-                    self.unitlength = float(line.strip().split('=')[-1])
+        self.params = {}
+        for fn in self.infilename:
+            self.params.update(parseNamelist(fn))
+
+        self.aw0 = float(self.getParam('aw0', 0.0))
+        self.xlamds = float(self.getParam('xlamds', 0.0))
+        self.xlamd = float(self.getParam('xlamd', 0.0))
+        self.gamma = float(self.getParam('gamma0', 0.0))
+        self.emitx = float(self.getParam('emitx', 0.0))
+        self.imagl = float(self.getParam('imagl', 0.0))
+        self.idril = float(self.getParam('idril', 0.0))
+        self.ibfield = float(self.getParam('ibfield', 0.0))
+        self.unitlength = float(self.getParam('unitlength', 0.0))
+
+    def getParam(self, key, default=None):
+        """ value of parameter
+
+        :param key: parameter name, case insensitive
+        :param default: returned if not found
+        """
+        return self.params.get(key.lower(), default)
 
     def getUndulatorParameter(self):
         return self.aw0
@@ -93,13 +155,19 @@ class ParseParams(object):
         return self.ibfield
 
 
-def parseLattice(latlengthname='fullat.hghg'):
-    for line in open(latlengthname):
+def _parseLatticeFile(fobj):
+    for line in fobj:
         if line.startswith('!'):
-            newlist = line.replace('!', '').strip().split(' ')
+            newlist = line.replace('!', '').strip().split()
             return [float(i) for i in newlist]
 
 
+def parseLattice(latlengthname='fullat.hghg'):
+    r = _cachedParse(latlengthname, _parseLatticeFile)
+    if r is not None:
+        return list(r)
+
+
 class BeamMatch(object):
     def __init__(self, infile_mod, infile_rad,
                  latfile_mod, latfile_rad,
@@ -345,6 +413,248 @@ class BeamMatch(object):
         print("rybeam = %.4e" % self.sigmay_rad)
 
 
+def _invBatch2(m):
+    """ inverse of the stack of 2 x 2 matrices
+
+    :param m: (N, 2, 2) numpy array
+    :return: (N, 2, 2) numpy array
+    """
+    det = m[:, 0, 0] * m[:, 1, 1] - m[:, 0, 1] * m[:, 1, 0]
+    r = np.empty_like(m)
+    r[:, 0, 0], r[:, 1, 1] = m[:, 1, 1] / det, m[:, 0, 0] / det
+    r[:, 0, 1], r[:, 1, 0] = -m[:, 0, 1] / det, -m[:, 1, 0] / det
+    return r
+
+
+def _twissTransBatch(a, beta, alpha, gamma):
+    """ transform twiss parameters by the stack of 2 x 2 matrices,
+    same as the ``Nx * [beta, alpha, gamma]^T`` in ``BeamMatch.matchCalculate``
+
+    :param a: (N, 2, 2) numpy array, (inverse of) transport matrices
+    :param beta: beta, numpy array
+    :param alpha: alpha, numpy array
+    :param gamma: gamma, numpy array
+    :return: tuple of (beta, alpha, gamma)
+    """
+    a00, a01, a10, a11 = a[:, 0, 0], a[:, 0, 1], a[:, 1, 0], a[:, 1, 1]
+    b = a00 ** 2 * beta - 2 * a00 * a01 * alpha + a01 ** 2 * gamma
+    al = -a00 * a10 * beta + (1 + 2 * a01 * a10) * alpha - a01 * a11 * gamma
+    g = a10 ** 2 * beta - 2 * a10 * a11 * alpha + a11 ** 2 * gamma
+    return b, al, g
+
+
+class BeamMatchScan(object):
+    """ Beam matching for the HGHG FODO lattice over a grid of quad settings,
+    i.e. vectorized version of ``BeamMatch.matchCalculate``, input files are
+    parsed only once.
+
+    Usage:
+
+    >>> scan = BeamMatchScan('mod.in', 'rad.in', 'mod.lat', 'rad.lat')
+    >>> qf, qd = scan.matchScan(np.linspace(-20, 20, 401), np.linspace(-20, 20, 401))
+    >>> scan.matchPerform('newmod.in', 'newrad.in', 'newrad.lat')
+
+    :param infile_mod: modulator input file
+    :param infile_rad: radiator input file
+    :param latfile_mod: modulator lattice file
+    :param latfile_rad: radiator lattice file
+    :param latlengthname: lattice length file, ``'fullat.hghg'`` by default
+    """
+
+    def __init__(self, infile_mod, infile_rad,
+                 latfile_mod, latfile_rad,
+                 latlengthname='fullat.hghg'):
+        self.infile_mod = infile_mod
+        self.infile_rad = infile_rad
+        self.latfile_mod = latfile_mod
+        self.latfile_rad = latfile_rad
+
+        modparams = ParseParams(infile_mod, latfile_mod)
+        radparams = ParseParams(infile_rad, latfile_rad)
+        self.gamma0 = modparams.getElectronGamma()
+        self.emitn = modparams.getElectronEmitx()
+        self.am = modparams.getUndulatorParameter()
+        self.lambdam = modparams.getUndulatorPeriod()
+        self.au = radparams.getUndulatorParameter()
+        self.lambdau = radparams.getUndulatorPeriod()
+        self.imagl = radparams.getChicaneMagnetLength()
+        self.idril = radparams.getChicaneDriftLength()
+        self.ibfield = radparams.getChicaneMagnetField()
+        self.latlength = parseLattice(latlengthname)
+
+        # modulator + chicane, independent of quad settings
+        self._modtrans = self._calcModTrans()
+
+        self.qf_grid = None
+        self.qd_grid = None
+        self.stable = None
+        self.objective = None
+        self.result = {}
+        self.qfval = None
+        self.qdval = None
+
+    def _calcModTrans(self):
+        """ inverse transport matrices of modulator + chicane, in X and Y
+        """
+        gamma0, am, lambdam = self.gamma0, self.am, self.lambdam
+        lo1, lum, lo2 = self.latlength[0:3]
+        Kbetam = 0.5 * (sqrt(2.0) * am * 2.0 * np.pi / lambdam / gamma0) ** 2
+        ax = reduce(np.matmul, [
+            mathutils.funTransChicaBatch(self.imagl, self.idril, self.ibfield, gamma0, 'x'),
+            mathutils.funTransDriftBatch(lo2 * lambdam),
+            mathutils.funTransUnduHBatch(lum * lambdam),
+            mathutils.funTransDriftBatch(lo1 * lambdam)])
+        ay = reduce(np.matmul, [
+            mathutils.funTransChicaBatch(self.imagl, self.idril, self.ibfield, gamma0, 'y'),
+            mathutils.funTransDriftBatch(lo2 * lambdam),
+            mathutils.funTransUnduVBatch(Kbetam, lum * lambdam),
+            mathutils.funTransDriftBatch(lo1 * lambdam)])
+        return _invBatch2(ax), _invBatch2(ay)
+
+    def matchCalculate(self, qfval, qdval):
+        """ calculate matched beam for the given quad settings
+
+        :param qfval: QF gradient(s), in [T/m], scalar or array
+        :param qdval: QD gradient(s), in [T/m], scalar or array
+        :return: dict of 1D arrays, keys: ``'qf'``, ``'qd'``, ``'stable'``,
+            ``'betax_FODO'``, ``'betay_FODO'``,
+            ``'{alpha,beta,sigma}{x,y}_{rad,mod}'``,
+            values of unstable configurations are NaN
+        """
+        m0 = 9.10938215e-31
+        e0 = 1.602176487e-19
+        c0 = 299792458
+
+        gamma0, emitn, lambdau = self.gamma0, self.emitn, self.lambdau
+        lo1, lum, lo2, lo3, lf, lo4, lur, lo5, ld = self.latlength
+
+        kp, kn = np.broadcast_arrays(np.atleast_1d(np.asarray(qfval, dtype=np.float64)).ravel(),
+                                     np.atleast_1d(np.asarray(qdval, dtype=np.float64)).ravel())
+        Kp = e0 * kp / m0 / c0 / sqrt(gamma0 ** 2 - 1)
+        Kn = e0 * kn / m0 / c0 / sqrt(gamma0 ** 2 - 1)
+
+        Kbetau = 0.5 * (sqrt(2.0) * self.au * 2.0 * np.pi / lambdau / gamma0) ** 2
+
+        N = np.array([lo3, lf * 0.5, lo4, lur, lo5, ld, lo4, lur, lo5, 0.5 * lf]) * lambdau
+        fquad = mathutils.funTransQuadFBatch
+        fdrift = mathutils.funTransDriftBatch
+
+        # one FODO period
+        mx = reduce(np.matmul, [fquad(Kp, N[1]), fdrift(N[2]), mathutils.funTransUnduHBatch(N[3]),
+                                fdrift(N[4]), fquad(Kn, N[5]), fdrift(N[6]),
+                                mathutils.funTransUnduHBatch(N[7]), fdrift(N[8]), fquad(Kp, N[9])])
+        my = reduce(np.matmul, [fquad(-Kp, N[1]), fdrift(N[2]), mathutils.funTransUnduVBatch(Kbetau, N[3]),
+                                fdrift(N[4]), fquad(-Kn, N[5]), fdrift(N[6]),
+                                mathutils.funTransUnduVBatch(Kbetau, N[7]), fdrift(N[8]), fquad(-Kp, N[9])])
+        trx = mx[:, 0, 0] + mx[:, 1, 1]
+        tr_y = my[:, 0, 0] + my[:, 1, 1]
+        stable = (trx ** 2 <= 4) & (mx[:, 0, 1] > 0) & (tr_y ** 2 <= 4) & (my[:, 0, 1] > 0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sx = np.where(stable, sqrt(np.where(stable, 4.0 - trx ** 2, 1.0)), np.nan)
+            sy = np.where(stable, sqrt(np.where(stable, 4.0 - tr_y ** 2, 1.0)), np.nan)
+            # twiss parameters of FODO
+            alphax_FODO = (mx[:, 0, 0] - mx[:, 1, 1]) / sx
+            betax_FODO = 2.0 * mx[:, 0, 1] / sx
+            gammax_FODO = (1.0 + alphax_FODO ** 2) / betax_FODO
+            alphay_FODO = (my[:, 0, 0] - my[:, 1, 1]) / sy
+            betay_FODO = 2.0 * my[:, 0, 1] / sy
+            gammay_FODO = (1.0 + alphay_FODO ** 2) / betay_FODO
+
+            # match to the entrance of radiator
+            AX = _invBatch2(np.matmul(fquad(Kp, N[1]), fdrift(N[0])))
+            AY = _invBatch2(np.matmul(fquad(-Kp, N[1]), fdrift(N[0])))
+            betax_rad, alphax_rad, gammax_rad = _twissTransBatch(AX, betax_FODO, alphax_FODO, gammax_FODO)
+            betay_rad, alphay_rad, gammay_rad = _twissTransBatch(AY, betay_FODO, alphay_FODO, gammay_FODO)
+
+            # match to the entrance of modulator
+            AX, AY = self._modtrans
+            betax_mod, alphax_mod, gammax_mod = _twissTransBatch(AX, betax_rad, alphax_rad, gammax_rad)
+            betay_mod, alphay_mod, gammay_mod = _twissTransBatch(AY, betay_rad, alphay_rad, gammay_rad)
+
+            return {'qf': kp, 'qd': kn, 'stable': stable,
+                    'betax_FODO': betax_FODO, 'betay_FODO': betay_FODO,
+                    'alphax_rad': alphax_rad, 'alphay_rad': alphay_rad,
+                    'betax_rad': betax_rad, 'betay_rad': betay_rad,
+                    'sigmax_rad': sqrt(betax_rad * emitn / gamma0),
+                    'sigmay_rad': sqrt(betay_rad * emitn / gamma0),
+                    'alphax_mod': alphax_mod, 'alphay_mod': alphay_mod,
+                    'betax_mod': betax_mod, 'betay_mod': betay_mod,
+                    'sigmax_mod': sqrt(betax_mod * emitn / gamma0),
+                    'sigmay_mod': sqrt(betay_mod * emitn / gamma0)}
+
+    def matchScan(self, qfvals, qdvals, objective=None):
+        """ scan the grid of quad settings, find the stable region and
+        the optimum configuration
+
+        :param qfvals: QF gradients, in [T/m], 1D array
+        :param qdvals: QD gradients, in [T/m], 1D array
+        :param objective: function of the dict returned by ``matchCalculate``,
+            returns array to be minimized, by default the average beta
+            function at the entrance of radiator
+        :return: (qf, qd) of the optimum, or None if no stable configuration
+        """
+        qf_grid, qd_grid = np.meshgrid(np.asarray(qfvals, dtype=np.float64),
+                                       np.asarray(qdvals, dtype=np.float64), indexing='ij')
+        r = self.matchCalculate(qf_grid, qd_grid)
+        if objective is None:
+            objective = lambda x: 0.5 * (x['betax_rad'] + x['betay_rad'])
+        obj = np.where(r['stable'], objective(r), np.nan)
+
+        self.qf_grid, self.qd_grid = qf_grid, qd_grid
+        self.result = {k: v.reshape(qf_grid.shape) for k, v in r.items()}
+        self.stable = self.result['stable']
+        self.objective = obj.reshape(qf_grid.shape)
+
+        if np.all(np.isnan(obj)):
+            self.qfval = self.qdval = None
+            return None
+        idx = np.nanargmin(obj)
+        self.qfval, self.qdval = float(r['qf'][idx]), float(r['qd'][idx])
+        return self.qfval, self.qdval
+
+    def getStableRegion(self):
+        """ stable region of the last scan
+
+        :return: tuple of (qf_grid, qd_grid, stable), 2D arrays
+        """
+        return self.qf_grid, self.qd_grid, self.stable
+
+    def matchPerform(self, infile_mod_new, infile_rad_new, latfile_rad_new,
+                     qfval=None, qdval=None, qf_linenum=11, qd_linenum=13):
+        """ write the new Genesis input files for one configuration,
+        the optimum of the last scan by default
+
+        :param infile_mod_new: new modulator input file
+        :param infile_rad_new: new radiator input file
+        :param latfile_rad_new: new radiator lattice file
+        :param qfval: QF gradient, in [T/m]
+        :param qdval: QD gradient, in [T/m]
+        :return: ``BeamMatch`` instance, or None if not stable
+        """
+        if qfval is None:
+            qfval = self.qfval
+        if qdval is None:
+            qdval = self.qdval
+        if qfval is None or qdval is None:
+            print("No stable configuration to perform.")
+            return None
+        r = self.matchCalculate(qfval, qdval)
+        if not r['stable'][0]:
+            print("Configuration qf = {0}, qd = {1} is not stable.".format(qfval, qdval))
+            return None
+
+        bm = BeamMatch(self.infile_mod, self.infile_rad,
+                       self.latfile_mod, self.latfile_rad,
+                       infile_mod_new, infile_rad_new,
+                       latfile_rad_new, qfval, qdval)
+        for k in ('alphax_mod', 'alphay_mod', 'sigmax_mod', 'sigmay_mod',
+                  'alphax_rad', 'alphay_rad', 'sigmax_rad', 'sigmay_rad'):
+            setattr(bm, k, float(r[k][0]))
+        bm.matchPerform(qf_linenum, qd_linenum)
+        return bm
+
+
 class FELSimulator(object):
     def __init__(self, mode='HGHG',
                  modinfile='mod.in',
@@ -365,42 +675,31 @@ class FELSimulator(object):
         os.system(cmd1)
         os.system(cmd2)
 
-    def postProcess(self, outfile='rad.out'):
-        # datfile = 'tmp.dat'
-        fout = open(outfile, 'r')
-        # fdat = open(datfile, 'w')
-
-        entries = self.grepParam(param='entries')
-
-        line = ' '.join(fout.readline().lower().strip().split())
-        while not line.startswith('z[m]'):
-            line = ' '.join(fout.readline().lower().strip().split())
-
-        data0 = np.zeros([entries, 3])
-        for i in xrange(entries):
-            elements = fout.readline().lower().strip().split()
-            line = ' '.join(elements)
-            # fdat.write("%s\n" % line)
-            data0[i, 0:3] = [float(strnum) for strnum in elements]
-
-        line = ' '.join(fout.readline().lower().strip().split())
-        while not line.startswith('power'):
-            line = ' '.join(fout.readline().lower().strip().split())
-
-        elements = fout.readline().lower().strip().split()
-        fieldnum = elements.__len__()
-        data1 = np.zeros([entries, fieldnum])
-        data1[0, 0:fieldnum] = [float(strnum) for strnum in elements]
-        for i in xrange(1, entries):
-            elements = fout.readline().lower().strip().split()
-            line = ' '.join(elements)
-            # fdat.write("%s\n" % line)
-            data1[i, 0:fieldnum] = [float(strnum) for strnum in elements]
-
-        fout.close()
-        # fdat.close()
-
-        self.data = np.concatenate((data0, data1), axis=1)
+    def toJob(self, name='genesis', executable='genesis', files=None, timeout=None):
+        """ create job to run simulation in isolated working directory by
+        ``genesisutils.JobRunner``, input and lattice files are copied
+
+        :param name: job name
+        :param executable: Genesis executable, string or list
+        :param files: additional files to copy, e.g. beam or field files
+        :param timeout: time limit in [s]
+        :return: ``genesisutils.GenesisJob`` instance
+        """
+        flist = [self.modinfile, self.modlatfile, self.radinfile, self.radlatfile]
+        if files is not None:
+            flist.extend(files)
+        return genesisutils.GenesisJob(
+            [os.path.basename(self.modinfile), os.path.basename(self.radinfile)],
+            files=flist, name=name, executable=executable, timeout=timeout)
+
+    def postProcess(self, outfile='rad.out', islice=0):
+        """ read output file, data columns: z[m], aw, qfld, power, ...
+
+        :param outfile: Genesis output file
+        :param islice: index of slice to read, the first one by default
+        """
+        out = genesisutils.GenesisOutput(outfile, slices=[islice])
+        self.data = np.concatenate((out.zdata, out.data[0]), axis=1)
 
     def getMaxPower(self):
         return self.data[:, 3].max()
@@ -157,6 +157,146 @@ def funTransChica(imagl, idril, ibfield, gamma0, xoy='x'):
     return m
 
 
+# batched 2 x 2 transport matrices, the leading axis runs over configurations
+def _mat2Batch(a, b, c, d):
+    """ stack matrix elements into (N, 2, 2) array, [[a, b], [c, d]]
+    """
+    a, b, c, d = _toBatch(a, b, c, d)
+    m = np.empty((a.size, 2, 2), dtype=np.float64)
+    m[:, 0, 0], m[:, 0, 1], m[:, 1, 0], m[:, 1, 1] = a, b, c, d
+    return m
+
+
+def funTransQuadFBatch(k, s):
+    """ Focusing quad in X, defocusing in Y, vectorized version of ``funTransQuadF``,
+    negative ``k`` gives defocusing matrices, ``k == 0`` gives drifts.
+
+    :param k: k1, in [T/m], scalar or array
+    :param s: width, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    k, s = _toBatch(k, s)
+    sqrtk = np.sqrt(np.abs(k))
+    phi = sqrtk * s
+    nz = sqrtk > 0
+    safek = np.where(nz, sqrtk, 1.0)
+    foc = k >= 0
+    a = np.where(foc, np.cos(phi), np.cosh(phi))
+    b = np.where(nz, np.where(foc, np.sin(phi), np.sinh(phi)) / safek, s)
+    c = np.where(foc, -sqrtk * np.sin(phi), sqrtk * np.sinh(phi))
+    return _mat2Batch(a, b, c, a)
+
+
+def funTransQuadDBatch(k, s):
+    """ Defocusing quad in X, focusing in Y, vectorized version of ``funTransQuadD``
+
+    :param k: k1, in [T/m], scalar or array
+    :param s: width, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    return funTransQuadFBatch(-np.asarray(k, dtype=np.float64), s)
+
+
+def funTransDriftBatch(s):
+    """ Drift space, vectorized version of ``funTransDrift``
+
+    :param s: drift length, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    s, = _toBatch(s)
+    return _mat2Batch(1.0, s, 0.0, 1.0)
+
+
+def funTransUnduVBatch(k, s):
+    """ Planar undulator transport matrix in vertical direction,
+    vectorized version of ``funTransUnduV``
+
+    :param k: equivalent k1, in [T/m], scalar or array
+    :param s: horizontal width, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    return funTransQuadFBatch(k, s)
+
+
+def funTransUnduHBatch(s):
+    """ Planar undulator transport matrix in horizontal direction,
+    vectorized version of ``funTransUnduH``
+
+    :param s: horizontal width, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    return funTransDriftBatch(s)
+
+
+def funTransEdgeXBatch(theta, rho):
+    """ Fringe matrix in X, vectorized version of ``funTransEdgeX``
+
+    :param theta: fringe angle, in [rad], scalar or array
+    :param rho: bend radius, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    theta, rho = _toBatch(theta, rho)
+    return _mat2Batch(1.0, 0.0, np.tan(theta) / rho, 1.0)
+
+
+def funTransEdgeYBatch(theta, rho):
+    """ Fringe matrix in Y, vectorized version of ``funTransEdgeY``
+
+    :param theta: fringe angle, in [rad], scalar or array
+    :param rho: bend radius, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    theta, rho = _toBatch(theta, rho)
+    return _mat2Batch(1.0, 0.0, -np.tan(theta) / rho, 1.0)
+
+
+def funTransSectXBatch(theta, rho):
+    """ Sector matrix in X, vectorized version of ``funTransSectX``
+
+    :param theta: bend angle, in [rad], scalar or array
+    :param rho: bend radius, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    theta, rho = _toBatch(theta, rho)
+    return _mat2Batch(np.cos(theta), rho * np.sin(theta), -np.sin(theta) / rho, np.cos(theta))
+
+
+def funTransSectYBatch(theta, rho):
+    """ Sector matrix in Y, vectorized version of ``funTransSectY``
+
+    :param theta: bend angle, in [rad], scalar or array
+    :param rho: bend radius, in [m], scalar or array
+    :return: (N, 2, 2) numpy array
+    """
+    theta, rho = _toBatch(theta, rho)
+    return _mat2Batch(1.0, rho * theta, 0.0, 1.0)
+
+
+def funTransChicaBatch(imagl, idril, ibfield, gamma0, xoy='x'):
+    """ Chicane matrix, composed of four rbends, seperated by drifts,
+    vectorized version of ``funTransChica``
+
+    :param imagl: rbend width, in [m], scalar or array
+    :param idril: drift length between two adjacent rbends, in [m], scalar or array
+    :param ibfield: rbend magnetic strength, in [T], scalar or array
+    :param gamma0: electron energy, gamma, scalar or array
+    :param xoy: ``'x'`` or ``'y'``, matrix in X or Y direction, ``'x'`` by default
+    :return: (N, 2, 2) numpy array
+    """
+    m0 = 9.10938215e-31
+    e0 = 1.602176487e-19
+    c0 = 299792458
+    imagl, idril, ibfield, gamma0 = _toBatch(imagl, idril, ibfield, gamma0)
+    rho = np.sqrt(gamma0 ** 2 - 1) * m0 * c0 / ibfield / e0
+    theta = np.arcsin(imagl / rho)
+    fsect, fedge = {'x': (funTransSectXBatch, funTransEdgeXBatch),
+                    'y': (funTransSectYBatch, funTransEdgeYBatch)}[xoy]
+    d = funTransDriftBatch(idril)
+    sp, ep = fsect(theta, rho), fedge(theta, rho)
+    sn, en = fsect(-theta, -rho), fedge(-theta, -rho)
+    return reduce(np.matmul, [d, sp, ep, d, en, sn, d, sn, en, d, ep, sp, d])
+
+
 # 6 x 6 transport matrice
 def transDrift(length=0.0, gamma=None):
     """ Transport matrix of drift
@@ -190,7 +330,7 @@ def transQuad(length=0.0, k1=0.0, gamma=None):
     elif gamma is not None and gamma != 0.0:
         if k1 == 0:
             print("warning: 'k1' should be a positive float number.")
-            m[0, 1] = m[2, 3] = 1.0
+            m[0, 1] = m[2, 3] = length
             m[4, 5] = float(length) / gamma / gamma
         else:
             sqrtk = np.sqrt(complex(k1))
@@ -200,7 +340,7 @@ def transQuad(length=0.0, k1=0.0, gamma=None):
             m[1, 0] = (-np.sin(sqrtkl) * sqrtk).real
             m[2, 2] = m[3, 3] = (np.cosh(sqrtkl)).real
             m[2, 3] = (np.sinh(sqrtkl) / sqrtk).real
-            m[3, 2] = (-np.sinh(sqrtkl) * sqrtk).real
+            m[3, 2] = (np.sinh(sqrtkl) * sqrtk).real
             m[4, 5] = float(length) / gamma / gamma
     else:
         print("warning: 'gamma' should be a positive float number.")
@@ -329,6 +469,228 @@ def transChicane(bend_length=None, bend_field=None, drift_length=None, gamma=Non
         return m
 
 
+# batched 6 x 6 transport matrices, the leading axis runs over elements
+def _eyeBatch(n):
+    """ stack of 6 x 6 unity matrices
+
+    :param n: number of matrices
+    :return: (n, 6, 6) numpy array
+    """
+    m = np.zeros((n, 6, 6), dtype=np.float64)
+    idx = np.arange(6)
+    m[:, idx, idx] = 1.0
+    return m
+
+
+def _toBatch(*args):
+    """ broadcast input scalars/sequences to 1D float arrays of the same size
+    """
+    return np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in args])
+
+
+def transDriftBatch(length, gamma):
+    """ Transport matrices of drifts, vectorized version of ``transDrift``
+
+    :param length: drift lengths in [m], scalar or array
+    :param gamma: electron energy, gamma values, scalar or array
+    :return: (N, 6, 6) numpy array
+    """
+    length, gamma = _toBatch(length, gamma)
+    m = _eyeBatch(length.size)
+    m[:, 0, 1] = m[:, 2, 3] = length
+    m[:, 4, 5] = length / gamma / gamma
+    return m
+
+
+def transQuadBatch(length, k1, gamma):
+    """ Transport matrices of quadrupoles, vectorized version of ``transQuad``,
+    ``k1 > 0`` focuses in X, ``k1 == 0`` reduces to drift.
+
+    :param length: quad widths in [m], scalar or array
+    :param k1: quad k1 strengths in [m^-2], scalar or array
+    :param gamma: electron energy, gamma values, scalar or array
+    :return: (N, 6, 6) numpy array
+    """
+    length, k1, gamma = _toBatch(length, k1, gamma)
+    sqrtk = np.sqrt(np.abs(k1))
+    phi = sqrtk * length
+    nz = sqrtk > 0
+    safek = np.where(nz, sqrtk, 1.0)
+    # focusing and defocusing 2 x 2 blocks
+    fa, fb, fc = np.cos(phi), np.where(nz, np.sin(phi) / safek, length), -sqrtk * np.sin(phi)
+    da, db, dc = np.cosh(phi), np.where(nz, np.sinh(phi) / safek, length), sqrtk * np.sinh(phi)
+    xfoc = k1 >= 0
+    m = _eyeBatch(length.size)
+    m[:, 0, 0] = m[:, 1, 1] = np.where(xfoc, fa, da)
+    m[:, 0, 1] = np.where(xfoc, fb, db)
+    m[:, 1, 0] = np.where(xfoc, fc, dc)
+    m[:, 2, 2] = m[:, 3, 3] = np.where(xfoc, da, fa)
+    m[:, 2, 3] = np.where(xfoc, db, fb)
+    m[:, 3, 2] = np.where(xfoc, dc, fc)
+    m[:, 4, 5] = length / gamma / gamma
+    return m
+
+
+def transSectBatch(theta, rho, gamma):
+    """ Transport matrices of sector dipoles, vectorized version of ``transSect``
+
+    :param theta: bending angles in [RAD], scalar or array
+    :param rho: bending radii in [m], scalar or array
+    :param gamma: electron energy, gamma values, scalar or array
+    :return: (N, 6, 6) numpy array
+    """
+    theta, rho, gamma = _toBatch(theta, rho, gamma)
+    rc = rho * np.cos(theta)
+    rs = rho * np.sin(theta)
+    m = _eyeBatch(theta.size)
+    m[:, 0, 0] = m[:, 1, 1] = np.cos(theta)
+    m[:, 0, 1] = rs
+    m[:, 0, 5] = rho - rc
+    m[:, 1, 0] = -np.sin(theta) / rho
+    m[:, 1, 5] = np.sin(theta)
+    m[:, 2, 3] = rs
+    m[:, 4, 0] = m[:, 1, 5]
+    m[:, 4, 1] = m[:, 0, 5]
+    m[:, 4, 5] = rs / gamma / gamma - rho * theta + rs
+    return m
+
+
+def transFringeBatch(beta, rho):
+    """ Transport matrices of fringe fields, vectorized version of ``transFringe``
+
+    :param beta: angles of rotation of pole-face in [RAD], scalar or array
+    :param rho: bending radii in [m], scalar or array
+    :return: (N, 6, 6) numpy array
+    """
+    beta, rho = _toBatch(beta, rho)
+    m = _eyeBatch(beta.size)
+    m[:, 1, 0] = np.tan(beta) / rho
+    m[:, 3, 2] = -np.tan(beta) / rho
+    return m
+
+
+def transRbendBatch(theta, rho, gamma, incsym=-1):
+    """ Transport matrices of rectangle dipoles, vectorized version of ``transRbend``
+
+    :param theta: bending angles in [RAD], scalar or array
+    :param rho: bending radii in [m], scalar or array
+    :param gamma: electron energy, gamma values, scalar or array
+    :param incsym: incident symmetry, -1 (default), 0 or 1, see ``transRbend``
+    :return: (N, 6, 6) numpy array
+    """
+    theta, rho, gamma = _toBatch(theta, rho, gamma)
+    beta1, beta2 = {-1: (0.0 * theta, theta),
+                    0: (0.5 * theta, 0.5 * theta),
+                    1: (theta, 0.0 * theta)}[int(incsym)]
+    return np.matmul(np.matmul(transFringeBatch(beta1, rho),
+                               transSectBatch(theta, rho, gamma)),
+                     transFringeBatch(beta2, rho))
+
+
+def rfEnergyGain(volt=0.0, phase=0.0):
+    """ Energy gain of electron passing through RF cavities, in the unit
+    of electron rest energy, i.e. the change of gamma value.
+
+    The phase convention follows ``ELEGANT``, i.e. 90 [deg] is on-crest.
+
+    :param volt: cavity peak voltage in [V], scalar or array
+    :param phase: cavity phase in [deg], scalar or array
+    :return: gamma gain, numpy array
+    """
+    mc2 = 0.510998928e6  # electron rest energy, [eV]
+    volt, phase = _toBatch(volt, phase)
+    return volt * np.sin(phase / 180.0 * np.pi) / mc2
+
+
+def transRfcwBatch(length, volt, phase, freq, gamma, end1_focus=True, end2_focus=True):
+    """ Transport matrices of accelerating cavities (``RFCW``/``RFCA``),
+    linear model for the reference particle with adiabatic damping
+    and the focusing of entrance/exit fringe fields (Chambers' model):
+
+        M = M_exit * M_body * M_entrance,
+
+    with ``r = gamma_out / gamma_in``, ``g' = (gamma_out - gamma_in) / length``:
+
+    * M_entrance = [[1, 0], [-g' / 2 / gamma_in, 1]],
+    * M_body     = [[1, length * ln(r) / (r - 1)], [0, 1 / r]],
+    * M_exit     = [[1, 0], [ g' / 2 / gamma_out, 1]],
+
+    applied to both X and Y; longitudinally, the relative momentum
+    deviation is damped by ``1 / r``, and picks up the RF slope at the
+    phase (leading particle, ``z > 0``, sees the earlier phase).
+
+    :param length: cavity lengths in [m], scalar or array
+    :param volt: cavity peak voltages in [V], scalar or array
+    :param phase: cavity phases in [deg], 90 is on-crest, scalar or array
+    :param freq: cavity frequencies in [Hz], scalar or array
+    :param gamma: electron energy at the cavity entrance, gamma values
+    :param end1_focus: include entrance focusing or not, bool or array
+    :param end2_focus: include exit focusing or not, bool or array
+    :return: (N, 6, 6) numpy array
+    """
+    c0 = 299792458.0
+    length, volt, phase, freq, gamma, end1, end2 = _toBatch(
+        length, volt, phase, freq, gamma, end1_focus, end2_focus)
+    dgamma = rfEnergyGain(volt, phase)
+    gamma1 = gamma + dgamma
+    r = gamma1 / gamma
+    # length * ln(r) / (r - 1), -> length when r -> 1
+    rm1 = r - 1.0
+    acc = np.abs(rm1) > 1.0e-12
+    leff = length * np.where(acc, np.log1p(rm1) / np.where(acc, rm1, 1.0), 1.0)
+    gp = np.where(length > 0, dgamma / np.where(length > 0, length, 1.0), 0.0)
+    k1 = -end1 * gp * 0.5 / gamma  # entrance kick
+    k2 = end2 * gp * 0.5 / gamma1  # exit kick
+    # M_exit * M_body * M_entrance
+    a = 1.0 + leff * k1
+    b = leff
+    c = k2 * (1.0 + leff * k1) + k1 / r
+    d = k2 * leff + 1.0 / r
+    m = _eyeBatch(length.size)
+    m[:, 0, 0] = m[:, 2, 2] = a
+    m[:, 0, 1] = m[:, 2, 3] = b
+    m[:, 1, 0] = m[:, 3, 2] = c
+    m[:, 1, 1] = m[:, 3, 3] = d
+    m[:, 4, 5] = length / gamma / gamma1
+    m[:, 5, 5] = 1.0 / r
+    m[:, 5, 4] = -2.0 * np.pi * freq / c0 * rfEnergyGain(volt, phase + 90.0) / gamma1
+    return m
+
+
+def chainBatch(m):
+    """ product of the sequence of transport matrices, the first one applies
+    first, i.e. M = m[N-1] * ... * m[1] * m[0], by pairwise reduction
+
+    :param m: (N, n, n) numpy array
+    :return: (n, n) numpy array, unity matrix if N is 0
+    """
+    m = np.asarray(m, dtype=np.float64)
+    if m.shape[0] == 0:
+        return np.eye(m.shape[-1])
+    while m.shape[0] > 1:
+        if m.shape[0] % 2 == 1:
+            tail = m[-1:]
+            m = np.concatenate((np.matmul(m[1:-1:2], m[0:-1:2]), tail))
+        else:
+            m = np.matmul(m[1::2], m[0::2])
+    return m[0]
+
+
+def cumChainBatch(m):
+    """ cumulative products of the sequence of transport matrices,
+    i.e. C[i] = m[i] * ... * m[1] * m[0], by parallel prefix scan
+
+    :param m: (N, n, n) numpy array
+    :return: (N, n, n) numpy array
+    """
+    c = np.array(m, dtype=np.float64)
+    d = 1
+    while d < c.shape[0]:
+        c[d:] = np.matmul(c[d:], c[:-d])
+        d *= 2
+    return c
+
+
 class Chicane(object):
     """ Chicane class
     transport configuration of a chicane, comprising of four dipole with three drift sections
@@ -14,11 +14,42 @@ Created     : 2016-03-18
 
 import copy
 import json
+import operator
+import threading
+import time
 
-import epics
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import Collection
 
+from . import ctrlutils
+from . import drawutils
 from . import element
+from . import mathutils
+from . import survey
+
+# element types with dedicated transport matrices, others are drift-like
+_TRANS_TYPE_CODE = {'QUAD': 1, 'CSRCSBEN': 2, 'RFCW': 3}
+
+try:
+    import orjson
+
+    def _dumpJson(obj):
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:  # e.g. subclass of float
+            return json.dumps(obj, separators=_JSON_SEPS)
+
+    _JSON_SEPS = (',', ':')
+except ImportError:
+    _dumpJson = json.dumps
+    _JSON_SEPS = (', ', ': ')
+_JSON_SEP = _JSON_SEPS[0]  # separator between items
+
+_configVersion = operator.attrgetter('configVersion')
+
+# element parameters followed by LiveOptics, see _getTransParams()
+_LIVE_KEYS = ('l', 'k1', 'angle', 'volt', 'phase', 'freq')
 
 
 class Models(object):
@@ -27,7 +58,7 @@ class Models(object):
         get lattice name by instance.name.
     """
 
-    def __init__(self, name='BL', mode='simu'):
+    def __init__(self, name='BL', mode='simu', flyweight=False):
         """ create Models instance,
 
             :param name: lattice name, 'BL' by defualt
@@ -35,6 +66,11 @@ class Models(object):
                 if 'online' is defined, the lattice should be update the ctrl
                 configuration before dumping configuration string by calling
                 method: getCtrlConf()
+            :param flyweight: if True, all the occurrences of one element
+                object share one copy (element definition), per-occurrence
+                positions and control overrides are kept by the model,
+                see getPositions() and setCtrlOverride(); False by default,
+                i.e. every occurrence is an independent copy
         """
         self._mode = mode.lower()  # 'simu' (simulation) or 'online' (online) mode
         self._lattice_name = name.upper()  # lattice name
@@ -42,6 +78,23 @@ class Models(object):
         self._lattice_elenamelist = []  # lattice element name list
         self._lattice_eleobjlist = []  # lattice element object list
         self._lattice_confdict = {}  # lattice configuration dict
+        self._lattice_fragments = {}  # id: (element, configVersion, dict, json), see getAllConfig()
+        self._lattice_overcopies = {}  # element index: element copy with ctrl override, see snapshot()
+        self._lattice_pvcopies = {}  # id: element copy with PV readings, see snapshot()
+        self._lattice_pvkeys = None  # (elements, configVersions, PV keys), see snapshot()
+        self._lattice_confcache = None  # (elements, configVersions, json), see getAllConfig()
+        self._lattice_transM = None  # transport matrices of elements, see calcTransM()
+        self._lattice_gamma = None  # energy at the entrance and exit of elements
+        self._flyweight = flyweight  # share element definitions or not
+        self._lattice_eledefs = {}  # id(input element): (input element, shared definition)
+        self._lattice_startpos = 0.0  # position of the first element, [m]
+        self._lattice_pos = _PositionStore()  # element lengths and positions, [m]
+        self._lattice_owned = {}  # id: element objects copied by the model
+        self._lattice_dirty = False  # lattice (beamline element) string to be updated
+        self._lattice_ctrl_override = {}  # element index: ctrl configuration
+        self._lattice_index = None  # ({name: [index]}, {type: [index]}), see _getIndex()
+        self._lattice_drawpos = np.zeros((0, 2))  # start drawing points, see draw()
+        self._lattice_drawcache = drawutils.GeometryCache()  # see drawCollections()
         self._lattice = element.ElementBeamline(
             name=self._lattice_name,
             config="lattice = ()")  # initial lattice configuration
@@ -62,66 +115,486 @@ class Models(object):
     def mode(self, mode):
         self._mode = mode.lower()
 
-    def addElement(self, *ele):
-        """ add element to lattice element list
+    def addElement(self, *ele, **kws):
+        """ append elements to lattice element list, the positions of
+            new elements are calculated from the end of lattice.
 
             :param ele: magnetic element defined in element module
+            :param copy: True (default), element is deep copied before
+                appending; False, element object is shared with the caller,
+                the model copies it when writing it through updateConfig()
+                (copy on write), then the caller's object is not touched;
+                (not flyweight) the element object given more than once,
+                or already in this model, is copied for the duplicates,
+                ValueError is raised if the element is in another model
             return total element number
         """
-        for el in list(Models.flatten(ele)):
-            e = copy.deepcopy(el)
-            self._lattice_eleobjlist.append(e)
-            self._lattice_elenamelist.append(e.name)
-            self._lattice_elecnt += 1
-        # update lattice, i.e. beamline element
+        cp = kws.get('copy', True)
+        n0 = len(self._lattice_eleobjlist)
+        elist = self._takeElements(Models.flatten(ele), cp)
+        self._lattice_eleobjlist.extend(elist)
+        self._lattice_elenamelist.extend(e.name for e in elist)
+        self._lattice_pos.insert(n0, Models._getLengths(elist))
+        self._updatePos(n0)
+        self._bindPos(n0)
+        if self._lattice_index is not None:
+            for i, e in enumerate(elist, n0):
+                self._lattice_index[0].setdefault(e.name, []).append(i)
+                self._lattice_index[1].setdefault(e.typename, []).append(i)
+        self._lattice_elecnt = len(self._lattice_eleobjlist)
+        # lattice, i.e. beamline element, is updated when required
+        self._lattice_dirty = True
+
+        return self._lattice_elecnt
 
-        # self._lattice.setConf(Models.makeLatticeString(self._lattice_elenamelist))
-        self._lattice.setConf(Models.makeLatticeDict(self._lattice_elenamelist))
+    def insertElement(self, index, *ele, **kws):
+        """ insert elements before the element of index,
+            positions of the following elements are updated.
 
-        # positioning elements
-        self.initPos()
+            :param index: element index in lattice
+            :param ele: magnetic element defined in element module
+            :param copy: see addElement()
+            return total element number
+        """
+        cp = kws.get('copy', True)
+        n0 = len(self._lattice_eleobjlist)
+        if index < 0:
+            index = max(n0 + index, 0)
+        index = min(index, n0)
+        elist = self._takeElements(Models.flatten(ele), cp)
+        n = len(elist)
+        self._lattice_eleobjlist[index:index] = elist
+        self._lattice_elenamelist[index:index] = [e.name for e in elist]
+        self._lattice_pos.insert(index, Models._getLengths(elist))
+        self._shiftIndex(index, n)
+        self._lattice_elecnt = len(self._lattice_eleobjlist)
+        self._lattice_dirty = True
+        self._lattice_index = None
+        self._updatePos(index)
+        self._bindPos(index)
 
         return self._lattice_elecnt
 
+    def removeElement(self, index, count=1):
+        """ remove elements from lattice, positions of the following elements
+            are updated.
+
+            :param index: index of the first element to remove
+            :param count: number of elements to remove, 1 by default
+            return list of removed element objects
+        """
+        n0 = len(self._lattice_eleobjlist)
+        if index < 0:
+            index += n0
+        stop = min(index + count, n0)
+        removed = self._lattice_eleobjlist[index:stop]
+        if not self._flyweight:
+            for e in removed:
+                e.bindPosition(None)
+        del self._lattice_eleobjlist[index:stop]
+        del self._lattice_elenamelist[index:stop]
+        self._lattice_pos.remove(index, stop)
+        for i in range(index, stop):
+            self._lattice_ctrl_override.pop(i, None)
+        self._shiftIndex(stop, index - stop)
+        self._lattice_elecnt = len(self._lattice_eleobjlist)
+        self._lattice_dirty = True
+        self._lattice_index = None
+        self._updatePos(index)
+        self._bindPos(index)
+
+        return removed
+
+    def _takeElements(self, elements, cp):
+        """ element objects to be put in lattice, every occurrence has its
+            own object (not flyweight), as element position is bound to
+            the occurrence, see _bindPos()
+
+            :param elements: input element objects
+            :param cp: deep copy or not
+        """
+        if self._flyweight:
+            return [self._getDefinition(el, cp) for el in elements]
+        elist, taken = [], set()
+        for el in elements:
+            if not cp:
+                store = el.getPositionStore()
+                if store is None and id(el) not in taken:
+                    taken.add(id(el))
+                    elist.append(el)
+                    continue
+                if store is not None and store is not self._lattice_pos:
+                    raise ValueError("element '{0}' is in another model, add a copy of it, "
+                                     "or remove it from that model first".format(el.name))
+            e = copy.deepcopy(el)
+            self._lattice_owned[id(e)] = e
+            elist.append(e)
+        return elist
+
+    def _shiftIndex(self, index, n):
+        """ shift element index of ctrl overrides by n, from index
+        """
+        if self._lattice_ctrl_override:
+            self._lattice_ctrl_override = {(i + n if i >= index else i): v
+                                           for i, v in self._lattice_ctrl_override.items()}
+
+    def _updatePos(self, index=0):
+        """ update positions from the element of index, by prefix sum of lengths
+        """
+        self._lattice_pos.update(index, self._lattice_startpos)
+
+    def _bindPos(self, index=0):
+        """ bind positions of elements from index to the position store,
+            i.e. element positions are views, see MagBlock.bindPosition()
+        """
+        if not self._flyweight:
+            store = self._lattice_pos
+            for i, e in enumerate(self._lattice_eleobjlist[index:], index):
+                e.bindPosition(store, i)
+
+    @staticmethod
+    def _getLengths(elelist):
+        """ lengths of elements, read once for every unique element object
+        """
+        lengths = {}
+        for e in elelist:
+            if id(e) not in lengths:
+                lengths[id(e)] = e.getLength()
+        return [lengths[id(e)] for e in elelist]
+
+    def _syncLattice(self):
+        """ update lattice, i.e. beamline element, if required
+        """
+        if self._lattice_dirty:
+            self._lattice.setConf(Models.makeLatticeDict(self._lattice_elenamelist))
+            self._lattice_dirty = False
+
     def initPos(self, startpos=0.0):
         """ initialize the elements position [m] in lattice, the starting
-            point is 0 [m] for the first element by default.
+            point is 0 [m] for the first element by default, element
+            lengths are re-read.
 
             :param startpos: starting point, 0 [m] by default
         """
-        spos = startpos
-        for ele in self._lattice_eleobjlist:
-            # print("{name:<10s}: {pos:<10.3f}".format(name=ele.name, pos=spos))
-            ele.setPosition(spos)
-            spos += ele.getLength()
+        self._lattice_startpos = startpos
+        self._lattice_pos.lengths[:self._lattice_pos.n] = Models._getLengths(self._lattice_eleobjlist)
+        self._updatePos(0)
+
+    def _getDefinition(self, ele, cp=True):
+        """ shared element definition for input element object, flyweight mode
+        """
+        r = self._lattice_eledefs.get(id(ele))
+        if r is None:
+            # input element is kept to keep its id valid
+            if cp:
+                e = copy.deepcopy(ele)
+                self._lattice_owned[id(e)] = e
+            else:
+                e = ele
+            r = self._lattice_eledefs[id(ele)] = (ele, e)
+        return r[1]
+
+    @property
+    def flyweight(self):
+        return self._flyweight
+
+    def getPositions(self):
+        """ positions of all the elements along beamline, in [m]
+
+            :return: numpy array
+        """
+        return self._lattice_pos.getPositions().copy()
+
+    def getElementCount(self):
+        """ return number of element occurrences and unique element objects
+        """
+        return len(self._lattice_eleobjlist), len(set(id(e) for e in self._lattice_eleobjlist))
+
+    def setCtrlOverride(self, index, config):
+        """ control configuration for one element occurrence, which overrides
+            the ctrl configuration of the element (definition), e.g.
+            different PVs for the occurrences of one quad definition
+
+            :param index: element occurrence index in lattice
+            :param config: ctrl configuration dict, e.g. {'k1': {'pv': 'Q01:K1'}}
+        """
+        if isinstance(config, str):
+            config = element.MagBlock.str2dict(config)
+        self._lattice_ctrl_override.setdefault(index, {}).update(config)
+
+    def getCtrlOverride(self, index):
+        """ return control override dict for element occurrence, or None
+        """
+        return self._lattice_ctrl_override.get(index)
+
+    def _getTransParams(self, elelist=None):
+        """ collect the parameters of all elements for transport matrices
+            calculation into arrays, keys: 'type' (see _TRANS_TYPE_CODE),
+            'l', 'k1', 'angle', 'volt', 'phase', 'freq', 'end1', 'end2'
+
+            :param elelist: element object list, all lattice elements by default
+        """
+        if elelist is None:
+            elelist = self._lattice_eleobjlist
+        # parameters are collected for unique element objects
+        uniq, eleidx, defs = {}, [], []
+        for e in elelist:
+            i = uniq.get(id(e))
+            if i is None:
+                i = uniq[id(e)] = len(defs)
+                defs.append(e)
+            eleidx.append(i)
+        getf = Models._getFloat
+        types, l, k1, angle = [], [], [], []
+        rfidx, volt, phase, freq, end1, end2 = [], [], [], [], [], []
+        for i, e in enumerate(defs):
+            conf = e.simuinfo
+            t = _TRANS_TYPE_CODE.get(e.typename, 0)
+            types.append(t)
+            l.append(getf(conf, 'l', 0.0))
+            k1.append(getf(conf, 'k1', 0.0) if t == 1 else 0.0)
+            angle.append(getf(conf, 'angle', 0.0) if t == 2 else 0.0)
+            if t == 3:
+                rfidx.append(i)
+                volt.append(getf(conf, 'volt', 0.0))
+                phase.append(getf(conf, 'phase', 0.0))
+                freq.append(getf(conf, 'freq', 2856.0e6))
+                # unresolved rpn variables, e.g. "cellfocus", treated as focusing on
+                end1.append(getf(conf, 'end1_focus', 1.0) != 0)
+                end2.append(getf(conf, 'end2_focus', 1.0) != 0)
+        n = len(types)
+        p = {'type': np.array(types, dtype=int), 'l': np.array(l, dtype=np.float64),
+             'k1': np.array(k1, dtype=np.float64), 'angle': np.array(angle, dtype=np.float64)}
+        for k, v, v0 in (('volt', volt, 0.0), ('phase', phase, 0.0), ('freq', freq, 2856.0e6),
+                         ('end1', end1, 1.0), ('end2', end2, 1.0)):
+            p[k] = np.full(n, v0)
+            p[k][rfidx] = v
+        if n != len(eleidx):
+            eleidx = np.array(eleidx, dtype=int)
+            p = {k: v[eleidx] for k, v in p.items()}
+        return p
+
+    @staticmethod
+    def _getFloat(conf, key, default):
+        """ return float value of conf[key], or default if not valid
+        """
+        try:
+            return float(conf.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _trackEnergy(params, gamma0):
+        """ reference energy at the entrance and exit of every element
+
+            :param params: dict of parameter arrays, see _getTransParams()
+            :param gamma0: electron energy at the beginning, gamma value
+        """
+        dgamma = np.where(params['type'] == 3,
+                          mathutils.rfEnergyGain(params['volt'], params['phase']), 0.0)
+        gamma_out = gamma0 + np.cumsum(dgamma)
+        gamma_in = gamma_out - dgamma
+        return gamma_in, gamma_out
+
+    def getEnergyProfile(self, gamma0):
+        """ track the reference energy along the beamline, energy is changed
+            by RFCW elements, regarding 'volt' [V] and 'phase' [deg] (90 is on-crest)
+
+            :param gamma0: electron energy at the beginning, gamma value
+            :return: tuple of (gamma_in, gamma_out), the gamma values at the
+                entrance and exit of every element, numpy arrays
+        """
+        return Models._trackEnergy(self._getTransParams(), gamma0)
+
+    def calcTransM(self, gamma0):
+        """ calculate transport matrices of all elements, each element uses
+            the local energy, i.e. gamma value at its entrance, tracked
+            through RFCW elements (see getEnergyProfile()), calculation is
+            vectorized by element type.
+
+            In 'online' mode, element configurations are updated from
+            control fields, see getCtrlConf().
+
+            :param gamma0: electron energy at the beginning, gamma value
+            :return: numpy array with the shape of (N, 6, 6), N is the
+                total element number
+        """
+        if self.mode == 'online':
+            elelist = self.getCtrlConf(msgout=False)
+        else:
+            elelist = self._lattice_eleobjlist
+        p = self._getTransParams(elelist)
+        gamma_in, gamma_out = Models._trackEnergy(p, gamma0)
+        m = Models._transMatrices(p, gamma_in)
+        self._lattice_gamma = gamma_in, gamma_out
+        self._lattice_transM = m
+        return m
+
+    @staticmethod
+    def _transMatrices(params, gamma_in, sel=None):
+        """ transport matrices by element type, vectorized
+
+            :param params: dict of parameter arrays, see _getTransParams()
+            :param gamma_in: energy at the entrance of elements
+            :param sel: indices of elements to calculate, all by default
+            :return: (n, 6, 6) numpy array, n is the number of selected elements
+        """
+        if sel is not None:
+            params = {k: v[sel] for k, v in params.items()}
+            gamma_in = gamma_in[sel]
+        p = params
+        m = mathutils.transDriftBatch(p['l'], gamma_in)
+        idx = np.flatnonzero(p['type'] == 1)
+        if idx.size > 0:
+            m[idx] = mathutils.transQuadBatch(p['l'][idx], p['k1'][idx], gamma_in[idx])
+        idx = np.flatnonzero((p['type'] == 2) & (p['angle'] != 0))
+        if idx.size > 0:
+            theta = p['angle'][idx]
+            m[idx] = mathutils.transRbendBatch(theta, p['l'][idx] / np.sin(theta), gamma_in[idx])
+        idx = np.flatnonzero(p['type'] == 3)
+        if idx.size > 0:
+            m[idx] = mathutils.transRfcwBatch(p['l'][idx], p['volt'][idx], p['phase'][idx],
+                                              p['freq'][idx], gamma_in[idx],
+                                              p['end1'][idx], p['end2'][idx])
+        return m
+
+    def getTransM(self, gamma0):
+        """ transport matrix of the whole beamline
+
+            :param gamma0: electron energy at the beginning, gamma value
+            :return: 6 x 6 numpy array
+        """
+        return mathutils.chainBatch(self.calcTransM(gamma0))
+
+    def startLive(self, gamma0, twiss0=None, debounce=0.05, backend=None):
+        """ start live optics, transport matrices and twiss parameters are
+            recomputed incrementally when the PVs of elements change, see
+            LiveOptics.
+
+            :param gamma0: electron energy at the beginning, gamma value
+            :param twiss0: initial twiss parameters, (beta_x, alpha_x, beta_y, alpha_y),
+                twiss parameters are not calculated if None (by default)
+            :param debounce: time window to collect bursty PV updates, [s]
+            :param backend: control backend, process-wide backend by default
+            :return: started LiveOptics instance, call stop() when done
+        """
+        live = LiveOptics(self, gamma0, twiss0=twiss0, debounce=debounce, backend=backend)
+        live.start()
+        return live
 
     def getCtrlConf(self, msgout=True):
         """ get control configurations regarding to the PV names,
-            read PV value
+            read PV value from the process-wide PV cache, PVs not cached
+            are read in one batch (see ctrlutils.PVCache), only the elements with updated
+            configurations are copied, the others are shared with the model
+            (positions are still bound to the model), see snapshot().
 
             :param msgout: print information if True (by default)
             return updated element object list
         """
-        _lattice_eleobjlist_copy = copy.deepcopy(self._lattice_eleobjlist)
+        snap = self.snapshot(msgout=msgout)
+        return [e if e.getPositionStore() is self._lattice_pos else snap[i]
+                for i, e in enumerate(snap._elements)]
+
+    def snapshot(self, msgout=False):
+        """ take a snapshot of model state, element objects are shared
+            between the model and snapshots, only the elements with ctrl
+            overrides or PV readings ('online' mode) are copied (see
+            MagBlock.shallowCopy()); the model copies shared elements
+            before writing them (see updateConfig()), so snapshots are not
+            changed afterwards; positions of snapshot elements are the ones
+            at the time of snapshot (see ModelSnapshot).
+
+            :param msgout: print PV reading information if True
+            :return: ModelSnapshot instance
+        """
+        elements, readings = self._overlayElements(msgout)
+        # all the elements are shared with the snapshot from now on
+        self._lattice_owned = {}
+        return ModelSnapshot(self.name, elements, self._lattice_elenamelist,
+                             self.getPositions(), readings)
+
+    def _overlayElements(self, msgout=False):
+        """ element list with ctrl overrides and PV readings ('online' mode)
+            applied, see snapshot(), the model elements are not changed
+
+            :return: (element list, {pv: reading})
+        """
+        elements = list(self._lattice_eleobjlist)
+        # copies are reused by the following snapshots if nothing is changed,
+        # cache entry: (element, configVersion, overlay, copy)
+        overcopies = {}
+        # occurrences with ctrl overrides get their own copies
+        for i, conf in self._lattice_ctrl_override.items():
+            base = elements[i]
+            c = self._lattice_overcopies.get(i)
+            if c is None or c[0] is not base or c[1] != base.configVersion or c[2] != conf:
+                e = base.shallowCopy()
+                e.setConf(conf, type='ctrl')
+                c = (base, base.configVersion, dict(conf), e)
+            overcopies[i] = c
+            elements[i] = c[3]
+        self._lattice_overcopies = overcopies
+        readings = {}
         if self.mode == 'online':
-            for e in _lattice_eleobjlist_copy:
-                for k in (set(e.simukeys) & set(e.ctrlkeys)):
-                    try:
-                        if msgout:
-                            print("Reading from %s..." % e.ctrlinfo[k]['pv'])
-                        pvval = epics.caget(e.ctrlinfo[k]['pv'])
-                        if pvval is not None:
-                            e.simuinfo[k] = e.unitTrans(pvval, direction='+')
-                            if msgout:
-                                print("  Done.")
-                        else:
-                            if msgout:
-                                print("  Failed.")
-                    except:
-                        pass
-        else:  # self.mode is 'simu' do nothing
-            pass
-        return _lattice_eleobjlist_copy
+            # shared element definitions are updated once
+            uniq = {id(e): e for e in elements}
+            versions = list(map(_configVersion, elements))
+            cache = self._lattice_pvkeys
+            if cache is not None and cache[0] == elements and cache[1] == versions:
+                pvkeys = cache[2]
+            else:
+                pvkeys = []  # (id(element), key, pv)
+                for eid, e in uniq.items():
+                    for k in (set(e.simukeys) & set(e.ctrlkeys)):
+                        pv = e.ctrlinfo[k].get('pv') if isinstance(e.ctrlinfo[k], dict) else None
+                        if pv is not None:
+                            pvkeys.append((eid, k, pv))
+                self._lattice_pvkeys = (list(elements), versions, pvkeys)
+            pvvals = ctrlutils.getPVCache().getMany([pv for eid, k, pv in pvkeys])
+            updates = {}  # id(element): {key: physical value}
+            for eid, k, pv in pvkeys:
+                pvval = pvvals.get(pv)
+                if msgout:
+                    print("Reading from %s... %s" % (pv, "Failed." if pvval is None else "Done."))
+                if pvval is None:
+                    continue
+                readings[pv] = pvval
+                updates.setdefault(eid, {})[k] = uniq[eid].unitTrans(pvval, direction='+')
+            pvcopies, newobj = {}, {}
+            for eid, conf in updates.items():
+                base = uniq[eid]
+                c = self._lattice_pvcopies.get(eid)
+                if c is None or c[0] is not base or c[1] != base.configVersion or c[2] != conf:
+                    e = base.shallowCopy()
+                    e.setConf(conf, type='simu')
+                    c = (base, base.configVersion, conf, e)
+                pvcopies[eid] = c
+                newobj[eid] = c[3]
+            self._lattice_pvcopies = pvcopies
+            if newobj:
+                elements = [newobj.get(id(e), e) for e in elements]
+        return elements, readings
+
+    def restoreSnapshot(self, snapshot, readback=False, timeout=5.0, msgout=True):
+        """ write the PV readings of snapshot back to control system, as
+            one transaction, only the PVs with different values now are
+            written, see ctrlutils.putPVs().
+
+            :param snapshot: ModelSnapshot instance, taken in 'online' mode
+            :param readback: check readback values or not, False by default
+            :param timeout: time limit of writing and readback, [s]
+            :param msgout: print result if True (by default)
+            :return: ctrlutils.PutResult instance
+        """
+        pvnames = list(snapshot.readings)
+        current = ctrlutils.getPVCache().getMany(pvnames)
+        pvnames = [pv for pv in pvnames if current.get(pv) != snapshot.readings[pv]]
+        result = ctrlutils.putPVs(pvnames, [snapshot.readings[pv] for pv in pvnames],
+                                  readback=readback, timeout=timeout)
+        if msgout:
+            print(result)
+        return result
 
     def putCtrlConf(self, eleobj, ctrlkey, val, type='raw'):
         """ put the value to control PV field
@@ -138,34 +611,127 @@ class Models(object):
                 newval = val
             else:  # val should be translated
                 newval = eleobj.unitTrans(val, direction='-')
-            epics.caput(eleobj.ctrlinfo[ctrlkey]['pv'], newval)
-            return True
+            return ctrlutils.getBackend().put(eleobj.ctrlinfo[ctrlkey]['pv'], newval)
         else:
             return False
 
+    def putCtrlConfBatch(self, settings, type='raw', readback=False, tolerance=1e-6,
+                         timeout=5.0, rollback=True, msgout=True):
+        """ put new values to control PVs in one batch as a transaction,
+            values are all converted before writing, PVs are written
+            concurrently, prior values are restored on failure, see
+            ctrlutils.putPVs().
+
+            :param settings: list of (eleobj, ctrlkey, val), see putCtrlConf()
+            :param type: 'raw' (default) or 'real', see putCtrlConf()
+            :param readback: check readback values or not, False by default
+            :param tolerance: max absolute difference of readback, in PV unit
+            :param timeout: time limit of writing and readback, [s]
+            :param rollback: restore prior values on failure, True by default
+            :param msgout: print batch latency if True (by default)
+            :return: ctrlutils.PutResult instance
+        """
+        pvnames, values = [], []
+        for eleobj, ctrlkey, val in settings:
+            if ctrlkey not in eleobj.ctrlkeys:
+                raise KeyError("{0} is not control key of {1}".format(ctrlkey, eleobj.name))
+            pvnames.append(eleobj.ctrlinfo[ctrlkey]['pv'])
+            if type == 'raw':
+                values.append(val)
+            else:  # val should be translated
+                values.append(eleobj.unitTrans(val, direction='-'))
+        result = ctrlutils.putPVs(pvnames, values, readback=readback, tolerance=tolerance,
+                                  timeout=timeout, rollback=rollback)
+        if msgout:
+            print(result)
+        return result
+
     def getAllConfig(self, fmt='json'):
         """
             return all element configurations as json string file.
             could be further processed by beamline.Lattice class
 
-            :param fmt: 'json' (default) or 'dict'
+            The configuration of every element is dumped and serialized once,
+            and cached until the element is changed (see
+            MagBlock.configVersion), the json string is assembled from the
+            cached pieces; orjson is used to serialize if installed.
+
+            In 'online' mode, the PV readings are applied as getCtrlConf(),
+            the elements with readings are dumped from the copies which are
+            reused while the readings are not changed; the model elements
+            are not shared (see snapshot()).
+
+            :param fmt: 'json' (default) or 'dict', the returned dict should
+                not be changed
         """
-        for e in self.getCtrlConf(msgout=False):
-            self._lattice_confdict.update(e.dumpConfig(type='simu'))
-        self._lattice_confdict.update(self._lattice.dumpConfig())
+        self._syncLattice()
+        elements = self._overlayElements()[0] + [self._lattice]
+        versions = list(map(_configVersion, elements))
+        cache = self._lattice_confcache
+        if cache is None or cache[0] != elements or cache[1] != versions:
+            fragments = {}
+            parts = {}  # element name: (dict, json), the last definition is used
+            for e in elements:
+                eid = id(e)
+                f = fragments.get(eid)
+                if f is None:
+                    f = self._lattice_fragments.get(eid)
+                    if f is None or f[0] is not e or f[1] != e.configVersion:
+                        conf = e.dumpConfig(type='simu')
+                        f = (e, e.configVersion, conf, _dumpJson(conf)[1:-1])
+                    fragments[eid] = f
+                    name = next(iter(f[2]))
+                    parts[name] = f[2:]
+            # fragments of the elements not in lattice any more are dropped
+            self._lattice_fragments = fragments
+            self._lattice_confdict = {k: v[0][k] for k, v in parts.items()}
+            jsonstr = '{' + _JSON_SEP.join(v[1] for v in parts.values()) + '}'
+            self._lattice_confcache = (elements, versions, jsonstr)
         if fmt == 'json':
-            return json.dumps(self._lattice_confdict)
+            return self._lattice_confcache[2]
         else:
             return self._lattice_confdict
 
     def updateConfig(self, eleobj, config, type='simu'):
-        """ write new configuration to element
+        """ write new configuration to element, if element object is shared
+            with the caller (see addElement(copy=False)) or snapshots (see
+            snapshot()), it is copied first,
+            and all the occurrences in lattice are replaced by the copy;
+            positions are updated if length is changed.
 
             :param eleobj: define element object
             :param config: new configuration for element, string or dict
             :param type: 'simu' by default, could be online, misc, comm, ctrl
+            :return: element object updated
         """
+        idx = None
+        if id(eleobj) not in self._lattice_owned:
+            idx = [i for i, e in enumerate(self._lattice_eleobjlist) if e is eleobj]
+            if idx:
+                newobj = eleobj.shallowCopy()
+                self._lattice_owned[id(newobj)] = newobj
+                if eleobj.getPositionStore() is self._lattice_pos:
+                    # the replaced object keeps its position
+                    eleobj.bindPosition(None)
+                for i in idx:
+                    self._lattice_eleobjlist[i] = newobj
+                    if not self._flyweight:
+                        newobj.bindPosition(self._lattice_pos, i)
+                for k, v in self._lattice_eledefs.items():
+                    if v[1] is eleobj:
+                        self._lattice_eledefs[k] = (v[0], newobj)
+                eleobj = newobj
         eleobj.setConf(config, type=type)
+        if type == 'simu':
+            l = eleobj.getLength()
+            if idx is None:
+                idx = [i for i, e in enumerate(self._lattice_eleobjlist) if e is eleobj]
+            lengths = self._lattice_pos.getLengths()
+            changed = [i for i in idx if lengths[i] != l]
+            if changed:
+                lengths[changed] = l
+                self._updatePos(changed[0])
+        return eleobj
 
     @staticmethod
     def makeLatticeString(ele):
@@ -213,17 +779,75 @@ class Models(object):
     def __str__(self):
         return self.getAllConfig()
 
-    def getElementsByName(self, name):
+    def _getIndex(self):
+        """ name and type indexes of elements, built when required,
+            updated by addElement(), rebuilt after insertElement()
+            and removeElement()
+
+            :return: tuple of dict, ({name: [index]}, {type: [index]})
+        """
+        if self._lattice_index is None:
+            nameidx, typeidx = {}, {}
+            for i, e in enumerate(self._lattice_eleobjlist):
+                nameidx.setdefault(self._lattice_elenamelist[i], []).append(i)
+                typeidx.setdefault(e.typename, []).append(i)
+            self._lattice_index = (nameidx, typeidx)
+        return self._lattice_index
+
+    def _getByIndex(self, idx, index):
+        """ return indices or element objects
+        """
+        if index:
+            return list(idx)
+        return [self._lattice_eleobjlist[i] for i in idx]
+
+    def getElementsByName(self, name, index=False):
         """ get element with given name,
             return list of element objects regarding to 'name'
 
             :param name: element name, case sensitive, if elements are
                 auto-generated from LteParser, the name should be lower cased.
+            :param index: return element indices instead of objects if True
         """
-        try:
-            return filter(lambda x: x.name == name, self._lattice_eleobjlist)
-        except:
-            return []
+        return self._getByIndex(self._getIndex()[0].get(name, []), index)
+
+    def getElementsByType(self, type, index=False):
+        """ get elements of given type, e.g. 'quad', 'moni'
+
+            :param type: element type name, case insensitive, alias like
+                'drif' is accepted (see element.registerElement())
+            :param index: return element indices instead of objects if True
+        """
+        eclass = element.getElementClass(type)
+        typename = eclass.typename if eclass is not None else type.upper()
+        return self._getByIndex(self._getIndex()[1].get(typename, []), index)
+
+    def getElementAt(self, s, index=False):
+        """ get the element at position s, i.e. the last element starting
+            at or before s, by bisection over element positions
+
+            :param s: position along beamline, [m]
+            :param index: return element index instead of object if True
+            :return: element object (or index), None if s is out of lattice
+        """
+        spos, lengths = self._lattice_pos.getPositions(), self._lattice_pos.getLengths()
+        i = int(np.searchsorted(spos, s, side='right')) - 1
+        if i < 0 or s > spos[i] + lengths[i]:
+            return None
+        return i if index else self._lattice_eleobjlist[i]
+
+    def getElementsWithin(self, s1, s2, index=False):
+        """ get the elements starting within [s1, s2], by bisection over
+            element positions
+
+            :param s1: start position, [m]
+            :param s2: end position, [m]
+            :param index: return element indices instead of objects if True
+        """
+        spos = self._lattice_pos.getPositions()
+        i1 = int(np.searchsorted(spos, s1, side='left'))
+        i2 = int(np.searchsorted(spos, s2, side='right'))
+        return self._getByIndex(range(i1, i2), index)
 
     def printAllElements(self):
         """ print out all modeled elements
@@ -236,6 +860,19 @@ class Models(object):
                   .format(cnt=cnt, name=e.name, type=e.typename, classname=e.__class__.__name__))
             cnt += 1
 
+    def getSurvey(self, startpoint=(0, 0), angle=0.0, bend=True):
+        """ floor coordinates of all the elements, calculated in batch
+            without drawing, see survey.calcSurvey()
+
+            :param startpoint: start point coords, default: (0, 0)
+            :param angle: start heading angle, [rad], default: 0
+            :param bend: if the heading is changed by bends, default: True,
+                False is for the placement of 'plain' drawing mode
+            :return: survey.Survey instance
+        """
+        return survey.calcSurvey(self._lattice_eleobjlist, startpoint=startpoint,
+                                 angle=angle, bend=bend)
+
     def draw(self, startpoint=(0, 0), mode='plain', showfig=False):
         """ lattice visualization
             
@@ -253,7 +890,9 @@ class Models(object):
         anotelist = []
         xmin0, xmax0, ymin0, ymax0 = 0, 0, 0, 0
         xmin, xmax, ymin, ymax = 0, 0, 0, 0
+        drawpos = []
         for ele in self._lattice_eleobjlist:
+            drawpos.append(p0)
             ele.setDraw(p0=p0, angle=angle, mode=mode)
             angle += ele.next_inc_angle
             # print(ele.name + ele.next_inc_angle + angle)
@@ -271,6 +910,7 @@ class Models(object):
             xmax0 = max(xmax, xmax0)
             ymin0 = min(ymin, ymin0)
             ymax0 = max(ymax, ymax0)
+        self._lattice_drawpos = np.array(drawpos, dtype=np.float64).reshape(-1, 2)
 
         # show figure or not
         if showfig:
@@ -290,17 +930,62 @@ class Models(object):
 
         return patchlist, anotelist, (xmin0, xmax0), (ymin0, ymax0)
 
+    def getDrawGeometry(self, startpoint=(0, 0), mode='plain'):
+        """ drawing geometry of all the elements, calculated in arrays and
+            cached by mode until elements are changed (see
+            drawutils.GeometryCache); the returned geometry should not be
+            changed.
+
+            :param startpoint: start drawing point coords, default: (0, 0)
+            :param mode: artist mode, 'plain' or 'fancy', 'plain' by default
+            :return: drawutils.DrawGeometry instance, None if there are
+                element types not supported by drawutils
+        """
+        elements = self._lattice_eleobjlist
+        if not drawutils.isSupported(elements):
+            return None
+        geom = self._lattice_drawcache.getGeometry(elements, startpoint=startpoint, mode=mode)
+        self._lattice_drawpos = geom.p0
+        return geom
+
+    def drawCollections(self, startpoint=(0, 0), mode='plain'):
+        """ lattice visualization in batch, the drawing geometry of all
+            the elements is calculated in arrays, and rendered by a few
+            matplotlib collections (see drawutils), which is much faster
+            than draw() for large lattice; falls back to draw() if there
+            are element types not supported by drawutils.
+            The geometry is cached by mode until elements are changed
+            (see getDrawGeometry()), mode switches and redraws of
+            unchanged lattice only make new artists.
+
+            :param startpoint: start drawing point coords, default: (0, 0)
+            :param mode: artist mode, 'plain' or 'fancy', 'plain' by default
+            :return: artists, anotelist, (xmin0, xmax0), (ymin0, ymax0), see draw()
+                artists: list of matplotlib collections, or patches for fallback
+        """
+        geom = self.getDrawGeometry(startpoint=startpoint, mode=mode)
+        if geom is None:
+            return self.draw(startpoint=startpoint, mode=mode)
+        xmin0, xmax0, ymin0, ymax0 = geom.bounds
+        return geom.makeArtists(), geom.getAnotes(), (xmin0, xmax0), (ymin0, ymax0)
+
     @staticmethod
     def plotElements(ax, patchlist):
         """ plot elements' drawings to axes
             
             :param ax: matplotlib axes object
-            :param patchlist: element patch object list
+            :param patchlist: element patch object list, or collections,
+                see drawCollections()
         """
-        [ax.add_patch(ptch) for ptch in patchlist]
+        for ptch in patchlist:
+            if isinstance(ptch, Collection):
+                ax.add_collection(ptch, autolim=False)
+            else:
+                ax.add_patch(ptch)
 
     @staticmethod
-    def anoteElements(ax, anotelist, showAccName=False, efilter=None, textypos=None, **kwargs):
+    def anoteElements(ax, anotelist, showAccName=False, efilter=None, textypos=None, batch=False,
+                      **kwargs):
         """ annotate elements to axes
             
             :param ax: matplotlib axes object
@@ -311,6 +996,9 @@ class Models(object):
                 could be defined to be one type name or type name list/tuple, e.g.
                 filter='QUAD' or filter=('QUAD', 'CSRCSBEN')
             :param textypos: y coordinator of annotated text string
+            :param batch: if True, all the annotations are drawn by one
+                artist, with labels decimated by density on screen, see
+                drawutils.AnnotationLayer; default is False
             :param kwargs:
                 alpha=0.8, arrowprops=dict(arrowstyle='->'), rotation=-60, fontsize='small'
 
@@ -319,6 +1007,12 @@ class Models(object):
         defaultstyle = {'alpha': 0.8, 'arrowprops': dict(arrowstyle='->'),
                         'rotation': -60, 'fontsize': 'small'}
         defaultstyle.update(kwargs)
+        if batch:
+            layer = drawutils.AnnotationLayer(anotelist, showAccName=showAccName,
+                                              efilter=efilter, textypos=textypos,
+                                              **defaultstyle)
+            ax.add_artist(layer)
+            return [layer]
         anote_list = []
         if efilter is None:
             for anote in anotelist:
@@ -354,6 +1048,423 @@ class Models(object):
         return anote_list
 
 
+class _PositionStore(object):
+    """ lengths and positions of elements in Models, contiguous float64
+    arrays with spare capacity, elements refer to positions by index,
+    see MagBlock.bindPosition().
+    """
+
+    __slots__ = ('lengths', 'spos', 'n')
+
+    def __init__(self):
+        self.lengths = np.zeros(16)
+        self.spos = np.zeros(16)
+        self.n = 0  # number of elements
+
+    def getLengths(self):
+        return self.lengths[:self.n]
+
+    def getPositions(self):
+        return self.spos[:self.n]
+
+    def insert(self, index, lengths):
+        """ insert lengths before index, positions should be updated
+        """
+        k, n = len(lengths), self.n
+        if n + k > len(self.lengths):
+            cap = max(2 * len(self.lengths), n + k)
+            for attr in ('lengths', 'spos'):
+                a = np.zeros(cap)
+                a[:n] = getattr(self, attr)[:n]
+                setattr(self, attr, a)
+        if index < n:
+            self.lengths[index + k:n + k] = self.lengths[index:n]
+        self.lengths[index:index + k] = lengths
+        self.n = n + k
+
+    def remove(self, index, stop):
+        """ remove elements of [index, stop), positions should be updated
+        """
+        n, k = self.n, stop - index
+        self.lengths[index:n - k] = self.lengths[stop:n]
+        self.n = n - k
+
+    def update(self, index, startpos):
+        """ update positions from index, by prefix sum of lengths
+        """
+        n = self.n
+        if index >= n:
+            return
+        if index == 0:
+            spos0 = startpos
+        else:
+            spos0 = self.spos[index - 1] + self.lengths[index - 1]
+        # running sum from spos0, the same as adding lengths one by one
+        self.spos[index] = spos0
+        if index + 1 == n:
+            return
+        self.spos[index + 1:n] = self.lengths[index:n - 1]
+        np.cumsum(self.spos[index:n], out=self.spos[index:n])
+
+
+class ModelSnapshot(object):
+    """ snapshot of Models state, see Models.snapshot(), should not be
+    changed; element objects are shared with the model and other
+    snapshots until they are changed. Elements whose positions are bound
+    to the model (see MagBlock.bindPosition()) or differ from the snapshot
+    are handed out as copies with the snapshot positions.
+
+    :param name: lattice name
+    :param elements: element object list
+    :param names: element name list
+    :param spos: element positions, [m]
+    :param readings: dict of PV readings, pvname: value
+    """
+
+    def __init__(self, name, elements, names, spos, readings=None):
+        self._name = name
+        self._elements = tuple(elements)
+        self._names = tuple(names)
+        self._spos = np.array(spos, dtype=np.float64)
+        self._readings = readings if readings is not None else {}
+        self._time = time.time()
+        self._detached = {}  # index: element copy, see _getElement()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def time(self):
+        return self._time
+
+    @property
+    def readings(self):
+        return self._readings
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __getitem__(self, i):
+        idx = range(len(self._elements))[i]
+        if isinstance(idx, range):
+            return [self._getElement(k) for k in idx]
+        return self._getElement(idx)
+
+    def __iter__(self):
+        return (self._getElement(i) for i in range(len(self._elements)))
+
+    def _getElement(self, i):
+        """ element of index i, with the position of snapshot
+        """
+        e = self._elements[i]
+        s = e.getPosition()
+        if s is None or (e.getPositionStore() is None and s == self._spos[i]):
+            return e
+        c = self._detached.get(i)
+        if c is None:
+            c = self._detached[i] = copy.copy(e)
+            c.setPosition(float(self._spos[i]))
+        return c
+
+    def getElements(self):
+        """ return list of element objects
+        """
+        return list(self)
+
+    def getPositions(self):
+        """ positions of all the elements along beamline, in [m]
+        """
+        return self._spos.copy()
+
+    def getAllConfig(self, fmt='json'):
+        """ return all element configurations, see Models.getAllConfig()
+
+            :param fmt: 'json' (default) or 'dict'
+        """
+        confdict = {}
+        for e in {id(e): e for e in self._elements}.values():
+            confdict.update(e.dumpConfig(type='simu'))
+        confdict[self._name] = {'BEAMLINE': Models.makeLatticeDict(self._names)}
+        if fmt == 'json':
+            return json.dumps(confdict)
+        else:
+            return confdict
+
+    def diff(self, other, type='simu'):
+        """ differences of element configurations to other snapshot of the
+            same lattice, only the elements not shared are compared.
+
+            :param other: ModelSnapshot instance
+            :param type: 'simu' (default) or 'ctrl'
+            :return: list of (index, key, value of other, value of this)
+        """
+        if len(other) != len(self):
+            raise ValueError("snapshots of different lattices")
+        ret = []
+        for i, (e0, e1) in enumerate(zip(other._elements, self._elements)):
+            if e0 is e1:
+                continue
+            c0 = e0.simuinfo if type == 'simu' else e0.ctrlinfo
+            c1 = e1.simuinfo if type == 'simu' else e1.ctrlinfo
+            for k in sorted(set(c0) | set(c1)):
+                if c0.get(k) != c1.get(k):
+                    ret.append((i, k, c0.get(k), c1.get(k)))
+        return ret
+
+
+class LiveOptics(object):
+    """ live optics of Models, driven by PV change events.
+
+    The PVs of element control fields (see getCtrlConf()) are monitored,
+    each change marks the elements with that PV dirty, after the debounce
+    window the transport matrices of dirty elements are recalculated,
+    the accumulated matrices (and twiss parameters) are updated from the
+    first dirty element downstream, then the result is sent to subscribers.
+    Elements of the model are not changed.
+
+    Usage:
+
+    >>> live = model.startLive(gamma0=200.0, twiss0=(10, 0, 10, 0))
+    >>> cancel = live.subscribe(lambda r: print(r['beta'][-1], r['latency']))
+    >>> live.stop()
+
+    :param model: Models instance
+    :param gamma0: electron energy at the beginning, gamma value
+    :param twiss0: initial twiss parameters, (beta_x, alpha_x, beta_y, alpha_y)
+    :param debounce: time window to collect bursty PV updates, [s]
+    :param backend: control backend, process-wide backend by default
+    """
+
+    def __init__(self, model, gamma0, twiss0=None, debounce=0.05, backend=None):
+        self.model = model
+        self.gamma0 = gamma0
+        self.twiss0 = twiss0
+        self.debounce = debounce
+        self._backend = backend
+        self._pvmap = LiveOptics._mapPVs(model)
+        self._params = model._getTransParams()
+        self._gamma_in, self._gamma_out = Models._trackEnergy(self._params, gamma0)
+        transM = Models._transMatrices(self._params, self._gamma_in)
+        cumM = mathutils.cumChainBatch(transM)
+        self._result = self._makeResult(transM, cumM, 0, np.arange(len(transM)), None)
+        self._cond = threading.Condition()
+        self._pending = {}  # pvname: latest value
+        self._pending_t = None  # time of the first pending event
+        self._subscribers = []
+        self._cancels = []
+        self._thread = None
+        self._running = False
+        self._stats = {'events': 0, 'updates': 0, 'latency': 0.0, 'latency_max': 0.0,
+                       'compute': 0.0, 'compute_max': 0.0}
+
+    @staticmethod
+    def _mapPVs(model):
+        """ map PV names to element parameters
+
+        :return: dict, pvname: list of (key, occurrence indices, element)
+        """
+        pvmap = {}
+        for i, e in enumerate(model._lattice_eleobjlist):
+            ctrl = e.ctrlinfo
+            override = model.getCtrlOverride(i)
+            if override:
+                ctrl = dict(ctrl, **override)
+            for k in _LIVE_KEYS:
+                if k not in e.simuinfo or not isinstance(ctrl.get(k), dict):
+                    continue
+                pv = ctrl[k].get('pv')
+                if pv is None:
+                    continue
+                entries = pvmap.setdefault(pv, {})
+                entries.setdefault((k, id(e)), (e, []))[1].append(i)
+        return {pv: [(k, np.array(idx), e) for (k, eid), (e, idx) in entries.items()]
+                for pv, entries in pvmap.items()}
+
+    @property
+    def pvnames(self):
+        return list(self._pvmap)
+
+    def start(self):
+        """ monitor PVs and start update thread
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='LiveOptics')
+        self._thread.daemon = True
+        self._thread.start()
+        backend = self._backend or ctrlutils.getBackend()
+        self._cancels = [backend.monitor(pv, self._onValue) for pv in self._pvmap]
+
+    def stop(self):
+        """ cancel PV monitors and stop update thread
+        """
+        for cancel in self._cancels:
+            cancel()
+        self._cancels = []
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def subscribe(self, callback):
+        """ call callback(result) on every update, see getResult()
+
+        :return: function to cancel subscription
+        """
+        self._subscribers.append(callback)
+
+        def cancel():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return cancel
+
+    def getResult(self):
+        """ return the latest result, dict with keys:
+            'transM', 'cumM': transport matrices of elements, and from the
+            beginning to the exit of elements, (N, 6, 6) arrays;
+            'gamma': energy at the exit of elements;
+            'beta', 'alpha': twiss parameters at the exit of elements,
+            (N, 2) arrays for x and y, None if twiss0 is not defined;
+            'dirty': indices of recalculated elements;
+            'time': time of update, 'latency': time from the first PV change
+            to the update, [s], None for the initial result.
+            Arrays are not changed by later updates.
+        """
+        return self._result
+
+    def getStats(self):
+        """ return dict of statistics, 'events': PV change events,
+            'updates': optics updates, 'latency', 'compute': mean time from
+            PV change to update and of recalculation, with max values, [s]
+        """
+        st = dict(self._stats)
+        n = st['updates']
+        st['latency'] = st['latency'] / n if n else 0.0
+        st['compute'] = st['compute'] / n if n else 0.0
+        return st
+
+    def _onValue(self, pvname, value, timestamp):
+        if value is None:  # disconnected, keep the last value
+            return
+        with self._cond:
+            self._pending[pvname] = value
+            if self._pending_t is None:
+                self._pending_t = timestamp or time.time()
+            self._stats['events'] += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            if self.debounce > 0:  # collect the following updates
+                time.sleep(self.debounce)
+            self.process()
+
+    def process(self):
+        """ apply pending PV updates and recalculate optics, called by the
+            update thread, subscribers are notified.
+
+            :return: new result, or None if nothing is changed
+        """
+        with self._cond:
+            pending, t_event = self._pending, self._pending_t
+            self._pending, self._pending_t = {}, None
+        if not pending:
+            return None
+        t0 = time.time()
+        p = dict(self._params)
+        dirty, kenergy = set(), None
+        for pv, value in pending.items():
+            for k, idx, e in self._pvmap.get(pv, ()):
+                try:
+                    val = float(e.unitTrans(value, direction='+'))
+                except (TypeError, ValueError):
+                    continue
+                if p[k] is self._params[k]:
+                    p[k] = p[k].copy()
+                p[k][idx] = val
+                dirty.update(idx.tolist())
+                if k in ('volt', 'phase'):
+                    i0 = int(idx.min())
+                    kenergy = i0 if kenergy is None else min(kenergy, i0)
+        if not dirty:
+            return None
+        gamma_in, gamma_out = self._gamma_in, self._gamma_out
+        if kenergy is not None:  # energy is changed downstream
+            gamma_in, gamma_out = Models._trackEnergy(p, self.gamma0)
+            dirty.update(range(kenergy, len(gamma_in)))
+        sel = np.array(sorted(dirty))
+        transM = self._result['transM'].copy()
+        transM[sel] = Models._transMatrices(p, gamma_in, sel)
+        k = sel[0]
+        cum = mathutils.cumChainBatch(transM[k:])
+        cumM = self._result['cumM']
+        if k > 0:
+            cum = np.matmul(cum, cumM[k - 1])
+        cumM = np.concatenate((cumM[:k], cum))
+        self._params, self._gamma_in, self._gamma_out = p, gamma_in, gamma_out
+        result = self._makeResult(transM, cumM, k, sel, t_event)
+        self._result = result
+        st = self._stats
+        compute = result['time'] - t0
+        st['updates'] += 1
+        st['compute'] += compute
+        st['compute_max'] = max(st['compute_max'], compute)
+        st['latency'] += result['latency']
+        st['latency_max'] = max(st['latency_max'], result['latency'])
+        for callback in list(self._subscribers):
+            callback(result)
+        return result
+
+    def _makeResult(self, transM, cumM, k, dirty, t_event):
+        """ result dict, twiss parameters of elements from k are recalculated
+        """
+        beta = alpha = None
+        if self.twiss0 is not None:
+            beta, alpha = np.zeros((len(cumM), 2)), np.zeros((len(cumM), 2))
+            if k > 0:
+                beta[:k], alpha[:k] = self._result['beta'][:k], self._result['alpha'][:k]
+            for j, (b0, a0) in enumerate((self.twiss0[0:2], self.twiss0[2:4])):
+                m = cumM[k:, 2 * j:2 * j + 2, 2 * j:2 * j + 2]
+                m11, m12, m21, m22 = m[:, 0, 0], m[:, 0, 1], m[:, 1, 0], m[:, 1, 1]
+                g0 = (1.0 + a0 ** 2) / b0
+                det = m11 * m22 - m12 * m21  # adiabatic damping in RF
+                beta[k:, j] = (m11 ** 2 * b0 - 2 * m11 * m12 * a0 + m12 ** 2 * g0) / det
+                alpha[k:, j] = (-m11 * m21 * b0 + (m11 * m22 + m12 * m21) * a0
+                                - m12 * m22 * g0) / det
+        t = time.time()
+        return {'transM': transM, 'cumM': cumM, 'gamma': self._gamma_out,
+                'beta': beta, 'alpha': alpha, 'dirty': dirty, 'time': t,
+                'latency': None if t_event is None else t - t_event}
+
+    def getOrbitResponse(self, bpms, correctors, plane='x'):
+        """ orbit response predicted by the latest optics, kicks are applied
+            at the exit of correctors, readings are at the exit of bpms
+
+            :param bpms: element indices of bpms
+            :param correctors: element indices of correctors
+            :param plane: 'x' or 'y'
+            :return: (len(bpms), len(correctors)) array, [m/rad]
+        """
+        bpms, correctors = np.asarray(bpms, dtype=int), np.asarray(correctors, dtype=int)
+        j = 0 if plane == 'x' else 2
+        cumM = self._result['cumM'][:, j:j + 2, j:j + 2]
+        # M(c -> b) = C_b * inv(C_c)
+        m = np.einsum('iab,jbc->ijac', cumM[bpms], np.linalg.inv(cumM[correctors]))
+        r = m[:, :, 0, 1]
+        r[bpms[:, None] <= correctors[None, :]] = 0.0
+        return r
+
+
 def test():
     # pvs = ('sxfel:lattice:Q01', 'sxfel:lattice:Q02')
     # A = Models(*pvs)
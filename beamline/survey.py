@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+floor coordinates (survey) of beamline elements, calculated for the whole
+element list at once by cumulative sums over element lengths and bending
+angles, without any drawing.
+
+The placement is the same as the one of element drawing (setDraw(), i.e.
+MagBlock.next_p0 and next_inc_angle), so that the survey could be used by
+drawing (drawutils), layout export and geometry checks.
+"""
+
+import numpy as np
+
+# placement kinds, how the reference point is advanced by elements
+# PLACE_NONE: not advanced, e.g. CHARGE
+# PLACE_LINE: drift-like, (l, l * tan(theta))
+# PLACE_ROTATE: along the heading, (l * cos(theta), l * sin(theta)),
+#               the heading is changed by bends
+# PLACE_STRAIGHT: along x, (l, 0)
+PLACE_NONE, PLACE_LINE, PLACE_ROTATE, PLACE_STRAIGHT = range(4)
+
+# element type name: placement kind
+_PLACEMENT = {
+    'DRIFT': PLACE_LINE, 'CSRDRIFT': PLACE_LINE, 'LSCDRIFT': PLACE_LINE,
+    'KICKER': PLACE_LINE, 'MARK': PLACE_LINE, 'WAKE': PLACE_LINE,
+    'WATCH': PLACE_LINE, 'MONI': PLACE_STRAIGHT, 'QUAD': PLACE_ROTATE,
+    'CSRCSBEN': PLACE_ROTATE, 'RFCW': PLACE_STRAIGHT, 'RFDF': PLACE_STRAIGHT,
+}
+
+# element types which change the heading
+_BEND_TYPES = ('CSRCSBEN',)
+
+
+def _getFloat(conf, key, default):
+    try:
+        return float(conf.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def uniqueElements(elements):
+    """ unique element objects of element list, e.g. for flyweight models
+
+    :param elements: element object list
+    :return: (defs, index), list of unique element objects in the order of
+        first occurrence, and int array of indices into defs for elements
+    """
+    uniq, index, defs = {}, [], []
+    for e in elements:
+        i = uniq.get(id(e))
+        if i is None:
+            i = uniq[id(e)] = len(defs)
+            defs.append(e)
+        index.append(i)
+    return defs, np.array(index, dtype=int)
+
+
+class Survey(object):
+    """ floor coordinates of element list, see calcSurvey()
+
+    Attributes, N is the number of elements, coordinates are at the N + 1
+    element boundaries, i.e. element i is from boundary i to i + 1:
+
+    * names, types: element names and type names
+    * defs, index: unique element objects and indices for elements, see
+      uniqueElements()
+    * kind: (N,) array, placement kind, PLACE_*
+    * l: (N,) array, element length
+    * s: (N + 1,) array, path length
+    * x, y: (N + 1,) arrays, reference point coordinates
+    * theta: (N + 1,) array, heading angle, [rad]
+    """
+
+    def __init__(self, defs, index):
+        self.defs, self.index = defs, index
+        index = index.tolist()
+        names = [e.name for e in defs]
+        types = [e.typename for e in defs]
+        self.names = [names[i] for i in index]
+        self.types = [types[i] for i in index]
+        self.kind = self.l = None
+        self.s = self.x = self.y = self.theta = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def p0(self):
+        """ (N, 2) array, start points of elements
+        """
+        return np.stack((self.x[:-1], self.y[:-1]), axis=1)
+
+    @property
+    def p1(self):
+        """ (N, 2) array, end points of elements
+        """
+        return np.stack((self.x[1:], self.y[1:]), axis=1)
+
+    def getEnd(self):
+        """ return (x, y, theta) at the end of element list
+        """
+        return float(self.x[-1]), float(self.y[-1]), float(self.theta[-1])
+
+    def getCoords(self, name=None):
+        """ return (x, y, theta) at the start of elements
+
+        :param name: element name, all elements by default
+        :return: (n, 3) array
+        """
+        coords = np.stack((self.x, self.y, self.theta), axis=1)[:-1]
+        if name is None:
+            return coords
+        return coords[[i for i, n in enumerate(self.names) if n == name]]
+
+    def getLayout(self):
+        """ return layout table, list of (name, type, s, x, y, theta) at the
+        start of elements, [m] and [rad]
+        """
+        return list(zip(self.names, self.types, self.s[:-1].tolist(), self.x[:-1].tolist(),
+                        self.y[:-1].tolist(), self.theta[:-1].tolist()))
+
+    def saveLayout(self, filename):
+        """ save layout table (see getLayout()) to text file, the end of
+        element list is the last line as '_END_'
+
+        :param filename: file name to write
+        """
+        fmt = '{0:<16s} {1:<10s} {2:16.9e} {3:16.9e} {4:16.9e} {5:16.9e}\n'
+        end = ('_END_', '-', self.s[-1]) + self.getEnd()
+        with open(filename, 'w') as f:
+            f.write('# {0:<14s} {1:<10s} {2:>16s} {3:>16s} {4:>16s} {5:>16s}\n'.format(
+                'name', 'type', 's [m]', 'x [m]', 'y [m]', 'theta [rad]'))
+            for row in self.getLayout() + [end]:
+                f.write(fmt.format(*row))
+
+
+def calcSurvey(elements, startpoint=(0, 0), angle=0.0, bend=True):
+    """ calculate floor coordinates of elements in batch
+
+    :param elements: element object list
+    :param startpoint: start point coords, (0, 0) by default
+    :param angle: start heading angle, [rad], 0 by default
+    :param bend: if the heading is changed by bends, True by default,
+        False for 'plain' drawing mode
+    :return: Survey instance
+    """
+    defs, index = uniqueElements(elements)
+    sv = Survey(defs, index)
+    m = len(defs)
+    kind, l, inc = np.zeros(m, dtype=int), np.zeros(m), np.zeros(m)
+    for i, e in enumerate(defs):
+        k = kind[i] = _PLACEMENT.get(e.typename, PLACE_NONE)
+        if k == PLACE_NONE:
+            continue
+        l[i] = _getFloat(e.simuinfo, 'l', 0.0)
+        if bend and e.typename in _BEND_TYPES:
+            inc[i] = _getFloat(e.simuinfo, 'angle', 0.0)
+    if not bend:  # 'plain' drawing mode: nothing rotated, monitors drawn as lines
+        kind[kind == PLACE_ROTATE] = PLACE_STRAIGHT
+        kind[np.array([e.typename == 'MONI' for e in defs], dtype=bool)] = PLACE_LINE
+    kind, l, inc = kind[index], l[index], inc[index]
+    n = len(index)
+
+    theta = np.cumsum(np.concatenate(([angle], inc)))
+    t0 = theta[:-1]
+    dx, dy = np.where(kind == PLACE_NONE, 0.0, l), np.zeros(n)
+    sel = kind == PLACE_LINE
+    dy[sel] = l[sel] * np.tan(t0[sel])
+    sel = kind == PLACE_ROTATE
+    dx[sel] = l[sel] * np.cos(t0[sel])
+    dy[sel] = l[sel] * np.sin(t0[sel])
+
+    x0, y0 = startpoint
+    x = np.cumsum(np.concatenate(([x0], dx)))
+    y = np.cumsum(np.concatenate(([y0], dy)))
+    s = np.cumsum(np.concatenate(([0.0], l)))
+    sv.kind, sv.l, sv.s = kind, l, s
+    sv.x, sv.y, sv.theta = x, y, theta
+    return sv
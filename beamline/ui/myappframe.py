@@ -13,7 +13,6 @@ from . import mychoiceframe
 from . import mydrawframe
 
 from .. import lattice
-from .. import models
 
 MAXNROW = 65536  # max row number
 
@@ -770,31 +769,21 @@ class MyAppFrame(appui.MainFrame):
             :param simu: online modeling type, 'simu': simulation,
                          'online': online (incorporate control fields)
         """
-        new_model = models.Models(name=use_bl, mode=mode)
-        ele_name_list = lattice_instance.getElementList(use_bl)
-        ele_eobj_list = []
-        for ele in ele_name_list:
-            ele_eobj_list.append(lattice_instance.makeElement(ele))
-        new_model.addElement(*ele_eobj_list)
-
-        return new_model
+        return lattice_instance.makeModel(use_bl, mode=mode, flyweight=True)
 
     def create_online_model(self):
         try:
             use_bl = self.use_beamline
-            # re-produce json string file if other beamlines's definition (except use_bl) exist
-            # latins -> lte -> json
+            # extract use_bl if other beamlines's definition (except use_bl) exist
             if len(self.lattice_instance.getAllBl()) != 1:
-                new_data_lte = self.lattice_instance.generateLatticeFile(use_bl, 'sio')
-                new_lpins = lattice.LteParser(new_data_lte, mode='s')
-                new_latins = lattice.Lattice(new_lpins.file2json())
+                new_latins = self.lattice_instance.extractBeamline(use_bl)
             else:
                 new_latins = self.lattice_instance
 
             # create online model, 'simu', 'online'
             lattice_model = self._create_online_model(new_latins, use_bl, mode='simu')
             self.lattice_model = lattice_model
-        except AttributeError as e:
+        except (AttributeError, KeyError) as e:
             print("Failed modeling..." + str(e))
 
 
@@ -8,6 +8,14 @@ from .. import models
 
 # Implementing DrawFrame
 class MyDrawFrame(appui.DrawFrame):
+    # check box: (element types, annotation style), see Models.anoteElements()
+    _anote_styles = {
+        'quad': ('QUAD', dict(textypos=0.6, color='m', rotation=60, fontsize='x-small')),
+        'bend': ('CSRCSBEN', dict(textypos=-0.6, color='b', rotation=60, fontsize='x-small')),
+        'rf': (('RFCW', 'RFDF'), dict(textypos=None, arrowprops=None, color='k', rotation=0,
+                                      fontsize='small', fontweight='bold')),
+    }
+
     def __init__(self, parent, lattice_model, aspect=1):
         """ lattice visualization panel 
             :param lattice_model: beamline.Models instance
@@ -17,6 +25,11 @@ class MyDrawFrame(appui.DrawFrame):
         self.lattice_model = lattice_model
         self._aspect = aspect
         self._artist_flag = self.mode_rb.GetStringSelection()
+        self._geom = None  # drawing geometry, None if not drawn in batch
+        self._view = None  # (view limits, pixel size) of drawn artists
+        self._view_margin = 0.25  # artists are drawn out of view by this ratio
+        self._view_pending = False
+        self._anote_layers = {}  # check box: annotation artist, see _show_anotes()
         self._init()
 
     def _init(self):
@@ -24,11 +37,6 @@ class MyDrawFrame(appui.DrawFrame):
         self.ax = self.drawing_panel.axes
         self.canvas = self.drawing_panel.canvas
         self._draw()
-        self.drawing_panel.anote_list = self._anotes
-        self.drawing_panel.x_pos_list = [i['xypos'][0] for i in self._anotes]
-        self.anote_list_quad = None
-        self.anote_list_bend = None
-        self.anote_list_rf = None
 
         #print self.lattice_model.getElementsByName('prf06l3')
         
@@ -37,62 +45,98 @@ class MyDrawFrame(appui.DrawFrame):
         self._draw()
     
     def quad_ckbOnCheckBox(self, event):
-        if self.quad_ckb.IsChecked():
-            if self.anote_list_quad is None:
-                self.anote_list_quad = models.Models.anoteElements(self.ax, 
-                        self._anotes, efilter='QUAD', 
-                        textypos=0.6, color='m', rotation=60,
-                        fontsize='x-small')
-            else:
-                [anote_obj.set_visible(True) for anote_obj in self.anote_list_quad]
-            self.canvas.draw()
-        else:
-            if self.anote_list_quad is not None:
-                [anote_obj.set_visible(False) for anote_obj in self.anote_list_quad]
-                self.canvas.draw()
-            
+        self._show_anotes('quad', self.quad_ckb.IsChecked())
+
     def bend_ckbOnCheckBox(self, event):
-        if self.bend_ckb.IsChecked():
-            if self.anote_list_bend is None:
-                self.anote_list_bend = models.Models.anoteElements(self.ax, 
-                        self._anotes, efilter='CSRCSBEN',
-                        textypos=-0.6, color='b', rotation=60, 
-                        fontsize='x-small')
-            else:
-                [anote_obj.set_visible(True) for anote_obj in self.anote_list_bend]
-            self.canvas.draw()
-        else:
-            if self.anote_list_bend is not None:
-                [anote_obj.set_visible(False) for anote_obj in self.anote_list_bend]
-                self.canvas.draw()
+        self._show_anotes('bend', self.bend_ckb.IsChecked())
 
     def rf_ckbOnCheckBox(self, event):
-        if self.rf_ckb.IsChecked():
-            if self.anote_list_rf is None:
-                self.anote_list_rf = models.Models.anoteElements(self.ax, 
-                        self._anotes, efilter=('RFCW','RFDF'),
-                        textypos=None, arrowprops=None, color='k', rotation=0, 
-                        fontsize='small', fontweight='bold')
-            else:
-                [anote_obj.set_visible(True) for anote_obj in self.anote_list_rf]
-            self.canvas.draw()
-        else:
-            if self.anote_list_rf is not None:
-                [anote_obj.set_visible(False) for anote_obj in self.anote_list_rf]
-                self.canvas.draw()
-    
+        self._show_anotes('rf', self.rf_ckb.IsChecked())
+
+    def _show_anotes(self, key, show, blit=True):
+        """ show/hide annotations of one check box, the annotations are
+            drawn by one artist each (see Models.anoteElements(batch=True)),
+            and updated by blitting, the elements are not drawn again.
+
+            :param key: 'quad', 'bend' or 'rf', see _anote_styles
+            :param show: show or hide
+            :param blit: update canvas by blitting
+        """
+        layer = self._anote_layers.get(key)
+        if layer is None:
+            if not show:
+                return
+            efilter, style = self._anote_styles[key]
+            layer, = models.Models.anoteElements(self.ax, self._anotes, efilter=efilter,
+                                                 batch=True, **style)
+            self.drawing_panel.add_animated(layer)
+            self._anote_layers[key] = layer
+        layer.set_visible(show)
+        if blit:
+            self.drawing_panel.blit()
+
     def _draw_model(self, mode):
-        _ptches, _anotes, _xr, _yr = self.lattice_model.draw(mode=mode,
-                showfig=False)
+        _ptches, _anotes, _xr, _yr = self.lattice_model.drawCollections(mode=mode)
         return _ptches, _anotes, _xr, _yr
 
     def _draw(self):
         self.ax.clear()
-        self._ptches, self._anotes, self._xr, self._yr = self._draw_model(self._artist_flag)
-        models.Models.plotElements(self.ax, self._ptches)
+        self.drawing_panel.clear_animated()
+        self._anote_layers = {}
+        self._geom = self.lattice_model.getDrawGeometry(mode=self._artist_flag)
+        if self._geom is None:
+            self._ptches, self._anotes, self._xr, self._yr = self._draw_model(self._artist_flag)
+            models.Models.plotElements(self.ax, self._ptches)
+        else:
+            # artists are made for the view, see _refresh_view()
+            xmin, xmax, ymin, ymax = self._geom.bounds
+            self._ptches, self._anotes = [], self._geom.getAnotes()
+            self._xr, self._yr = (xmin, xmax), (ymin, ymax)
         self.ax.set_xlim(self._xr[0], self._xr[1])
         self.ax.set_ylim(self._yr[0], self._yr[1])
         self.ax.set_yticks([])
         self.ax.set_xlabel('$s\,\mathrm{[m]}$', fontsize=20)
         self.ax.set_aspect(self._aspect, 'datalim')
+        if self._geom is not None:
+            self._view = None
+            self.ax.callbacks.connect('xlim_changed', self._on_lim_changed)
+            self.ax.callbacks.connect('ylim_changed', self._on_lim_changed)
+            self._refresh_view(draw=False)
+        # hit-testing by the spatial index of geometry, or by annotation x positions
+        self.drawing_panel.geometry = self._geom
+        self.drawing_panel.anote_list = self._anotes
+        self.drawing_panel.x_pos_list = [i['xypos'][0] for i in self._anotes]
+        for key, ckb in (('quad', self.quad_ckb), ('bend', self.bend_ckb), ('rf', self.rf_ckb)):
+            if ckb.IsChecked():
+                self._show_anotes(key, True, blit=False)
         self.canvas.draw()
+
+    def _on_lim_changed(self, ax):
+        # zoom/pan changes both x and y limits, refresh once
+        if not self._view_pending:
+            self._view_pending = True
+            wx.CallAfter(self._refresh_view)
+
+    def _refresh_view(self, draw=True):
+        """ make artists of the elements in view, elements smaller than one
+            pixel are merged into simplified strokes (level of detail)
+        """
+        self._view_pending = False
+        if self._geom is None:
+            return
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        pixel = ((x1 - x0) / max(self.ax.bbox.width, 1.0),
+                 (y1 - y0) / max(self.ax.bbox.height, 1.0))
+        view = (x0, x1, y0, y1) + pixel
+        if view == self._view:
+            return
+        self._view = view
+        dx, dy = (x1 - x0) * self._view_margin, (y1 - y0) * self._view_margin
+        for artist in self._ptches:
+            artist.remove()
+        self._ptches = self._geom.makeArtists(view=(x0 - dx, x1 + dx, y0 - dy, y1 + dy),
+                                              pixel=pixel)
+        models.Models.plotElements(self.ax, self._ptches)
+        if draw:
+            self.canvas.draw_idle()
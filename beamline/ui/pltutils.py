@@ -13,6 +13,7 @@ import wx
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg as Toolbar
 from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
 import numpy as np
 from bisect import bisect
 
@@ -132,7 +133,16 @@ class MyToolbar(Toolbar):
 class LatticePlotPanel(MyPlotPanel):
     def __init__(self, parent, **kwargs):
         MyPlotPanel.__init__(self, parent, **kwargs)
-
+        self.anote_list = None
+        self.x_pos_list = None
+        self.geometry = None  # drawutils.DrawGeometry, for hit-testing
+        self.hover_tol = 3  # hit-testing tolerance, [pixel]
+        self._animated = []  # artists drawn by blitting, see add_animated()
+        self._background = None  # canvas without animated artists
+        self._hover = None  # index of hovered element
+        self._hover_patch = None
+
+        self.canvas.mpl_connect('draw_event', self.on_draw)
         # self.canvas.mpl_connect('pick_event', self.on_pick)
 
     # def on_pick(self, event):
@@ -141,9 +151,51 @@ class LatticePlotPanel(MyPlotPanel):
     #    if hasattr(self, 'anote_list'):
     #        for i in self.anote_list:
 
+    def add_animated(self, artist):
+        """ add artist (already in axes) to be drawn by blitting, i.e.
+        not drawn by canvas.draw(), updated by blit()
+        """
+        artist.set_animated(True)
+        self._animated.append(artist)
+
+    def clear_animated(self):
+        """ forget animated artists and hovered element, e.g. after axes
+        is cleared
+        """
+        self._animated = []
+        self._background = None
+        self._hover = None
+        self._hover_patch = None
+
+    def on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._animated:
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+    def blit(self):
+        """ update animated artists on the saved background
+        """
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.axes.bbox)
+
     def on_motion(self, event):
         if event.inaxes is not None:
-            name, type = self.identify_obj(event.xdata)
+            # one hit test for both the label and the hover box
+            idx = self.find_obj(event.xdata, event.ydata)
+            if self.geometry is None:
+                name, type = self.identify_obj(event.xdata)
+            elif idx is None:
+                name, type = None, None
+            else:
+                name, type = self.geometry.names[idx], self.geometry.types[idx]
             if name is not None:
                 self.pos_st.SetLabel("({x:<.4f}, {y:<.4f}) --- [{name} : {type}]".format(
                     x=event.xdata, y=event.ydata,
@@ -151,8 +203,27 @@ class LatticePlotPanel(MyPlotPanel):
             else:
                 self.pos_st.SetLabel("({x:<.4f}, {y:<.4f})".format(
                     x=event.xdata, y=event.ydata))
+            self.set_hover(idx)
 
-    def identify_obj(self, x):
+    def find_obj(self, x, y):
+        """ return index of element drawn at (x, y) (data coordinates), by
+        the spatial index of drawing geometry, None if not found
+        """
+        if self.geometry is None:
+            return None
+        x0, x1 = self.axes.get_xlim()
+        y0, y1 = self.axes.get_ylim()
+        bbox = self.axes.bbox
+        tol = (self.hover_tol * abs(x1 - x0) / max(bbox.width, 1.0),
+               self.hover_tol * abs(y1 - y0) / max(bbox.height, 1.0))
+        return self.geometry.hitTest(x, y, tol)
+
+    def identify_obj(self, x, y=None):
+        if self.geometry is not None and y is not None:
+            idx = self.find_obj(x, y)
+            if idx is None:
+                return None, None
+            return self.geometry.names[idx], self.geometry.types[idx]
         if self.x_pos_list is None:
             return None, None
         else:
@@ -164,6 +235,27 @@ class LatticePlotPanel(MyPlotPanel):
                 name, type = None, None
             return name, type
 
+    def set_hover(self, idx):
+        """ highlight element of index idx with a box, None to clear,
+        updated by blitting
+        """
+        if idx == self._hover:
+            return
+        self._hover = idx
+        if self._hover_patch is None:
+            if idx is None:
+                return
+            self._hover_patch = Rectangle((0, 0), 0, 0, fill=False, ec='r', lw=1.5)
+            self.axes.add_patch(self._hover_patch)
+            self.add_animated(self._hover_patch)
+        if idx is None:
+            self._hover_patch.set_visible(False)
+        else:
+            xmin, xmax, ymin, ymax = self.geometry.getExtents()[idx]
+            self._hover_patch.set_bounds(xmin, ymin, xmax - xmin, ymax - ymin)
+            self._hover_patch.set_visible(True)
+        self.blit()
+
 
 class TestFrame(wx.Frame):
     def __init__(self, parent, **kwargs):
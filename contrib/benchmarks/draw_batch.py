@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+render time of a beamline with about 10k elements, Models.draw() with one
+patch per element v.s. Models.drawCollections(), offscreen (Agg); and of
+the views of the lattice draw frame, all the elements v.s. the elements in
+view with level of detail (DrawGeometry.makeArtists(view, pixel)).
+
+usage: python draw_batch.py [number of cells] [mode]
+"""
+
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import beamline
+
+
+def makeModel(ncell):
+    d = beamline.ElementDrift('d', config='l=0.2')
+    qf = beamline.ElementQuad('qf', config='l=0.1, k1=2.0')
+    qd = beamline.ElementQuad('qd', config='l=0.1, k1=-2.0')
+    b = beamline.ElementCsrcsben('b', config='l=0.5, angle=0.01')
+    rf = beamline.ElementRfcw('rf', config='l=1.0, volt=1e6, phase=90, freq=2856e6')
+    bpm = beamline.ElementMoni('bpm', config='l=0.05')
+    model = beamline.Models(name='bl', flyweight=True)
+    model.addElement([qf, d, b, d, bpm, d, qd, d, rf, d] * ncell)
+    return model
+
+
+def render(fun, model, mode):
+    fig = plt.figure(figsize=(16, 4))
+    ax = fig.add_subplot(111)
+    t0 = time.time()
+    artists, anotes, xr, yr = fun(mode=mode)
+    t1 = time.time()
+    beamline.Models.plotElements(ax, artists)
+    ax.set_xlim(xr)
+    ax.set_ylim(yr)
+    fig.canvas.draw()
+    t2 = time.time()
+    plt.close(fig)
+    return t1 - t0, t2 - t1
+
+
+def renderView(geom, view, lod=True):
+    fig = plt.figure(figsize=(16, 4))
+    ax = fig.add_subplot(111)
+    ax.set_xlim(view[0:2])
+    ax.set_ylim(view[2:4])
+    t0 = time.time()
+    if lod:
+        pixel = ((view[1] - view[0]) / ax.bbox.width, (view[3] - view[2]) / ax.bbox.height)
+        artists = geom.makeArtists(view=view, pixel=pixel)
+    else:
+        artists = geom.makeArtists()
+    beamline.Models.plotElements(ax, artists)
+    fig.canvas.draw()
+    t1 = time.time()
+    plt.close(fig)
+    return t1 - t0
+
+
+def main(ncell=1000, mode='fancy'):
+    model = makeModel(ncell)
+    print("{0} elements, '{1}' mode".format(model.getElementCount()[0], mode))
+    for name, fun in (('draw', model.draw), ('drawCollections', model.drawCollections)):
+        tgeom, trender = render(fun, model, mode)
+        print("{0:<16s}: geometry {1:.3f} s, render {2:.3f} s, total {3:.3f} s".format(
+            name, tgeom, trender, tgeom + trender))
+    geom = model.getDrawGeometry(mode=mode)
+    xmin, xmax, ymin, ymax = geom.bounds
+    x0, y0 = geom.p0[len(geom) // 2]
+    for name, view in (('full', geom.bounds),
+                       ('zoom x10', (x0 - 0.05 * (xmax - xmin), x0 + 0.05 * (xmax - xmin),
+                                     y0 - 0.05 * (ymax - ymin), y0 + 0.05 * (ymax - ymin))),
+                       ('zoom x100', (x0 - 0.005 * (xmax - xmin), x0 + 0.005 * (xmax - xmin),
+                                      y0 - 0.005 * (ymax - ymin), y0 + 0.005 * (ymax - ymin)))):
+        print("view {0:<10s}: all elements {1:.3f} s, culled with lod {2:.3f} s".format(
+            name, renderView(geom, view, lod=False), renderView(geom, view)))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 1000, args[1] if len(args) > 1 else 'fancy')
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+memory footprint of element objects, on a synthetic lattice of
+quads, drifts, bends, monitors and markers.
+
+usage: python element_memory.py [number of elements]
+"""
+
+import sys
+import tracemalloc
+
+import beamline
+
+
+def makeElements(n):
+    cls_conf = [
+        (beamline.ElementDrift, 'l=0.5'),
+        (beamline.ElementQuad, 'l=0.1, k1=2.0'),
+        (beamline.ElementDrift, 'l=0.2'),
+        (beamline.ElementCsrcsben, 'l=0.2, angle=0.01, e1=0.0, e2=0.01'),
+        (beamline.ElementMoni, ''),
+        (beamline.ElementMark, ''),
+    ]
+    elements = []
+    for i in range(n):
+        cls, conf = cls_conf[i % len(cls_conf)]
+        elements.append(cls(name='e{0}'.format(i), config=conf))
+    return elements
+
+
+def main(n=20000):
+    tracemalloc.start()
+    m0 = tracemalloc.get_traced_memory()[0]
+    elements = makeElements(n)
+    m1 = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("{0} elements: {1:.2f} MB in total, {2:.0f} bytes per element".format(
+        len(elements), (m1 - m0) / 1.0e6, float(m1 - m0) / n))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
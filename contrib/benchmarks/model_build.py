@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+time to build model by appending elements one by one.
+
+usage: python model_build.py [number of elements]
+"""
+
+import sys
+import time
+
+import beamline
+
+
+def build(n, **kws):
+    d = beamline.ElementDrift('d01', config='l=0.5')
+    q = beamline.ElementQuad('q01', config='l=0.1, k1=2.0')
+    model = beamline.Models(name='bl')
+    t0 = time.time()
+    for i in range(n):
+        model.addElement(d if i % 2 else q, **kws)
+    return time.time() - t0
+
+
+def main(n=5000):
+    print("{0} elements, deep copy : {1:.3f} s".format(n, build(n)))
+    try:
+        print("{0} elements, shared    : {1:.3f} s".format(n, build(n, copy=False)))
+    except TypeError:
+        pass
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+model construction time and memory, regular v.s. flyweight mode,
+for a beamline of repeated FODO cells.
+
+usage: python model_flyweight.py [number of cells]
+"""
+
+import sys
+import time
+import tracemalloc
+
+import beamline
+
+
+def makeCell():
+    d = beamline.ElementDrift('d01', config='l=0.5')
+    qf = beamline.ElementQuad('qf', config='l=0.1, k1=2.0')
+    qd = beamline.ElementQuad('qd', config='l=0.1, k1=-2.0')
+    bpm = beamline.ElementMoni('bpm')
+    return [qf, d, bpm, d, qd, d, bpm, d]
+
+
+def build(ncell, flyweight):
+    cell = makeCell()
+    tracemalloc.start()
+    m0 = tracemalloc.get_traced_memory()[0]
+    t0 = time.time()
+    model = beamline.Models(name='bl', flyweight=flyweight)
+    model.addElement(cell * ncell)
+    t1 = time.time()
+    m1 = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("flyweight={0!s:<5} {1} elements ({2} unique): {3:.3f} s, {4:.2f} MB".format(
+        flyweight, *model.getElementCount() + (t1 - t0, (m1 - m0) / 1.0e6)))
+    return model
+
+
+def main(ncell=2500):
+    build(ncell, False)
+    build(ncell, True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+time to online model for the SXFEL lattice: lte text round trip
+(generateLatticeFile + LteParser) v.s. Lattice.extractBeamline + makeModel.
+
+usage: python model_from_lattice.py [lte file] [beamline] [repeat]
+"""
+
+import os
+import sys
+import time
+
+import beamline
+
+
+def roundTrip(lat, bl):
+    lte = lat.generateLatticeFile(bl, 'sio')
+    new_lat = beamline.Lattice(beamline.LteParser(lte, mode='s').file2json())
+    names = new_lat.getElementList(bl)
+    eobj_dict = {}
+    for ele in names:
+        if ele not in eobj_dict:
+            eobj_dict[ele] = new_lat.makeElement(ele)
+    model = beamline.Models(name=bl, flyweight=True)
+    model.addElement(*[eobj_dict[ele] for ele in names])
+    return model
+
+
+def direct(lat, bl):
+    return lat.extractBeamline(bl).makeModel(bl, flyweight=True)
+
+
+def timeit(fun, lat, bl, repeat):
+    t0 = time.time()
+    for i in range(repeat):
+        model = fun(lat, bl)
+    return model, (time.time() - t0) / repeat
+
+
+def main(ltefile, bl='BL', repeat=5):
+    lat = beamline.Lattice(beamline.LteParser(ltefile).file2json())
+    m1, t1 = timeit(roundTrip, lat, bl, repeat)
+    m2, t2 = timeit(direct, lat, bl, repeat)
+    print("{0}, beamline {1}: {2} elements ({3} unique)".format(
+        os.path.basename(ltefile), bl, *m2.getElementCount()))
+    print("lte round trip: {0:.4f} s".format(t1))
+    print("direct        : {0:.4f} s".format(t2))
+    same = [e1.name.upper() for e1 in m1._lattice_eleobjlist] == \
+           [e2.name.upper() for e2 in m2._lattice_eleobjlist] and \
+           abs(m1.getPositions() - m2.getPositions()).max() < 1e-9
+    print("same model    : {0}".format(same))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args:
+        args = [os.path.join(os.path.dirname(__file__), '../sxfel/sxfel_v14b.lte')]
+    if len(args) > 2:
+        args[2] = int(args[2])
+    main(*args)
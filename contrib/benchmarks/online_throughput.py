@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+online-mode refresh throughput of Models.getCtrlConf(), offline, with
+the simulated control backend:
+    serial   : one round trip per PV, i.e. one caget per PV
+    batched  : PVs read in one batch every refresh, no caching
+    monitored: PV values are fed by monitors, cache hits after first read
+
+usage: python online_throughput.py [number of quads] [latency in ms]
+"""
+
+import sys
+import time
+
+import beamline
+from beamline import ctrlutils
+
+
+def makeModel(nquad):
+    pvs = {}
+    model = beamline.Models(name='bl', mode='online')
+    d = beamline.ElementDrift('d', config='l=0.5')
+    for i in range(nquad):
+        q = beamline.ElementQuad('q{0:03d}'.format(i), config='l=0.1, k1=1.0')
+        pv = 'Q{0:03d}:K1'.format(i)
+        q.setConf({'k1': {'pv': pv}}, type='ctrl')
+        pvs[pv] = 0.5
+        model.addElement(q, d)
+    return model, pvs
+
+
+class SerialBackend(ctrlutils.SimulatedBackend):
+    """ one round trip per PV """
+
+    def getMany(self, pvnames, timeout=1.0):
+        return [ctrlutils.SimulatedBackend.getMany(self, [pv])[0] for pv in pvnames]
+
+
+def run(name, model, backend, cache, duration=1.0):
+    ctrlutils.setBackend(backend)
+    ctrlutils.setPVCache(cache)
+    model.getCtrlConf(msgout=False)
+    cnt, t0 = 0, time.time()
+    while time.time() - t0 < duration:
+        model.getCtrlConf(msgout=False)
+        cnt += 1
+    dt = (time.time() - t0) / cnt
+    print("{0:<10s}: {1:8.2f} ms/refresh, {2:8.1f} refresh/s".format(name, dt * 1e3, 1.0 / dt))
+
+
+def main(nquad=150, latency=2.0):
+    model, pvs = makeModel(nquad)
+    latency *= 1e-3
+    print("{0} quads, round trip latency: {1:.1f} ms".format(nquad, latency * 1e3))
+    run('serial', model, SerialBackend(pvs, latency), ctrlutils.PVCache(ttl=0, monitor=False))
+    run('batched', model, ctrlutils.SimulatedBackend(pvs, latency), ctrlutils.PVCache(ttl=0, monitor=False))
+    backend = ctrlutils.SimulatedBackend(pvs, latency)
+    cache = ctrlutils.PVCache()
+    run('monitored', model, backend, cache)
+    print("monitored : hit rate {0:.3f}".format(cache.getStats()['hit_rate']))
+
+
+if __name__ == '__main__':
+    args = [int(sys.argv[1])] if len(sys.argv) > 1 else []
+    if len(sys.argv) > 2:
+        args.append(float(sys.argv[2]))
+    main(*args)
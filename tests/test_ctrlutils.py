@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import unittest
+
+import beamline
+from beamline import ctrlutils
+
+
+class ReadPVsTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'Q{0:02d}:K1'.format(i): i for i in range(100)},
+                                                  latency=0.02)
+        old = ctrlutils.setBackend(self.backend)
+        self.addCleanup(ctrlutils.setBackend, old)
+
+    def test_read(self):
+        pvs = ['Q01:K1', 'Q02:K1', 'Q01:K1', 'NONE']
+        vals = ctrlutils.readPVs(pvs)
+        self.assertEqual(vals, {'Q01:K1': 1, 'Q02:K1': 2, 'NONE': None})
+        self.assertEqual(self.backend.requests, 1)
+        self.assertEqual(ctrlutils.readPVs([]), {})
+
+    def test_model(self):
+        ctrlutils.setPVCache(ctrlutils.PVCache(monitor=False))
+        m = beamline.Models(name='bl', mode='online')
+        for i in range(100):
+            q = beamline.ElementQuad('q{0:02d}'.format(i), config='l=0.1, k1=1.0')
+            q.setConf({'k1': {'pv': 'Q{0:02d}:K1'.format(i)}}, type='ctrl')
+            m.addElement(q, beamline.ElementDrift('d', config='l=0.5'))
+        t0 = time.time()
+        elist = m.getCtrlConf(msgout=False)
+        elapsed = time.time() - t0
+        k1 = elist[6].getK1(type='ctrl')  # from cache
+        self.assertEqual(self.backend.requests, 1)
+        self.assertLess(elapsed, 10 * self.backend.latency)
+        # PV -> physical value, by unitTrans
+        self.assertEqual([e.getConfig(type='simu')['k1'] for e in elist[0:6:2]], [0, 2, 4])
+        self.assertEqual(k1, 6)
+        # model is not touched, elements without update are shared
+        self.assertEqual(m._lattice_eleobjlist[2].getConfig(type='simu')['k1'], '1.0')
+        self.assertIs(elist[1], m._lattice_eleobjlist[1])
+        # write, physical -> PV value
+        self.assertTrue(m.putCtrlConf(elist[2], 'k1', 10.0, type='real'))
+        self.assertEqual(self.backend.pvs['Q01:K1'], 5.0)
+
+
+class PVCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'Q01:K1': 1.0, 'Q02:K1': 2.0}, latency=0.001)
+        self.cache = ctrlutils.PVCache(ttl=0.05, backend=self.backend)
+
+    def test_monitor(self):
+        self.assertEqual(self.cache.getMany(['Q01:K1', 'Q02:K1']), {'Q01:K1': 1.0, 'Q02:K1': 2.0})
+        self.assertEqual(sorted(self.backend._monitors), ['Q01:K1', 'Q02:K1'])
+        self.cache.resetStats()
+        self.backend.setValue('Q01:K1', 1.5)
+        time.sleep(0.06)  # monitored PVs do not expire
+        self.assertEqual(self.cache.get('Q01:K1'), 1.5)
+        self.assertEqual(self.cache.get('Q02:K1'), 2.0)
+        self.assertEqual(self.backend.requests, 1)
+        st = self.cache.getStats()
+        self.assertEqual((st['hits'], st['misses'], st['polls'], st['updates']), (2, 0, 0, 1))
+        self.assertAlmostEqual(st['hit_rate'], 1.0)
+        self.assertGreaterEqual(st['latency_max'], 0.0)
+        # disconnected, fall back to polling
+        self.cache.update('Q01:K1', None)
+        self.assertEqual(self.cache.get('Q01:K1'), 1.5)
+        self.assertEqual(self.backend.requests, 2)
+        self.cache.unsubscribe()
+        self.assertEqual(self.backend._monitors, {'Q01:K1': [], 'Q02:K1': []})
+
+    def test_ttl(self):
+        self.cache.monitor = False
+        self.cache.get('Q01:K1')
+        self.backend.pvs['Q01:K1'] = 3.0
+        self.assertEqual(self.cache.get('Q01:K1'), 1.0)
+        time.sleep(0.06)
+        self.assertEqual(self.cache.get('Q01:K1'), 3.0)
+        self.assertEqual(self.backend.requests, 2)
+        # staleness limit of monitored PV
+        self.cache.subscribe(['Q02:K1'], maxage=0.0)
+        self.cache.get('Q02:K1')
+        self.cache.get('Q02:K1')
+        self.assertEqual(self.backend.requests, 4)
+        self.assertIsNone(self.cache.get('NONE'))
+
+
+class BackendTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'A': 1, 'B': 2}, latency=0.02)
+
+    def test_put(self):
+        self.assertEqual(self.backend.putMany(['A', 'B', 'C'], [3, 4, 5]), [True, True, False])
+        self.assertEqual(self.backend.getMany(['A', 'B', 'C']), [3, 4, None])
+        self.assertEqual(self.backend.putManyAsync(['A'], [6]).result(), [True])
+        self.assertEqual(self.backend.get('A'), 6)
+
+    def test_async(self):
+        t0 = time.time()
+        futures = [self.backend.getManyAsync(['A', 'B']) for i in range(5)]
+        self.assertEqual([f.result() for f in futures], [[1, 2]] * 5)
+        self.assertLess(time.time() - t0, 4 * self.backend.latency)
+
+    def test_asyncio(self):
+        abackend = ctrlutils.AsyncioBackend(self.backend)
+        updates = []
+
+        async def run():
+            cancel = abackend.monitor('A', lambda *args: updates.append(args[:2]))
+            vals = await asyncio.gather(*[abackend.agetMany(['A', 'B']) for i in range(5)])
+            ok = await abackend.aput('A', 10)
+            await asyncio.sleep(0.01)
+            cancel()
+            return vals, ok
+
+        vals, ok = asyncio.run(run())
+        self.assertEqual(vals, [[1, 2]] * 5)
+        self.assertTrue(ok)
+        self.assertEqual(updates, [('A', 1), ('A', 10)])
+
+
+class LimitedBackend(ctrlutils.SimulatedBackend):
+    """ power supplies clamp setpoints to [-2, 2], reject beyond [-4, 4]
+    """
+
+    def putMany(self, pvnames, values, wait=False, timeout=60.0):
+        self._roundTrip()
+        ret = []
+        for pv, val in zip(pvnames, values):
+            ok = abs(val) <= 4
+            if ok:
+                self.setValue(pv, max(min(val, 2), -2))
+            ret.append(ok)
+        return ret
+
+
+class PutPVsTest(unittest.TestCase):
+    def setUp(self):
+        self.pvs = ['Q{0:02d}:K1'.format(i) for i in range(10)]
+        self.backend = LimitedBackend(dict.fromkeys(self.pvs, 0.5), latency=0.01)
+
+    def test_done(self):
+        r = ctrlutils.putPVs(self.pvs, [1.0] * 10, readback=True, backend=self.backend)
+        self.assertEqual(r.status, 'done')
+        self.assertEqual(self.backend.requests, 3)  # capture, put, readback
+        self.assertEqual(self.backend.getMany(self.pvs), [1.0] * 10)
+        self.assertEqual(r.prior, dict.fromkeys(self.pvs, 0.5))
+        self.assertEqual(sorted(r.timing), ['capture', 'put', 'readback'])
+        self.assertGreaterEqual(r.elapsed, 3 * self.backend.latency)
+
+    def test_rollback(self):
+        # rejected
+        r = ctrlutils.putPVs(self.pvs, [1.0] * 9 + [5.0], backend=self.backend)
+        self.assertEqual((r.status, r.failed), ('rolledback', ['Q09:K1']))
+        self.assertEqual(self.backend.getMany(self.pvs), [0.5] * 10)
+        # readback out of tolerance
+        r = ctrlutils.putPVs(self.pvs, [3.0] + [1.0] * 9, readback=True, timeout=0.1,
+                             backend=self.backend)
+        self.assertEqual((r.status, r.failed), ('rolledback', ['Q00:K1']))
+        self.assertEqual(self.backend.getMany(self.pvs), [0.5] * 10)
+        # no rollback
+        r = ctrlutils.putPVs(self.pvs, [3.0] + [1.0] * 9, readback=True, timeout=0.0,
+                             rollback=False, backend=self.backend)
+        self.assertEqual(r.status, 'failed')
+        self.assertEqual(self.backend.getMany(self.pvs), [2.0] + [1.0] * 9)
+        # not connected, nothing written
+        r = ctrlutils.putPVs(self.pvs + ['NONE'], [0.0] * 11, backend=self.backend)
+        self.assertEqual((r.status, r.failed), ('aborted', ['NONE']))
+        self.assertEqual(self.backend.getMany(self.pvs), [2.0] + [1.0] * 9)
+
+    def test_model(self):
+        old = ctrlutils.setBackend(self.backend)
+        self.addCleanup(ctrlutils.setBackend, old)
+        m = beamline.Models(name='bl', mode='online')
+        for pv in self.pvs:
+            q = beamline.ElementQuad(pv.split(':')[0].lower(), config='l=0.1, k1=1.0')
+            q.setConf({'k1': {'pv': pv}}, type='ctrl')
+            m.addElement(q)
+        settings = [(e, 'k1', 3.0) for e in m._lattice_eleobjlist]
+        r = m.putCtrlConfBatch(settings, type='real', readback=True, msgout=False)
+        self.assertTrue(r.ok)
+        self.assertEqual(self.backend.getMany(self.pvs), [1.5] * 10)
+        self.assertRaises(KeyError, m.putCtrlConfBatch, [(m._lattice_eleobjlist[0], 'l', 1.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
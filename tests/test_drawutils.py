@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection
+import numpy as np
+
+import beamline
+from beamline import drawutils
+
+
+def makeElements():
+    return [beamline.ElementQuad('qf', config='l=0.1, k1=2.0'),
+            beamline.ElementDrift('d01', config='l=0.5'),
+            beamline.ElementCsrcsben('b1', config='l=0.5, angle=0.1'),
+            beamline.ElementMoni('bpm', config='l=0.1'),
+            beamline.ElementRfcw('rf', config='l=1.0, freq=2856e6'),
+            beamline.ElementRfdf('df', config='l=1.0, freq=5712e6'),
+            beamline.ElementCsrcsben('b2', config='l=0.5, angle=-0.1'),
+            beamline.ElementQuad('qd', config='l=0.1, k1=-2.0'),
+            beamline.ElementCharge('q', config='total=1e-9'),
+            beamline.ElementWake('w'),
+            beamline.ElementMark('m')]
+
+
+class DrawCollectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.m = beamline.Models(name='bl', flyweight=True)
+        self.m.addElement(makeElements() * 3)
+
+    def test_geometry(self):
+        # the same as drawing element by element
+        for mode in ('plain', 'fancy'):
+            patches, anotes, xr, yr = self.m.draw(startpoint=(1, 1), mode=mode)
+            drawpos = self.m._lattice_drawpos
+            artists, anotes1, xr1, yr1 = self.m.drawCollections(startpoint=(1, 1), mode=mode)
+            self.assertTrue(np.allclose(drawpos, self.m._lattice_drawpos))
+            self.assertTrue(np.allclose(xr + yr, xr1 + yr1))
+            self.assertEqual([a['name'] for a in anotes], [a['name'] for a in anotes1])
+            self.assertTrue(np.allclose([a['xypos'] for a in anotes], [a['xypos'] for a in anotes1]))
+            self.assertEqual([a['atext']['text'] for a in anotes1 if 'atext' in a], ['S', 'CD'] * 3)
+            self.assertLessEqual(len(artists), 5)
+
+    def test_render(self):
+        fig = plt.figure()
+        ax = fig.add_subplot(111)
+        artists, anotes, xr, yr = self.m.drawCollections(mode='fancy')
+        beamline.Models.plotElements(ax, artists)
+        self.assertEqual(len(ax.collections), len(artists))
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def test_fallback(self):
+        class ElementBox(beamline.ElementMark):
+            typename = 'BOX'
+
+            def setDraw(self, p0=(0, 0), angle=0, mode='plain'):
+                beamline.ElementMark.setDraw(self, p0, angle, mode)
+
+        self.assertTrue(drawutils.isSupported(self.m._lattice_eleobjlist))
+        self.m.addElement(ElementBox('box', config='l=0.1'))
+        self.assertFalse(drawutils.isSupported(self.m._lattice_eleobjlist))
+        artists = self.m.drawCollections()[0]
+        self.assertEqual(len(artists), 31)  # patches, one for each drawn element
+
+
+class GeometryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.m = beamline.Models(name='bl', flyweight=True)
+        self.m.addElement(makeElements() * 3)
+        self.cache = drawutils.GeometryCache()
+        self.elements = self.m._lattice_eleobjlist
+
+    def test_hit(self):
+        g1 = self.cache.getGeometry(self.elements, mode='plain')
+        g2 = self.cache.getGeometry(self.elements, mode='fancy')
+        self.assertIs(self.cache.getGeometry(self.elements, mode='plain'), g1)
+        self.assertIs(self.cache.getGeometry(self.elements, mode='fancy'), g2)
+        # other start point, moved from the cached one
+        g3 = self.cache.getGeometry(self.elements, startpoint=(2, -1), mode='fancy')
+        g4 = drawutils.calcGeometry(self.elements, startpoint=(2, -1), mode='fancy')
+        self.assertTrue(np.allclose(g3.p1, g4.p1))
+        self.assertTrue(np.allclose(g3.bounds, g4.bounds))
+        for part3, part4 in zip(g3.parts, g4.parts):
+            self.assertTrue(np.allclose(part3[2], part4[2]))
+        self.assertTrue(np.allclose(g3.getAnotes()[-1]['xypos'], g4.getAnotes()[-1]['xypos']))
+
+    def test_changed(self):
+        g1 = self.cache.getGeometry(self.elements, mode='fancy')
+        b1 = self.m.getElementsByName('b1')[0]
+        self.m.updateConfig(b1, {'angle': 0.2})
+        g2 = self.cache.getGeometry(self.elements, mode='fancy')
+        self.assertIsNot(g2, g1)
+        self.assertTrue(np.allclose(g2.p1, drawutils.calcGeometry(self.elements, mode='fancy').p1))
+        self.assertFalse(np.allclose(g2.p1, g1.p1))
+        qf = self.m.getElementsByName('qf')[0]
+        qf.setStyle(fc='r')
+        g3 = self.cache.getGeometry(self.elements, mode='fancy')
+        self.assertIsNot(g3, g2)
+        self.assertEqual(g3.parts[1][4]['fc'][0][:3].tolist(), [1.0, 0.0, 0.0])
+        self.m.removeElement(0)
+        self.assertEqual(len(self.cache.getGeometry(self.elements, mode='fancy')), 32)
+
+
+class ViewTest(unittest.TestCase):
+    def setUp(self):
+        m = beamline.Models(name='bl', flyweight=True)
+        m.addElement(makeElements() * 20)
+        self.geom = m.getDrawGeometry(mode='fancy')
+
+    def test_index(self):
+        ext = self.geom.getExtents()
+        self.assertTrue(np.isnan(ext[8]).all())  # charge, not drawn
+        self.assertTrue(np.allclose(np.nanmin(ext[:, 0::2], axis=0), self.geom.extent[0::2]))
+        tree = drawutils.RTree(ext, fanout=4)
+        self.assertEqual(len(tree), 200)
+        for box in ((0, 1, -1, 1), (10, 30, 0, 0.5), (-5, -1, -1, 1), (20.3, 20.3, -1, 1)):
+            x0, x1, y0, y1 = box
+            hit = np.flatnonzero((ext[:, 0] <= x1) & (ext[:, 1] >= x0) &
+                                 (ext[:, 2] <= y1) & (ext[:, 3] >= y0))
+            self.assertEqual(tree.query(*box).tolist(), hit.tolist())
+
+    def test_hit(self):
+        ext = self.geom.getExtents()
+        i = self.geom.names.index('QD') + 11 * 5
+        x, y = 0.5 * (ext[i, 0] + ext[i, 1]), 0.5 * (ext[i, 2] + ext[i, 3])
+        self.assertEqual(self.geom.hitTest(x, y), i)
+        self.assertIsNone(self.geom.hitTest(-1.0, 0.0))
+        self.assertEqual(self.geom.hitTest(-0.01, 0.0, tol=0.02), 0)
+        # the same as brute force search
+        rs = np.random.RandomState(1)
+        for x, y in zip(rs.uniform(*self.geom.bounds[0:2], size=200),
+                        rs.uniform(*self.geom.bounds[2:4], size=200)):
+            hit = np.flatnonzero((ext[:, 0] <= x) & (ext[:, 1] >= x) &
+                                 (ext[:, 2] <= y) & (ext[:, 3] >= y))
+            i = self.geom.hitTest(x, y)
+            if len(hit):
+                area = (ext[hit, 1] - ext[hit, 0]) * (ext[hit, 3] - ext[hit, 2])
+                self.assertEqual(i, hit[np.argmin(area)])
+            else:
+                self.assertIsNone(i)
+        self.assertEqual(self.geom.query(0, 0.15, -1, 1).tolist(), [0, 1])
+
+    def test_cull(self):
+        hit = self.geom.getIndex().query(10, 20, -10, 10)
+        artists = self.geom.makeArtists(view=(10, 20, -10, 10))
+        # quads and bends are in compound paths of curves
+        curves = np.isin(self.geom.shape[hit], (drawutils.SHAPE_QUAD, drawutils.SHAPE_BEND))
+        self.assertEqual(sum(len(a.get_paths()) for a in artists
+                             if not isinstance(a, PathCollection)), (~curves).sum())
+        self.assertEqual(self.geom.makeArtists(view=(-10, -5, -10, 10)), [])
+        # all elements are smaller than one pixel
+        artists = self.geom.makeArtists(pixel=(10.0, 10.0))
+        self.assertEqual(len(artists), 1)
+        self.assertLess(len(artists[0].get_paths()), 20)  # of 200 elements
+        # monitors (and zero length elements) are merged, but not drifts, quads, bends, rfs
+        artists = self.geom.makeArtists(pixel=(0.2, 0.2))
+        self.assertEqual([len(a.get_paths()) for a in artists], [20, 1, 1, 40, 40])
+
+
+class AnnotationLayerTest(unittest.TestCase):
+    def setUp(self):
+        m = beamline.Models(name='bl', flyweight=True)
+        m.addElement(makeElements() * 100)
+        self.artists, self.anotes, self.xr, self.yr = m.drawCollections()
+        self.fig = plt.figure(figsize=(8, 2), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        beamline.Models.plotElements(self.ax, self.artists)
+        self.ax.set_xlim(self.xr)
+        self.ax.set_ylim(-1, 1)
+
+    def tearDown(self):
+        plt.close(self.fig)
+
+    def test_filter(self):
+        layer, = beamline.Models.anoteElements(self.ax, self.anotes, efilter='QUAD',
+                                               textypos=0.6, batch=True)
+        self.assertEqual(len(layer), 200)
+        self.assertEqual(set(layer.labels), {'QF', 'QD'})
+        self.assertTrue(np.allclose(layer.textxy[:, 1], 0.6))
+        layer, = beamline.Models.anoteElements(self.ax, self.anotes, efilter=('RFCW', 'RFDF'),
+                                               arrowprops=None, batch=True)
+        self.assertEqual(layer.labels[:2], ['S', 'CD'])
+        self.assertFalse(layer.arrow.any())
+        self.assertEqual(self.ax.artists[-1], layer)
+
+    def test_decimate(self):
+        layer, = beamline.Models.anoteElements(self.ax, self.anotes, efilter='QUAD',
+                                               textypos=0.6, batch=True, spacing=10)
+        self.fig.canvas.draw()
+        shown = layer.getShown()
+        # 620 pixels wide axes at most
+        self.assertLess(len(shown), 70)
+        x = self.ax.transData.transform(layer.textxy[shown])[:, 0]
+        self.assertTrue((np.diff(np.floor(x / 10.0)) > 0).all())
+        # all the labels in view when zoomed in
+        self.ax.set_xlim(10, 13)
+        self.fig.canvas.draw()
+        inview = (layer.textxy[:, 0] >= 10) & (layer.textxy[:, 0] <= 13)
+        self.assertEqual(layer.getShown().tolist(), np.flatnonzero(inview).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
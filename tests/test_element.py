@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import beamline
+import copy
+import numpy as np
+import unittest
+
+
+class ElementCompactTest(unittest.TestCase):
+    def test_slots(self):
+        m = beamline.ElementMark('m1')
+        self.assertFalse(hasattr(m, '__dict__'))
+        self.assertEqual(m.typename, 'MARK')
+        self.assertTrue(np.allclose(m.transM, np.eye(6)))
+
+    def test_keys(self):
+        q = beamline.ElementQuad('q1', config='l=0.1, k1=2.0')
+        q.setConf({'k1': {'pv': 'Q1:K1'}}, type='ctrl')
+        self.assertEqual(sorted(q.simukeys), ['k1', 'l'])
+        self.assertEqual(q.ctrlkeys, ['k1'])
+        self.assertEqual(q.dumpConfig(type='simu'), {'Q1': {'QUAD': {'l': '0.1', 'k1': '2.0'}}})
+        self.assertEqual(q.getConfig()['k1'], {'pv': 'Q1:K1'})
+
+    def test_style(self):
+        q1 = beamline.ElementQuad('q1', config='l=0.1, k1=2.0')
+        q2 = beamline.ElementQuad('q2', config='l=0.1, k1=2.0')
+        self.assertIs(q1.style, q2.style)
+        q2.setStyle(fc='green')
+        self.assertEqual(q2.style['fc'], 'green')
+        self.assertNotEqual(q1.style['fc'], 'green')
+        q1.setDraw()
+        self.assertNotIn('w', q1.style)
+
+    def test_comminfo(self):
+        self.addCleanup(setattr, beamline.MagBlock, '_comminfo_shared',
+                        beamline.MagBlock._comminfo_shared)
+        d1 = beamline.ElementDrift('d1', config='l=1')
+        beamline.MagBlock.setCommInfo({'test_key': 'v1'})
+        d2 = beamline.ElementDrift('d2', config='l=1')
+        self.assertNotIn('test_key', d1.comminfo)
+        self.assertEqual(d2.comminfo['test_key'], 'v1')
+        self.assertEqual(beamline.MagBlock.comminfo['test_key'], 'v1')
+
+    def test_copy(self):
+        b = beamline.ElementCsrcsben('b1', config={'l': 0.2, 'angle': 0.1})
+        b.calcTransM(gamma=100.0)
+        b1 = copy.deepcopy(b)
+        self.assertEqual(b1.rho, b.rho)
+        self.assertIsNot(b1.simuinfo, b.simuinfo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import beamline
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+
+# stand-in of genesis: read input file name from stdin, write rad.out-like
+# output, sleep for the time given in the input file
+FAKE_GENESIS = """
+import sys, time
+infile = sys.stdin.readline().strip()
+params = dict((k.strip(), v) for k, v in (l.split('=') for l in open(infile) if '=' in l))
+time.sleep(float(params.get('sleep', 0)))
+if int(params.get('fail', 0)):
+    sys.exit(1)
+with open(params['outputfile'].strip(), 'w') as f:
+    f.write('Genesis 1.3 output start\\n')
+    f.write(' aw0 = {0}\\n'.format(params['aw0'].strip()))
+    f.write('  3 entries per record\\n    1 history records\\n')
+    f.write('    z[m]          aw            qfld\\n')
+    for i in range(3):
+        f.write('    {0:.4E}    1.0000E+00    0.0000E+00\\n'.format(i * 0.1))
+    f.write('\\n********** output: slice     1\\n           =================\\n')
+    f.write('     5.0000E+02 current\\n\\n\\n')
+    f.write('    power         increment     p_mid\\n')
+    for i in range(3):
+        f.write('    {0:.4E}    0.0000E+00    1.0000E+00\\n'.format(10.0 ** i))
+"""
+
+
+def writeOutput(filename, nslice=3, entries=4, fortran=False):
+    """ write Genesis-like output with nslice slices, return slice data
+    """
+    data = np.arange(nslice * entries * 3, dtype=float).reshape(nslice, entries, 3) + 0.5
+    fmt = '    {0:.4E}    {1:.4E}    {2:.4E}\n'
+    with open(filename, 'w') as f:
+        f.write('Genesis 1.3 output start\n $newrun\n aw0 = 1.0D+00\n $end\n')
+        f.write('  {0} entries per record\n  {1} history records\n'.format(entries, nslice))
+        f.write('    z[m]          aw            qfld\n')
+        for i in range(entries):
+            f.write(fmt.format(i * 0.1, 1.0, 0.0))
+        for k in range(nslice):
+            f.write('\n********** output: slice {0:5d}\n           =================\n'.format(k + 1))
+            f.write('     {0:.4E} current\n\n\n'.format(100.0 * k))
+            f.write('    power         increment     xrms\n')
+            for row in data[k]:
+                line = fmt.format(*row)
+                f.write(line.replace('E', 'D') if fortran else line)
+    return data
+
+
+class GenesisOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.outfile = os.path.join(self.tmpdir, 'rad.out')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_slices(self):
+        data = writeOutput(self.outfile, nslice=3, fortran=True)
+        out = beamline.GenesisOutput(self.outfile)
+        self.assertEqual(out.entries, 4)
+        self.assertEqual(out.getParam('aw0'), '1.0D+00')
+        self.assertTrue(np.allclose(out.data, data))
+        self.assertTrue(np.allclose(out.current, [0.0, 100.0, 200.0]))
+        self.assertTrue(np.allclose(out.getColumn('z[m]'), [0.0, 0.1, 0.2, 0.3]))
+
+    def test_select(self):
+        data = writeOutput(self.outfile, nslice=5)
+        out = beamline.GenesisOutput(self.outfile, slices=[1, 3], columns=['xrms', 'power'])
+        self.assertEqual(out.data.shape, (2, 4, 2))
+        self.assertTrue(np.allclose(out.getColumn('power', islice=1), data[3, :, 0]))
+        self.assertTrue(np.allclose(out.getColumn('xrms', islice=0), data[1, :, 2]))
+
+    def test_missing_section(self):
+        writeOutput(self.outfile, nslice=2)
+        with open(self.outfile) as f:
+            text = f.read()
+        with open(self.outfile, 'w') as f:
+            f.write(text[:text.rfind('power')])
+        self.assertRaisesRegex(ValueError, "'power' not found in slice 2",
+                               beamline.GenesisOutput, self.outfile)
+
+    def test_postprocess(self):
+        data = writeOutput(self.outfile, nslice=2)
+        fel = beamline.FELSimulator()
+        fel.postProcess(self.outfile, islice=1)
+        self.assertEqual(fel.data.shape, (4, 6))
+        self.assertAlmostEqual(fel.getMaxPower(), data[1, :, 0].max())
+
+
+class JobRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.exe = [sys.executable, os.path.join(self.tmpdir, 'fake_genesis.py')]
+        with open(self.exe[1], 'w') as f:
+            f.write(FAKE_GENESIS)
+        self.runner = beamline.JobRunner(max_workers=4, basedir=self.tmpdir)
+
+    def tearDown(self):
+        self.runner.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def makeJob(self, i, sleep=0.0, fail=0, timeout=None):
+        infile = os.path.join(self.tmpdir, 'rad{0}.in'.format(i))
+        with open(infile, 'w') as f:
+            f.write(" aw0 = {0}\n outputfile = rad.out\n sleep = {1}\n fail = {2}\n".format(i, sleep, fail))
+        return beamline.GenesisJob('rad.in', files={'rad.in': infile}, name='job{0}'.format(i),
+                                   executable=self.exe, timeout=timeout)
+
+    def test_isolation(self):
+        t0 = time.time()
+        results = self.runner.runAll([self.makeJob(i, sleep=0.5) for i in range(4)])
+        # concurrent, wall time less than the sum of all jobs
+        self.assertLess(time.time() - t0, sum(r.elapsed for r in results))
+        self.assertEqual(len(set(r.workdir for r in results)), 4)
+        for i, r in enumerate(results):
+            self.assertTrue(r.ok)
+            self.assertEqual(r.returncode, 0)
+            with open(r.getOutput()) as f:
+                self.assertIn(' aw0 = {0}'.format(i), f.read())
+
+    def test_failure_timeout(self):
+        r1, r2 = self.runner.runAll([self.makeJob(1, fail=1), self.makeJob(2, sleep=5, timeout=0.5)])
+        self.assertEqual(r1.status, 'failed')
+        self.assertEqual(r1.returncode, 1)
+        self.assertEqual(r2.status, 'timeout')
+        self.assertLess(r2.elapsed, 2.0)
+
+    def test_cancel(self):
+        futures = [self.runner.submit(self.makeJob(i, sleep=5)) for i in range(6)]
+        time.sleep(0.5)
+        self.runner.cancel()
+        results = [f.result(timeout=5) for f in futures]
+        self.assertTrue(all(r.status == 'cancelled' for r in results))
+        # later jobs are not cancelled
+        r, = self.runner.runAll([self.makeJob(7)])
+        self.assertTrue(r.ok)
+
+    def test_cleanup(self):
+        r1, = self.runner.runAll([self.makeJob(1)])
+        self.assertTrue(os.path.isfile(r1.getOutput()))
+        self.runner.shutdown()
+        self.assertFalse(os.path.exists(r1.workdir))
+        runner = beamline.JobRunner(max_workers=1, basedir=self.tmpdir, keep=True)
+        r2, = runner.runAll([self.makeJob(2)])
+        runner.shutdown()
+        self.assertTrue(os.path.isfile(r2.getOutput()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -178,6 +178,33 @@ class ManipulateLatticeTest(BeamlineLatticeTest):
         self.lins.generateLatticeFile('bl', latticefile2, format = 'elegant')
 """
 
+class MakeModelTest(BeamlineLatticeTest):
+    # online model directly from lattice, without lte round trip
+    def test_make(self):
+        names = self.lins.getElementList('doub1')
+        eobjs = self.lins.makeElements(names)
+        self.assertEqual([e.name for e in eobjs], names)
+        self.assertIs(eobjs[0], eobjs[-1])  # dqd3 twice
+        self.assertIsInstance(eobjs[1], beamline.ElementQuad)
+        self.assertIsInstance(eobjs[0], beamline.ElementLscdrift)
+
+        model = self.lins.makeModel('doub1', flyweight=True)
+        self.assertEqual(model.getElementCount(), (5, 4))
+
+    def test_extract(self):
+        sublat = self.lins.extractBeamline('trip3')
+        self.assertEqual(sublat.getAllBl(), ['TRIP3'])
+        self.assertEqual(sublat.getElementList('trip3'),
+                         ['Q'] + self.lins.getElementList('trip3'))
+        self.assertEqual(sublat.getElementConf('q09'), self.lins.getElementConf('q09'))
+        # definitions are copied
+        sublat.getElementConf('q09')['K1'] = 100
+        self.assertNotEqual(self.lins.getElementConf('q09')['K1'], 100)
+
+        model = sublat.makeModel('trip3')
+        self.assertIsInstance(list(model.getElementsByName('Q'))[0], beamline.ElementCharge)
+
+
 def testfun():
     latticePath = os.path.join(os.getcwd(), '../lattice')
     infilename  = os.path.join(latticePath, 'linac.lte')
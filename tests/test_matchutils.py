@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import beamline
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+MOD_IN = """ $newrun
+ aw0 = 2.5
+ xlamd = 0.08
+ gamma0 = 1600.0
+ emitx = 1.0e-6
+ alphax = 0.0
+ alphay = 0.0
+ rxbeam = 1.0e-4
+ rybeam = 1.0e-4
+ $end
+"""
+
+RAD_IN = """ $newrun
+ aw0 = 1.5
+ xlamd = 0.04
+ gamma0 = 1600.0
+ emitx = 1.0e-6
+ alphax = 0.0
+ alphay = 0.0
+ rxbeam = 1.0e-4
+ rybeam = 1.0e-4
+ maginfile = 'rad.lat'
+ $end
+"""
+
+RAD_LAT = "? version = 1.0\n? imagl = 0.1\n? idril = 0.5\n? ibfield = 0.3\n" + \
+          "".join("qf {0} 4 0\n".format(i) for i in range(12))
+
+FULLAT = "! 1 10 1 2 4 2 20 2 4\n"
+
+
+class BeamMatchScanTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        for fn, content in (('mod.in', MOD_IN), ('rad.in', RAD_IN), ('mod.lat', "? version = 1.0\n"),
+                            ('rad.lat', RAD_LAT), ('fullat.hghg', FULLAT)):
+            with open(fn, 'w') as f:
+                f.write(content)
+        self.scan = beamline.BeamMatchScan('mod.in', 'rad.in', 'mod.lat', 'rad.lat')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_calculate(self):
+        qf = np.array([-20.0, -5.0, 5.0, 10.0, 20.0, 20.0])
+        qd = np.array([20.0, 5.0, -5.0, -10.0, -20.0, 20.0])
+        r = self.scan.matchCalculate(qf, qd)
+        for i in range(qf.size):
+            bm = beamline.BeamMatch('mod.in', 'rad.in', 'mod.lat', 'rad.lat',
+                                    'newmod.in', 'newrad.in', 'newrad.lat', qf[i], qd[i])
+            ok = bm.matchCalculate()
+            self.assertEqual(ok, r['stable'][i])
+            self.assertEqual(ok, i < 5)
+            if ok:
+                for k in ('alphax_rad', 'alphay_rad', 'sigmax_rad', 'sigmay_rad',
+                          'alphax_mod', 'alphay_mod', 'sigmax_mod', 'sigmay_mod'):
+                    self.assertAlmostEqual(getattr(bm, k), r[k][i])
+
+    def test_parse(self):
+        p = beamline.ParseParams('mod.in', 'mod.lat')
+        self.assertEqual(p.getElectronGamma(), 1600.0)
+        self.assertEqual(p.getParam('RXBEAM'), 1.0e-4)
+        self.assertEqual(beamline.parseNamelist('rad.in')['maginfile'], 'rad.lat')
+        # cached until file changes
+        self.assertIs(beamline.parseNamelist('mod.in'), beamline.parseNamelist('mod.in'))
+        # rewritten with the same size, mtime changed by 1 [ns] only
+        st = os.stat('mod.in')
+        with open('mod.in', 'w') as f:
+            f.write(MOD_IN.replace('1600.0', '1700.0'))
+        os.utime('mod.in', ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertEqual(os.stat('mod.in').st_size, st.st_size)
+        self.assertEqual(beamline.ParseParams('mod.in').getElectronGamma(), 1700.0)
+
+    def test_scan(self):
+        qfvals, qdvals = np.linspace(-30, 30, 61), np.linspace(-30, 30, 61)
+        opt = self.scan.matchScan(qfvals, qdvals)
+        self.assertIsNotNone(opt)
+        qf_grid, qd_grid, stable = self.scan.getStableRegion()
+        self.assertEqual(stable.shape, (61, 61))
+        self.assertTrue(stable.any())
+        idx = (qf_grid == opt[0]) & (qd_grid == opt[1])
+        self.assertAlmostEqual(np.nanmin(self.scan.objective), self.scan.objective[idx][0])
+        bm = self.scan.matchPerform('newmod.in', 'newrad.in', 'newrad.lat')
+        self.assertTrue(os.path.isfile('newrad.lat'))
+        self.assertAlmostEqual(bm.qfval, opt[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
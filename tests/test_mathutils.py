@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import beamline
+import numpy as np
+import unittest
+
+
+class TransBatchTest(unittest.TestCase):
+    def test_drift(self):
+        m = beamline.transDriftBatch([0.5, 1.0], gamma=100.0)
+        self.assertEqual(m.shape, (2, 6, 6))
+        self.assertTrue(np.allclose(m[1], beamline.transDrift(1.0, gamma=100.0)))
+
+    def test_quad(self):
+        for k1 in (-2.0, 0.0, 2.0):
+            m = beamline.transQuadBatch(0.2, k1, gamma=100.0)[0]
+            self.assertTrue(np.allclose(m, beamline.transQuad(0.2, k1, gamma=100.0)))
+
+    def test_chain(self):
+        m = beamline.transQuadBatch([0.2, 0.3, 0.1], [1.0, -1.0, 0.5], gamma=100.0)
+        self.assertTrue(np.allclose(beamline.chainBatch(m), m[2].dot(m[1]).dot(m[0])))
+
+
+class FunTransBatchTest(unittest.TestCase):
+    def test_quad(self):
+        k = np.array([-3.0, -0.5, 0.5, 3.0])
+        mf = beamline.funTransQuadFBatch(k, 0.2)
+        md = beamline.funTransQuadDBatch(k, 0.2)
+        for i in range(k.size):
+            self.assertTrue(np.allclose(mf[i], beamline.funTransQuadF(k[i], 0.2)))
+            self.assertTrue(np.allclose(md[i], beamline.funTransQuadD(k[i], 0.2)))
+
+    def test_quad_zero(self):
+        m = beamline.funTransQuadFBatch(0.0, 0.2)[0]
+        self.assertTrue(np.allclose(m, beamline.funTransDrift(0.2)))
+
+    def test_chicane(self):
+        b = np.array([0.2, 0.4, 0.6])
+        for xoy in ('x', 'y'):
+            m = beamline.funTransChicaBatch(0.1, 1.0, b, 300.0, xoy)
+            self.assertEqual(m.shape, (3, 2, 2))
+            for i in range(b.size):
+                m0 = beamline.funTransChica(0.1, 1.0, b[i], 300.0, xoy)
+                self.assertTrue(np.allclose(m[i], m0))
+
+
+class TransRfcwTest(unittest.TestCase):
+    def test_zero_volt(self):
+        m = beamline.transRfcwBatch(1.0, 0.0, 90.0, 2856e6, 100.0)[0]
+        self.assertTrue(np.allclose(m, beamline.transDrift(1.0, gamma=100.0)))
+
+    def test_damping(self):
+        gi = 100.0
+        gf = gi + beamline.rfEnergyGain(10e6, 90.0)[0]
+        m = beamline.transRfcwBatch(1.0, 10e6, 90.0, 2856e6, gi)[0]
+        self.assertAlmostEqual(np.linalg.det(m[0:2, 0:2]), gi / gf)
+
+
+class ModelsEnergyTest(unittest.TestCase):
+    def setUp(self):
+        d = beamline.ElementDrift('d', config='l=0.5')
+        q = beamline.ElementQuad('q', config='l=0.1, k1=0.5')
+        rf = beamline.ElementRfcw('rf', config='l=1.0, volt=5e6, phase=90, freq=2856e6')
+        self.m = beamline.Models(name='bl')
+        self.m.addElement(d, q, rf, d)
+
+    def test_profile(self):
+        gin, gout = self.m.getEnergyProfile(100.0)
+        self.assertAlmostEqual(gout[-1], 100.0 + beamline.rfEnergyGain(5e6, 90.0)[0])
+        self.assertEqual(gin[3], gout[2])
+
+    def test_default_phase(self):
+        # phase is 0 by default as ELEGANT, i.e. no energy gain
+        rf = beamline.ElementRfcw('rf', config='l=1.0, volt=5e6, freq=2856e6')
+        self.assertAlmostEqual(rf.getEnergyGain(), 0.0)
+        m = beamline.Models(name='bl')
+        m.addElement(rf)
+        gin, gout = m.getEnergyProfile(100.0)
+        self.assertAlmostEqual(gout[-1], 100.0)
+        self.assertTrue(np.allclose(m.calcTransM(100.0)[0], rf.calcTransM(100.0)))
+
+    def test_transm(self):
+        self.assertEqual(self.m.calcTransM(100.0).shape, (4, 6, 6))
+        self.assertEqual(self.m.getTransM(100.0).shape, (6, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
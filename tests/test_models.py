@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import threading
+import unittest
+
+import beamline
+import numpy as np
+from beamline import ctrlutils
+
+
+def makeCell():
+    d = beamline.ElementDrift('d01', config='l=0.5')
+    qf = beamline.ElementQuad('qf', config='l=0.1, k1=2.0')
+    qd = beamline.ElementQuad('qd', config='l=0.1, k1=-2.0')
+    rf = beamline.ElementRfcw('rf', config='l=1.0, volt=1e6, phase=90')
+    return [qf, d, rf, d, qd, d]
+
+
+class ModelsFlyweightTest(unittest.TestCase):
+    def setUp(self):
+        cell = makeCell()
+        self.m0 = beamline.Models(name='bl')
+        self.m0.addElement(cell * 5)
+        self.m1 = beamline.Models(name='bl', flyweight=True)
+        self.m1.addElement(cell * 5)
+
+    def test_shared(self):
+        self.assertEqual(self.m0.getElementCount(), (30, 30))
+        self.assertEqual(self.m1.getElementCount(), (30, 4))
+        d = list(self.m1.getElementsByName('d01'))
+        self.assertIs(d[0], d[-1])
+
+    def test_positions(self):
+        self.assertTrue(np.allclose(self.m0.getPositions(), self.m1.getPositions()))
+        self.assertAlmostEqual(self.m1.getPositions()[-1], 5 * 2.7 - 0.5)
+
+    def test_transport(self):
+        self.assertTrue(np.allclose(self.m0.calcTransM(100.0), self.m1.calcTransM(100.0)))
+        self.assertEqual(self.m0.getAllConfig(fmt='dict'), self.m1.getAllConfig(fmt='dict'))
+
+    def test_ctrl_override(self):
+        self.m1.setCtrlOverride(0, {'k1': {'pv': 'Q01:K1'}})
+        elist = self.m1.getCtrlConf(msgout=False)
+        self.assertEqual(elist[0].ctrlinfo['k1']['pv'], 'Q01:K1')
+        self.assertEqual(elist[6].ctrlinfo, {})
+        self.assertIs(elist[1], elist[3])
+
+
+class ModelsIncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self.d = beamline.ElementDrift('d01', config='l=0.5')
+        self.q = beamline.ElementQuad('q01', config='l=0.1, k1=2.0')
+        self.m = beamline.Models(name='bl')
+        for i in range(6):
+            self.m.addElement(self.d if i % 2 else self.q)
+
+    def test_append(self):
+        self.assertTrue(np.allclose(self.m.getPositions(), [0, 0.1, 0.6, 0.7, 1.2, 1.3]))
+        self.assertEqual(self.m.getAllConfig(fmt='dict')['BL']['BEAMLINE']['lattice'],
+                         '(q01 d01 q01 d01 q01 d01)')
+
+    def test_insert_remove(self):
+        self.m.insertElement(2, self.d, self.d)
+        self.assertEqual(self.m.LatticeList[:5], ['q01', 'd01', 'd01', 'd01', 'q01'])
+        self.assertAlmostEqual(self.m.getPositions()[4], 1.6)
+        removed = self.m.removeElement(1, 3)
+        self.assertEqual(len(removed), 3)
+        self.assertTrue(np.allclose(self.m.getPositions(), [0, 0.1, 0.2, 0.7, 0.8]))
+        self.assertTrue(np.allclose(self.m.getPositions(),
+                                    [e.getPosition() for e in self.m._lattice_eleobjlist]))
+
+    def test_position_view(self):
+        elist = self.m._lattice_eleobjlist
+        e = elist[4]
+        self.assertAlmostEqual(e.getPosition(), 1.2)
+        self.m.updateConfig(elist[1], {'l': 1.0})
+        self.assertAlmostEqual(e.getPosition(), 1.7)
+        e.setPosition(2.0)
+        self.assertAlmostEqual(self.m.getPositions()[4], 2.0)
+        self.m.initPos(1.0)
+        self.assertAlmostEqual(e.getPosition(), 2.7)
+        removed = self.m.removeElement(0, 2)
+        self.assertAlmostEqual(removed[1].getPosition(), 1.1)
+        self.assertAlmostEqual(e.getPosition(), 1.6)
+        # copies are detached from the model
+        for c in (copy.deepcopy(e), copy.copy(e), e.shallowCopy()):
+            self.assertIsNone(c.getPositionStore())
+            c.setPosition(100.0)
+            self.assertAlmostEqual(e.getPosition(), 1.6)
+            self.assertAlmostEqual(c.getPosition(), 100.0)
+
+    def test_other_model(self):
+        m1 = beamline.Models(name='bl1')
+        m1.addElement(self.d, self.q, copy=False)
+        m2 = beamline.Models(name='bl2')
+        self.assertRaises(ValueError, m2.addElement, self.d, self.q, copy=False)
+        self.assertEqual(m2.getElementCount(), (0, 0))
+        self.assertAlmostEqual(self.q.getPosition(), 0.5)
+        m1.removeElement(1)
+        m2.addElement(self.d, self.q)
+        m2.addElement(self.q, copy=False)
+        self.assertAlmostEqual(self.q.getPosition(), 0.6)
+
+    def test_copy_on_write(self):
+        m = beamline.Models(name='bl')
+        m.addElement(self.q, self.d, copy=False)
+        e = list(m.getElementsByName('q01'))[0]
+        self.assertIs(e, self.q)
+        e1 = m.updateConfig(e, {'l': 0.3})
+        self.assertIsNot(e1, self.q)
+        self.assertEqual(self.q.getLength(), 0.1)
+        self.assertIs(m.getElementsByName('q01')[0], e1)
+        self.assertTrue(np.allclose(m.getPositions(), [0, 0.3]))
+
+    def test_duplicate(self):
+        # every occurrence has its own object and position
+        m = beamline.Models(name='bl')
+        m.addElement(self.q, self.d, self.q, copy=False)
+        m.addElement(self.d, copy=False)
+        elist = m._lattice_eleobjlist
+        self.assertIs(elist[0], self.q)
+        self.assertEqual(len(set(map(id, elist))), 4)
+        m.updateConfig(self.q, {'l': 0.5})
+        self.assertTrue(np.allclose([e.getPosition() for e in elist], [0, 0.5, 1.0, 1.1]))
+        self.assertTrue(np.allclose(m.getPositions(), [0, 0.5, 1.0, 1.1]))
+        m.removeElement(2)
+        self.assertTrue(np.allclose([e.getPosition() for e in elist], [0, 0.5, 1.0]))
+
+
+class ModelsIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.m = beamline.Models(name='bl', flyweight=True)
+        self.m.addElement(makeCell() * 3)
+
+    def test_name_type(self):
+        self.assertEqual(self.m.getElementsByName('d01', index=True),
+                         [1, 3, 5, 7, 9, 11, 13, 15, 17])
+        self.assertEqual(self.m.getElementsByType('quad', index=True), [0, 4, 6, 10, 12, 16])
+        self.assertEqual(len(self.m.getElementsByType('drif')), 9)
+        self.assertEqual(self.m.getElementsByName('xx'), [])
+        # index is kept updated
+        self.m.addElement(beamline.ElementMoni('bpm'))
+        self.assertEqual(self.m.getElementsByType('moni', index=True), [18])
+        self.m.removeElement(0, 2)
+        self.assertEqual(self.m.getElementsByName('qf', index=True), [4, 10])
+        self.m.insertElement(0, beamline.ElementMoni('bpm'))
+        self.assertEqual(self.m.getElementsByName('bpm', index=True), [0, 17])
+
+    def test_position(self):
+        self.assertEqual(self.m.getElementAt(0.05, index=True), 0)
+        self.assertEqual(self.m.getElementAt(3.0, index=True), 7)
+        self.assertEqual(self.m.getElementAt(2.7).name, 'qf')
+        self.assertIsNone(self.m.getElementAt(-1))
+        self.assertIsNone(self.m.getElementAt(10))
+        self.assertEqual(self.m.getElementsWithin(0.1, 1.6, index=True), [1, 2, 3])
+        self.assertEqual([e.name for e in self.m.getElementsWithin(2.0, 2.75)],
+                         ['qd', 'd01', 'qf'])
+
+
+class ModelSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'QF:K1': 1.0, 'QD:K1': -1.0})
+        old = ctrlutils.setBackend(self.backend)
+        self.addCleanup(ctrlutils.setBackend, old)
+        self.m = beamline.Models(name='bl', mode='online', flyweight=True)
+        self.m.addElement(makeCell() * 10)
+        self.m.setCtrlOverride(0, {'k1': {'pv': 'QF:K1'}})
+        self.qd = self.m.getElementsByName('qd')[0]
+        self.qd.setConf({'k1': {'pv': 'QD:K1'}}, type='ctrl')
+
+    def test_shared(self):
+        s0 = self.m.snapshot()
+        self.assertEqual(s0.readings, {'QF:K1': 1.0, 'QD:K1': -1.0})
+        self.assertIs(s0[1], self.m._lattice_eleobjlist[1])
+        self.assertIsNot(s0[0], self.m._lattice_eleobjlist[0])
+        self.assertIs(s0[4], s0[10])  # one copy for shared definition
+        self.assertEqual(s0[4].simuinfo['k1'], -2.0)
+        self.assertEqual(self.qd.simuinfo['k1'], '-2.0')
+        self.assertEqual(s0.getAllConfig(fmt='dict')['BL']['BEAMLINE']['lattice'],
+                         self.m.getAllConfig(fmt='dict')['BL']['BEAMLINE']['lattice'])
+        # model is changed, snapshot is not
+        d = self.m.updateConfig(s0[1], {'l': 0.6})
+        self.assertIsNot(d, s0[1])
+        self.assertEqual(s0[1].getLength(), 0.5)
+        self.assertAlmostEqual(s0.getPositions()[-1], 10 * 2.7 - 0.5)
+        self.assertAlmostEqual(self.m.getPositions()[-1], 10 * 3.0 - 0.6)
+
+    def test_positions(self):
+        m = beamline.Models(name='bl')
+        m.addElement(makeCell())
+        qf = m.getElementsByName('qf')[0]
+        s0 = m.snapshot()
+        self.assertIsNot(s0[0], qf)
+        self.assertIsNone(s0[1].getPositionStore())
+        m.insertElement(0, beamline.ElementDrift('d00', config='l=10.0'))
+        self.assertEqual(s0[1].getPosition(), s0.getPositions()[1])
+        self.assertEqual([e.getPosition() for e in s0], s0.getPositions().tolist())
+        s0[1].setPosition(100.0)
+        self.assertEqual(m.getPositions()[2], 10.1)
+        # copy-on-write: replaced element is unbound, new one is bound
+        q = m.updateConfig(qf, {'k1': 3.0})
+        self.assertIsNot(q, qf)
+        self.assertIsNone(qf.getPositionStore())
+        self.assertEqual(qf.getPosition(), 10.0)
+        self.assertIs(q.getPositionStore(), m._lattice_pos)
+        self.assertEqual(q.getPosition(), 10.0)
+
+    def test_diff_restore(self):
+        s0 = self.m.snapshot()
+        self.backend.setValue('QD:K1', -1.5)
+        s1 = self.m.snapshot()
+        self.assertEqual(s1.diff(s0), [(i, 'k1', -2.0, -3.0) for i in range(4, 60, 6)])
+        self.assertEqual(s1.diff(s1), [])
+        r = self.m.restoreSnapshot(s0, msgout=False)
+        self.assertEqual((r.status, r.pvnames), ('done', ['QD:K1']))
+        self.assertEqual(self.backend.pvs['QD:K1'], -1.0)
+
+
+class ModelsConfigCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'QF:K1': 1.0})
+        old = ctrlutils.setBackend(self.backend)
+        self.addCleanup(ctrlutils.setBackend, old)
+        self.m = beamline.Models(name='bl', mode='online')
+        self.m.addElement(makeCell() * 3)
+        self.m.setCtrlOverride(0, {'k1': {'pv': 'QF:K1'}})
+
+    def test_json(self):
+        conf = json.loads(self.m.getAllConfig())
+        self.assertEqual(conf, self.m.getAllConfig(fmt='dict'))
+        self.assertEqual(conf['QF']['QUAD']['k1'], '2.0')  # last definition
+        self.assertEqual(conf['BL']['BEAMLINE']['lattice'],
+                         '(' + ' '.join(['qf', 'd01', 'rf', 'd01', 'qd', 'd01'] * 3) + ')')
+        # copies with PV readings are reused
+        self.assertIs(self.m.snapshot()[0], self.m.snapshot()[0])
+        self.backend.setValue('QF:K1', 1.5)
+        self.assertEqual(self.m.getCtrlConf(msgout=False)[0].simuinfo['k1'], 3.0)
+
+    def test_dirty(self):
+        self.m.getAllConfig()
+        f0 = dict(self.m._lattice_fragments)
+        self.m.getAllConfig()
+        self.assertTrue(all(f0[k] is v for k, v in self.m._lattice_fragments.items()))
+        # elements are still owned by the model (not copied)
+        rf = self.m._lattice_eleobjlist[14]
+        e = self.m.updateConfig(rf, {'volt': 2e6})
+        self.assertIs(e, rf)
+        conf = json.loads(self.m.getAllConfig())
+        self.assertEqual(conf['RF']['RFCW']['volt'], 2e6)
+        changed = [k for k, v in self.m._lattice_fragments.items() if f0.get(k) is not v]
+        self.assertEqual(changed, [id(e)])
+
+    def test_online(self):
+        self.backend.setValue('QD:K1', -1.0)
+        for e in self.m.getElementsByName('qd'):
+            e.setConf({'k1': {'pv': 'QD:K1'}}, type='ctrl')
+        conf = self.m.getAllConfig(fmt='dict')
+        self.assertEqual(conf['QD']['QUAD']['k1'], -2.0)
+        self.assertEqual(self.m.getElementsByName('qd')[0].simuinfo['k1'], '-2.0')
+        self.backend.setValue('QD:K1', -1.5)
+        self.assertEqual(json.loads(self.m.getAllConfig())['QD']['QUAD']['k1'], -3.0)
+
+    def test_simulation(self):
+        m = beamline.Models(name='bl')
+        m.addElement(makeCell())
+        m.setCtrlOverride(0, {'k1': {'pv': 'QF:K1'}})
+        self.assertEqual(m.getAllConfig(fmt='dict')['QF']['QUAD']['k1'], '2.0')
+        # no PV is read
+        self.assertEqual(self.backend.requests, 0)
+
+
+class LiveOpticsTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = ctrlutils.SimulatedBackend({'QF:K1': 1.0, 'QD:K1': -1.0, 'RF:VOLT': 1e6})
+        self.m = beamline.Models(name='bl', flyweight=True)
+        self.m.addElement(makeCell() * 4)
+        self.m.setCtrlOverride(0, {'k1': {'pv': 'QF:K1'}})
+        self.m.setCtrlOverride(4, {'k1': {'pv': 'QD:K1'}})
+        self.m.setCtrlOverride(8, {'volt': {'pv': 'RF:VOLT'}})
+        self.live = beamline.LiveOptics(self.m, 100.0, twiss0=(10, 0, 10, 0), debounce=0.02,
+                                        backend=self.backend)
+        self.updated = threading.Event()
+        self.live.subscribe(lambda r: self.updated.set())
+        self.live.start()
+        self.addCleanup(self.live.stop)
+        self.assertTrue(self.updated.wait(1.0))  # initial values
+
+    def expected(self, config):
+        m = beamline.Models(name='bl')
+        for i, e in enumerate(self.m._lattice_eleobjlist):
+            m.addElement(e)
+            if i in config:
+                m.updateConfig(m._lattice_eleobjlist[i], config[i])
+        return m.calcTransM(100.0)
+
+    def test_update(self):
+        r = self.live.getResult()
+        # PV -> physical value, 2 * PV for quads
+        m = self.expected({0: {'k1': 2.0}, 4: {'k1': -2.0}})
+        self.assertTrue(np.allclose(r['transM'], m))
+        self.assertTrue(np.allclose(r['cumM'][-1], beamline.chainBatch(m)))
+        self.updated.clear()
+        self.backend.setValue('RF:VOLT', 2e6)
+        self.assertTrue(self.updated.wait(1.0))
+        r = self.live.getResult()
+        m = self.expected({0: {'k1': 2.0}, 4: {'k1': -2.0}, 8: {'volt': 2e6}})
+        self.assertTrue(np.allclose(r['transM'], m))
+        self.assertEqual(r['dirty'][0], 8)  # upstream is not touched
+        self.assertGreater(r['gamma'][-1], self.m.getEnergyProfile(100.0)[1][-1])
+        self.assertTrue(np.all(r['beta'] > 0))
+        self.assertGreater(r['latency'], 0)
+
+    def test_burst(self):
+        n = self.live.getStats()['updates']
+        self.updated.clear()
+        for i in range(100):
+            self.backend.setValue('QF:K1', 1.0 + i * 0.01)
+        self.assertTrue(self.updated.wait(1.0))
+        st = self.live.getStats()
+        self.assertLessEqual(st['updates'] - n, 2)
+        self.assertGreaterEqual(st['latency_max'], 0.02)
+        r = self.live.getResult()
+        self.assertEqual(list(r['dirty']), [0])
+        self.assertTrue(np.allclose(r['transM'], self.expected({0: {'k1': 3.98}, 4: {'k1': -2.0}})))
+        # response of kick at qf (0) to bpm at qd (4), R12 of elements 1-4
+        resp = self.live.getOrbitResponse([0, 4], [0])
+        r12 = beamline.chainBatch(r['transM'][1:5])[0, 1]
+        self.assertAlmostEqual(resp[1, 0], r12)
+        self.assertEqual(resp[0, 0], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
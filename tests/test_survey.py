@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import beamline
+from beamline import survey
+from test_drawutils import makeElements
+
+
+class SurveyTest(unittest.TestCase):
+    def setUp(self):
+        self.m = beamline.Models(name='bl', flyweight=True)
+        self.m.addElement(makeElements() * 3)
+
+    def test_placement(self):
+        # the same as placement by drawing element by element
+        for mode in ('plain', 'fancy'):
+            self.m.draw(startpoint=(1, -1), mode=mode)
+            sv = self.m.getSurvey(startpoint=(1, -1), bend=mode == 'fancy')
+            self.assertEqual(len(sv), 33)
+            self.assertTrue(np.allclose(sv.p0, self.m._lattice_drawpos))
+            qd = self.m.getElementsByName('qd')[0]  # placed at the last occurrence
+            self.assertTrue(np.allclose(sv.p1[29], qd.next_p0))
+
+    def test_coords(self):
+        sv = beamline.calcSurvey(makeElements(), angle=0.2)
+        self.assertAlmostEqual(sv.getEnd()[2], 0.2)  # bends of opposite angles
+        self.assertAlmostEqual(sv.s[-1], 3.8)
+        self.assertAlmostEqual(sv.getCoords('b2')[0, 2], 0.3)
+        self.assertEqual(sv.kind[sv.names.index('q')], survey.PLACE_NONE)
+        self.assertTrue(np.allclose(sv.getCoords()[1], [0.1 * np.cos(0.2), 0.1 * np.sin(0.2), 0.2]))
+
+    def test_layout(self):
+        sv = self.m.getSurvey()
+        fd, filename = tempfile.mkstemp(suffix='.txt')
+        os.close(fd)
+        try:
+            sv.saveLayout(filename)
+            data = np.loadtxt(filename, usecols=(2, 3, 4, 5))
+            names = np.loadtxt(filename, usecols=(0,), dtype=str)
+        finally:
+            os.remove(filename)
+        self.assertEqual(names.tolist(), sv.names + ['_END_'])
+        self.assertTrue(np.allclose(data[:, 1], sv.x))
+        self.assertTrue(np.allclose(data[:, 3], sv.theta))
+
+
+if __name__ == '__main__':
+    unittest.main()